@@ -0,0 +1,258 @@
+'''benchmarks for palette-cleanser
+
+measures color math, palette extraction from images, deploying synthetic
+template trees and cold-start time of common cli commands, compares each
+result with the saved baseline and exits non-zero if any benchmark regressed
+by more than the threshold
+
+baselines depend on the machine, so save one before comparing against it:
+
+    $ python benchmarks/run.py --save-baseline
+    $ python benchmarks/run.py
+'''
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+### GLOBAL VARS ###
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# benchmarks that are this much slower (as a fraction) than the baseline fail
+default_threshold = 0.25
+# sizes of the synthetic template trees that are deployed
+tree_sizes = [10, 100, 1000]
+# real images shipped with the tests, plus synthetic ones generated below
+image_paths = [os.path.join(repo_dir, 'tests', 'test_data', name) for name in ['muruusa-mountain.jpg', 'vibrant.webp']]
+
+# everything palette-cleanser reads and writes goes to a scratch directory, so
+# the benchmarks never touch the real configuration (or a running daemon)
+work_dir = tempfile.mkdtemp(prefix='pclean-bench-')
+os.environ.update({
+    'HOME': os.path.join(work_dir, 'home'),
+    'XDG_CONFIG_HOME': os.path.join(work_dir, 'config'),
+    'XDG_CACHE_HOME': os.path.join(work_dir, 'cache'),
+    'XDG_RUNTIME_DIR': os.path.join(work_dir, 'run'),
+})
+sys.path.insert(0, repo_dir)
+
+import numpy as np
+import yaml
+
+from palettecleanser import audit
+from palettecleanser import config
+from palettecleanser import palette
+from palettecleanser import template
+from palettecleanser import theme
+from tabulate import tabulate
+
+
+### CLASSES ###
+@dataclass
+class Benchmark:
+    '''
+    a measured operation
+
+    Attributes
+    ----------
+    name : str
+        unique name, which the baseline is keyed by
+    run : Callable[[], object]
+        the operation
+    repeat : int, optional
+        number of measurements, of which the fastest is kept (default is 5)
+    setup : Callable[[], object], optional
+        run before each measurement, untimed; the operation is then measured
+        one call at a time (default is None)
+    '''
+    name: str
+    run: Callable[[], object]
+    repeat: int = 5
+    setup: Optional[Callable[[], object]] = None
+
+    def measure(self) -> float:
+        '''seconds the operation takes, at best'''
+        if self.setup:
+            times = []
+            for _ in range(self.repeat):
+                self.setup()
+                start = time.perf_counter()
+                self.run()
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        timer = timeit.Timer(self.run)
+        # enough calls per measurement to take at least 0.2s
+        number, _ = timer.autorange()
+        return min(timer.repeat(self.repeat, number)) / number
+
+
+### FUNCTIONS ###
+def write_ppm(path: str, width: int, height: int, seed: int = 0):
+    '''writes a synthetic photo-like image: smooth gradients plus noise'''
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([
+        255 * x / width,
+        255 * y / height,
+        127 + 127 * np.sin(x / 37) * np.cos(y / 23),
+    ], axis=-1) + rng.normal(0, 12, (height, width, 3))
+
+    with open(path, 'wb') as f:
+        f.write(f'P6\n{width} {height}\n255\n'.encode())
+        f.write(np.clip(pixels, 0, 255).astype(np.uint8).tobytes())
+
+def setup_config():
+    '''saves the palettes and themes the benchmarks deploy'''
+    for d in [os.environ['HOME'], config.palettes_dir, config.themes_dir, config.templates_dir, os.environ['XDG_RUNTIME_DIR']]:
+        os.makedirs(d, exist_ok=True)
+
+    for p in [palette.axarva_palette, palette.ansi_normal_palette]:
+        with open(os.path.join(config.palettes_dir, f'{p.name}.yml'), 'w') as f:
+            yaml.dump(p, f)
+
+    # two themes that differ, so that every deploy changes every file
+    for name, font in [('bench-a', 'mono'), ('bench-b', 'sans')]:
+        with open(os.path.join(config.themes_dir, f'{name}.yml'), 'w') as f:
+            yaml.dump(theme.Theme(name, ['axarva', 'ansi-normal'], '', {'font': font}), f)
+
+def setup_tree(size: int) -> str:
+    '''writes a synthetic tree of size templates and makes it the only managed file'''
+    root = f'bench-{size}'
+    for i in range(size):
+        directory = os.path.join(config.templates_dir, root, f'app{i % 20}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'conf{i}.j2'), 'w') as f:
+            f.write(
+                '[colors]\n'
+                '{% for p in palettes %}{% for c in p.colors %}\n'
+                '{{ p.name }}_{{ loop.index0 }} = "{{ c }}"\n'
+                '{% endfor %}{% endfor %}\n'
+                '[font]\n'
+                'family = "{{ settings.font }}"\n'
+                + '# filler to make the template a realistic size\n' * 20
+            )
+
+    with open(os.path.join(config.config_dir, 'config.yml'), 'w') as f:
+        yaml.dump({'managed_files': [root]}, f)
+    return root
+
+def deploy_alternating() -> Callable[[], None]:
+    '''deploys the two benchmark themes in turn'''
+    themes = [theme.from_config('bench-a'), theme.from_config('bench-b')]
+    turn = iter(range(sys.maxsize))
+    return lambda: template.template_managed(themes[next(turn) % 2])
+
+def extract(path: str) -> Callable[[], None]:
+    '''extracts a palette from the image at path, without pywal's cache'''
+    def run():
+        # pywal caches the colors of each image it has seen
+        shutil.rmtree(os.path.join(os.environ['XDG_CACHE_HOME'], 'wal'), ignore_errors=True)
+        palette.from_image(path)
+    return run
+
+def cli(*args: str) -> Callable[[], None]:
+    '''runs pclean in a fresh interpreter, as a user would'''
+    command = [sys.executable, '-c', 'import sys; from palettecleanser.cli.client import main; sys.argv[0] = "pclean"; main()', *args]
+    environment = os.environ | {'PYTHONPATH': repo_dir}
+    return lambda: subprocess.run(command, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+def benchmarks() -> Iterator[Benchmark]:
+    '''every benchmark, setting up its fixtures just before it is yielded'''
+    rng = np.random.default_rng(0)
+    colors = [palette.Color(*map(int, rgb)) for rgb in rng.integers(0, 256, (1000, 3))]
+    hexes = [str(c) for c in colors]
+    targets = palette.axarva_palette.colors
+
+    yield Benchmark('color.closest', lambda: [c.closest(targets) for c in colors])
+    yield Benchmark('color.spectrum', lambda: colors[0].spectrum(colors[1], 256))
+    yield Benchmark('palette.tone', lambda: palette.Palette(colors).tone(20, True))
+    yield Benchmark('palette.from_hexes', lambda: palette.from_hexes(hexes))
+
+    library = [palette.Palette([palette.Color(*map(int, rgb)) for rgb in rng.integers(0, 256, (8, 3))], str(i)) for i in range(20000)]
+    yield Benchmark('audit[20000]', lambda: audit.audit(library).failures(), repeat=3)
+
+    if shutil.which('magick') or shutil.which('convert'):
+        synthetic = os.path.join(work_dir, 'synthetic-1080p.ppm')
+        write_ppm(synthetic, 1920, 1080)
+        for path in image_paths + [synthetic]:
+            yield Benchmark(f'palette.from_image[{os.path.basename(path)}]', extract(path), repeat=3)
+    else:
+        print('imagemagick not found; skipping palette.from_image', file=sys.stderr)
+
+    setup_config()
+    for size in tree_sizes:
+        setup_tree(size)
+        # flush the previous deploy to disk first, as it would be by the time
+        # of a real deploy, so results don't depend on writeback in flight
+        yield Benchmark(f'template_managed[{size}]', deploy_alternating(), setup=os.sync)
+
+    for args in [['--help'], ['palette', 'ls'], ['theme', 'ls'], ['theme', 'deploy', 'bench-a', '--dry-run']]:
+        yield Benchmark(f'cli[{" ".join(args)}]', cli(*args), repeat=3)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='runs the palette-cleanser benchmarks')
+    parser.add_argument('-k', metavar='PATTERN', help='only run benchmarks whose name matches this glob')
+    parser.add_argument('--save-baseline', action='store_true', help=f'save the results as the new baseline ({baseline_path})')
+    parser.add_argument('--threshold', type=float, default=default_threshold, help='fail if a benchmark is slower than its baseline by more than this fraction (default is %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    results = {}
+    rows = []
+    regressed = []
+    try:
+        for benchmark in benchmarks():
+            if args.k and not fnmatch.fnmatch(benchmark.name, args.k):
+                continue
+
+            seconds = results[benchmark.name] = benchmark.measure()
+            expected = baseline.get(benchmark.name)
+            change = seconds / expected - 1 if expected else None
+            if change is not None and change > args.threshold:
+                regressed.append(benchmark.name)
+
+            rows.append([
+                benchmark.name,
+                f'{seconds * 1e3:.3f}ms',
+                f'{expected * 1e3:.3f}ms' if expected else '',
+                f'{change:+.0%}' if change is not None else '',
+                'REGRESSED' if benchmark.name in regressed else ''
+            ])
+            print(tabulate([rows[-1]], tablefmt='plain'), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(tabulate(rows, headers=['benchmark', 'time', 'baseline', 'change', '']))
+
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline | results, f, indent=2, sort_keys=True)
+        print(f'\nbaseline saved to {baseline_path}')
+        return 0
+
+    if regressed:
+        print(f'\n{len(regressed)} benchmark{"s" if len(regressed) > 1 else ""} regressed by more than {args.threshold:.0%}', file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
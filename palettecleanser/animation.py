@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import math
+import numpy as np
+import shutil
+import subprocess
+
+from typing import Iterator, Optional
+
+
+### GLOBAL VARS ###
+# pixels kept from the whole animation, which is all that is quantized at the end
+default_reservoir_size = 1 << 16
+# pixels sampled from each frame before they compete for the reservoir
+pixels_per_frame = 1 << 14
+
+
+### EXCEPTIONS ###
+class FramesNotReadableError(Exception):
+    '''thrown when the frames of a file can't be decoded'''
+    pass
+
+
+### CLASSES ###
+class Reservoir:
+    '''uniform random sample of bounded size from a stream of pixels
+
+    every pixel added has the same chance of being in the sample, however
+    many are added (reservoir sampling)
+
+    Attributes
+    ----------
+    size : int
+        maximum number of pixels kept
+    seen : int
+        number of pixels added so far
+    '''
+    def __init__(self, size: int = default_reservoir_size, seed: Optional[int] = None):
+        '''
+        Parameters
+        ----------
+        size : int, optional
+            maximum number of pixels kept (default is default_reservoir_size)
+        seed : int, optional
+            seed for the random sample (default is None)
+        '''
+        self.size = size
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.buffer = np.empty((size, 3), dtype=np.uint8)
+
+    def add(self, pixels: np.ndarray):
+        '''offers pixels to the sample
+
+        Parameters
+        ----------
+        pixels : np.ndarray
+            n x 3 uint8 rgb pixels
+        '''
+        free = self.size - min(self.seen, self.size)
+        taken = pixels[:free]
+        self.buffer[self.seen:self.seen + len(taken)] = taken
+        self.seen += len(taken)
+
+        rest = pixels[len(taken):]
+        if not len(rest):
+            return
+
+        # the t-th pixel replaces a random kept pixel with probability size / t;
+        # for repeated slots the later pixel wins, as it would one at a time
+        t = self.seen + np.arange(1, len(rest) + 1)
+        slots = (self.rng.random(len(rest)) * t).astype(np.int64)
+        kept = slots < self.size
+        self.buffer[slots[kept]] = rest[kept]
+        self.seen += len(rest)
+
+    @property
+    def pixels(self) -> np.ndarray:
+        '''the sample, as an n x 3 uint8 array'''
+        return self.buffer[:min(self.seen, self.size)]
+
+
+### FUNCTIONS ###
+def pillow_frames(path: str, stride: int) -> Iterator[np.ndarray]:
+    '''decodes every stride-th frame of an animated (or still) image with Pillow'''
+    try:
+        from PIL import Image, ImageSequence
+    except ImportError:
+        raise FramesNotReadableError("reading animations requires Pillow (pip install 'palettecleanser[images]')")
+
+    with Image.open(path) as image:
+        for i, frame in enumerate(ImageSequence.Iterator(image)):
+            if i % stride == 0:
+                yield np.asarray(frame.convert('RGB'))
+
+def ffmpeg_frames(path: str, stride: int) -> Iterator[np.ndarray]:
+    '''decodes every stride-th frame of a video with ffmpeg, streaming raw frames through a pipe'''
+    probe = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height', '-of', 'csv=p=0', path],
+        capture_output=True, text=True
+    )
+    try:
+        width, height = map(int, probe.stdout.strip().split(',')[:2])
+    except ValueError:
+        raise FramesNotReadableError(f"'{path}' has no video stream")
+
+    # only the sampled frames are converted to rgb and sent through the pipe
+    process = subprocess.Popen(
+        ['ffmpeg', '-v', 'error', '-i', path, '-vf', f'select=not(mod(n\\,{stride}))', '-vsync', 'vfr', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'],
+        stdout=subprocess.PIPE
+    )
+    try:
+        while len(frame := process.stdout.read(width * height * 3)) == width * height * 3:
+            yield np.frombuffer(frame, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        process.kill()
+        process.wait()
+
+def frames(path: str, stride: int = 1) -> Iterator[np.ndarray]:
+    '''decodes every stride-th frame of an animated image (gif, apng, webp) or,
+    if ffmpeg is installed, a video, one frame at a time
+
+    Parameters
+    ----------
+    path : str
+        path to the animation
+    stride : int, optional
+        sample every stride-th frame, starting with the first (default is 1)
+
+    Yields
+    ------
+    np.ndarray
+        h x w x 3 uint8 rgb pixels of each sampled frame
+
+    Raises
+    ------
+    FramesNotReadableError
+        if the file can't be decoded
+    '''
+    decoded = 0
+    try:
+        for frame in pillow_frames(path, stride):
+            decoded += 1
+            yield frame
+        return
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # an image Pillow knows but can't finish decoding is broken, not a video
+        if decoded:
+            raise
+        if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+            raise FramesNotReadableError(f"'{path}' isn't an image, and reading videos requires ffmpeg")
+
+    yield from ffmpeg_frames(path, stride)
+
+def sample(path: str, stride: int = 1, size: int = default_reservoir_size, seed: Optional[int] = None) -> np.ndarray:
+    '''uniform random sample of the pixels of an animation
+
+    memory stays constant in the number of frames: frames are decoded one at a
+    time, and only a bounded reservoir of pixels is kept
+
+    Parameters
+    ----------
+    path : str
+        path to the animation
+    stride : int, optional
+        sample every stride-th frame (default is 1)
+    size : int, optional
+        number of pixels in the sample (default is default_reservoir_size)
+    seed : int, optional
+        seed for the random sample (default is None)
+
+    Returns
+    -------
+    np.ndarray
+        n x 3 uint8 array of rgb pixels
+    '''
+    reservoir = Reservoir(size, seed)
+    for frame in frames(path, stride):
+        pixels = frame.reshape(-1, 3)
+        if len(pixels) > pixels_per_frame:
+            pixels = pixels[reservoir.rng.integers(0, len(pixels), pixels_per_frame)]
+        reservoir.add(pixels)
+    return reservoir.pixels
+
+def save_pixels(pixels: np.ndarray, path: str):
+    '''saves pixels as a roughly square image, so they can be quantized like any other image'''
+    from PIL import Image
+
+    width = math.ceil(math.sqrt(len(pixels)))
+    height = math.ceil(len(pixels) / width)
+    # pad the last row by repeating pixels, which barely shifts their proportions
+    padded = np.resize(pixels, (width * height, 3))
+    Image.fromarray(padded.reshape(height, width, 3)).save(path)
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import numpy as np
+
+from . import colormath
+from . import palette as pal
+from dataclasses import dataclass
+
+
+### GLOBAL VARS ###
+# WCAG AA contrast ratio for normal text
+default_min_contrast = 4.5
+# oklab distance under which two colors are hard to tell apart
+default_min_distance = 0.05
+# colour vision deficiencies simulated, as matrices applied to linear srgb
+# (Machado, Oliveira and Fernandes 2009, severity 1)
+deficiencies = {
+    'protanopia': np.array([
+        [0.152286, 1.052583, -0.204868],
+        [0.114503, 0.786281, 0.099216],
+        [-0.003882, -0.048116, 1.051998],
+    ]),
+    'deuteranopia': np.array([
+        [0.367322, 0.860646, -0.227968],
+        [0.280085, 0.672501, 0.047413],
+        [-0.011820, 0.042940, 0.968881],
+    ]),
+    'tritanopia': np.array([
+        [1.255528, -0.076749, -0.178779],
+        [-0.078411, 0.930809, 0.147602],
+        [0.004733, 0.691367, 0.303900],
+    ]),
+}
+# bisection steps when adjusting colors; plenty for 8 bit colors
+adjust_steps = 20
+
+
+### CLASSES ###
+@dataclass
+class Failure:
+    '''
+    a pair of colors of a palette that fails a check
+
+    Attributes
+    ----------
+    palette : str
+        name of the palette
+    check : str
+        'contrast', or the colour vision deficiency under which the colors look alike
+    first : int
+        index of the first color (the background, for contrast)
+    second : int
+        index of the second color
+    value : float
+        contrast ratio, or oklab distance as seen with the deficiency
+    '''
+    palette: str
+    check: str
+    first: int
+    second: int
+    value: float
+
+
+@dataclass
+class Audit:
+    '''
+    checks of a whole library of palettes, computed at once
+
+    palettes are stacked into a single n x k x 3 array (shorter palettes are
+    padded and masked), so every check is one batched computation
+
+    Attributes
+    ----------
+    names : list[str]
+        name of each palette
+    rgb : np.ndarray
+        n x k x 3 colors of the palettes
+    mask : np.ndarray
+        n x k, False for padding
+    contrast : np.ndarray
+        n x k x k WCAG contrast ratio between every pair of colors of each palette
+    distances : dict[str, np.ndarray]
+        n x k x k oklab distance between every pair of colors of each palette,
+        as seen normally ('normal') and with each deficiency
+    '''
+    names: list[str]
+    rgb: np.ndarray
+    mask: np.ndarray
+    contrast: np.ndarray
+    distances: dict[str, np.ndarray]
+
+    def failures(
+            self,
+            background: int = 0,
+            min_contrast: float = default_min_contrast,
+            min_distance: float = default_min_distance
+    ) -> list[Failure]:
+        '''pairs of colors that fail the checks
+
+        a color fails the contrast check if its contrast ratio with the
+        background is under min_contrast; two colors (other than the
+        background) fail a deficiency's check if they are at least min_distance
+        apart normally but not as seen with the deficiency
+
+        Parameters
+        ----------
+        background : int, optional
+            index of the background color (default is 0)
+        min_contrast : float, optional
+            lowest contrast ratio allowed (default is default_min_contrast)
+        min_distance : float, optional
+            lowest oklab distance allowed (default is default_min_distance)
+
+        Returns
+        -------
+        list[Failure]
+            the failures, palette by palette
+        '''
+        k = self.mask.shape[1]
+        valid = self.mask[:, :, None] & self.mask[:, None, :]
+        foreground = np.arange(k) != background
+        checks = []
+
+        low = (self.contrast[:, background, :] < min_contrast) & valid[:, background, :] & foreground
+        p, j = np.nonzero(low)
+        checks.append((p, np.full(len(p), background), j, 'contrast', self.contrast[p, background, j]))
+
+        pairs = np.triu(np.ones((k, k), dtype=bool), 1) & foreground[:, None] & foreground[None, :] & valid
+        distinct = self.distances['normal'] >= min_distance
+        for name in deficiencies:
+            p, i, j = np.nonzero(pairs & distinct & (self.distances[name] < min_distance))
+            checks.append((p, i, j, name, self.distances[name][p, i, j]))
+
+        failures = [
+            Failure(self.names[p], check, int(i), int(j), float(v))
+            for ps, i_s, js, check, vs in checks
+            for p, i, j, v in zip(ps, i_s, js, vs)
+        ]
+        order = {name: i for i, name in enumerate(self.names)}
+        return sorted(failures, key=lambda f: order[f.palette])
+
+    def adjusted(self, background: int = 0, min_contrast: float = default_min_contrast) -> list[pal.Palette]:
+        '''palettes whose colors are lightened or darkened until they contrast enough with the background
+
+        each failing color moves in oklab towards white or black (whichever
+        contrasts more with the background), only as far as it needs to, so
+        it keeps as much of its hue and chroma as it can; all failing colors
+        of all palettes are adjusted together, by bisection; colors that can't
+        reach min_contrast (against a mid gray background, say) end up as
+        white or black
+
+        Parameters
+        ----------
+        background : int, optional
+            index of the background color (default is 0)
+        min_contrast : float, optional
+            contrast ratio to reach (default is default_min_contrast)
+
+        Returns
+        -------
+        list[Palette]
+            a palette per audited palette, with the names of the originals
+        '''
+        rgb = self.rgb.copy()
+        low = (self.contrast[:, background, :] < min_contrast) & self.mask
+        low[:, background] = False
+        p, j = np.nonzero(low)
+        bg = rgb[p, background]
+
+        lab = colormath.to_oklab(rgb[p, j])
+        # towards white or black, whichever contrasts more with the background
+        white = colormath.contrast(np.array([255, 255, 255]), bg) >= colormath.contrast(np.array([0, 0, 0]), bg)
+        end = np.zeros_like(lab)
+        end[:, 0] = np.where(white, 1.0, 0.0)
+
+        def candidate(t: np.ndarray) -> np.ndarray:
+            return np.rint(colormath.from_oklab(lab + t[:, None] * (end - lab)))
+
+        # bisect how far along the way to go, so each color changes as little as it can
+        reached, missed = np.ones(len(lab)), np.zeros(len(lab))
+        for _ in range(adjust_steps):
+            middle = (reached + missed) / 2
+            ok = colormath.contrast(candidate(middle), bg) >= min_contrast
+            reached = np.where(ok, middle, reached)
+            missed = np.where(ok, missed, middle)
+
+        rgb[p, j] = candidate(reached)
+        return [
+            pal.Palette([pal.Color(*map(int, c)) for c in colors[mask]], name)
+            for name, colors, mask in zip(self.names, rgb, self.mask)
+        ]
+
+
+### FUNCTIONS ###
+def simulate(rgb: np.ndarray, deficiency: str) -> np.ndarray:
+    '''how srgb colors look with a colour vision deficiency, as srgb (0-255, unrounded)'''
+    return colormath.from_linear(colormath.to_linear(rgb) @ deficiencies[deficiency].T)
+
+def pairwise(lab: np.ndarray) -> np.ndarray:
+    '''n x k x k distances between every pair of colors of n x k x 3 colors'''
+    return np.sqrt(((lab[:, :, None, :] - lab[:, None, :, :]) ** 2).sum(axis=-1))
+
+def audit(palettes: list[pal.Palette]) -> Audit:
+    '''computes contrast ratios and distances between the colors of many palettes at once
+
+    Parameters
+    ----------
+    palettes : list[Palette]
+        palettes to audit
+
+    Returns
+    -------
+    Audit
+        the results, whose failures and adjusted palettes can then be asked for
+    '''
+    k = max((len(p.colors) for p in palettes), default=0)
+    rgb = np.zeros((len(palettes), k, 3))
+    mask = np.zeros((len(palettes), k), dtype=bool)
+    for i, p in enumerate(palettes):
+        rgb[i, :len(p.colors)] = [[c.red, c.green, c.blue] for c in p.colors]
+        mask[i, :len(p.colors)] = True
+
+    contrast = colormath.contrast(rgb[:, :, None, :], rgb[:, None, :, :])
+    distances = {'normal': pairwise(colormath.to_oklab(rgb))}
+    for name in deficiencies:
+        distances[name] = pairwise(colormath.to_oklab(simulate(rgb, name)))
+
+    return Audit([p.name for p in palettes], rgb, mask, contrast, distances)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from pywal import colors
+from typing import Callable
+
+
+### GLOBAL VARS ###
+# longest side images are shrunk to before quantizing; palettes barely change
+# but quantizing gets much faster
+thumbnail_size = 256
+
+
+### EXCEPTIONS ###
+class BackendNotAvailableError(Exception):
+    '''thrown when extracting colors with a backend whose dependencies aren't installed'''
+    pass
+
+
+### FUNCTIONS ###
+def quantizer(method_name: str, kmeans: int = 0) -> Callable[[str, int], list[str]]:
+    '''built-in backend quantizing images with one of Pillow's methods'''
+    def extract(image_path: str, count: int) -> list[str]:
+        try:
+            from PIL import Image
+        except ImportError:
+            raise BackendNotAvailableError("built-in backends require Pillow (pip install 'palettecleanser[images]')")
+
+        with Image.open(image_path) as image:
+            # jpegs are decoded at a fraction of their size
+            image.draft('RGB', (thumbnail_size * 2, thumbnail_size * 2))
+            small = image.convert('RGB')
+        small.thumbnail((thumbnail_size, thumbnail_size))
+
+        quantized = small.quantize(count, getattr(Image, method_name), kmeans)
+        rgb = quantized.getpalette()[:count * 3]
+        # most common colors first
+        order = [i for _, i in sorted(quantized.getcolors(), reverse=True)]
+        return ['#%02x%02x%02x' % tuple(rgb[i * 3:i * 3 + 3]) for i in order]
+    return extract
+
+# backends implemented here rather than by pywal, which need only Pillow
+builtin = {
+    'mediancut': quantizer('MEDIANCUT'),
+    'kmeans': quantizer('MEDIANCUT', kmeans=3),
+    'octree': quantizer('FASTOCTREE'),
+}
+
+def names() -> list[str]:
+    '''names of every backend, pywal's and built-in (pywal's may still need
+    dependencies that aren't installed)'''
+    return sorted(set(colors.list_backends()) | set(builtin))
+
+def extract(image_path: str, backend: str, count: int = 8) -> list[str]:
+    '''extracts the most common colors of an image with a built-in backend
+
+    Parameters
+    ----------
+    image_path : str
+        path to image file
+    backend : str
+        name of a built-in backend
+    count : int, optional
+        number of colors (default is 8)
+
+    Returns
+    -------
+    list[str]
+        "#rrggbb" formatted colors, most common first
+
+    Raises
+    ------
+    BackendNotAvailableError
+        if Pillow isn't installed
+    '''
+    return builtin[backend](image_path, count)
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from . import config
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+### GLOBAL VARS ###
+# content-addressed store of backed up files
+store_dir = os.path.join(config.config_dir, 'backups')
+# ioctl that makes a copy-on-write clone of a file on filesystems that support it (btrfs, xfs, ...)
+FICLONE = 0x40049409
+# files are backed up from several threads when deploying to several roots
+lock = threading.Lock()
+# backups kept of each file; once a file has twice as many, its oldest ones
+# are pruned, so that the index isn't rewritten on every backup
+max_backups = 20
+
+
+### EXCEPTIONS ###
+class BackupNotFoundError(Exception):
+    '''thrown when there is no backup of a file'''
+    pass
+
+
+### CLASSES ###
+@dataclass
+class Backup:
+    '''
+    backed up version of a file
+
+    Attributes
+    ----------
+    id : int
+        position of the backup in the index, starting at 1
+    time : float
+        when the file was backed up (seconds since the epoch)
+    path : str
+        absolute path of the file that was backed up, with symlinks resolved
+    digest : str
+        sha256 of the file's content, which is also its name in the store
+    size : int
+        size of the file in bytes
+    mode : int
+        permissions of the file
+    '''
+    id: int
+    time: float
+    path: str
+    digest: str
+    size: int
+    mode: int
+
+    @property
+    def object_path(self) -> str:
+        '''path of the backed up content in the store'''
+        return object_path(self.digest)
+
+
+@dataclass
+class Index:
+    '''
+    latest backup of each file, read incrementally from the index
+
+    Attributes
+    ----------
+    path : str
+        path of the index
+    offset : int, optional
+        bytes of the index read so far (default is 0)
+    count : int, optional
+        backups read so far (default is 0)
+    latest : dict[str, Backup], optional
+        latest backup of each file read so far (default is {})
+    counts : dict[str, int], optional
+        backups of each file read so far (default is {})
+    inode : int, optional
+        inode of the index read so far (default is None)
+    '''
+    path: str
+    offset: int = 0
+    count: int = 0
+    latest: dict[str, Backup] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+    inode: Optional[int] = None
+
+    def refresh(self) -> Index:
+        '''reads whatever was appended to the index since the last refresh'''
+        try:
+            with open(self.path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self.inode or st.st_size < self.offset:
+                    # the index was replaced (e.g. pruned); start over
+                    self.offset, self.count, self.latest, self.counts = 0, 0, {}, {}
+                    self.inode = st.st_ino
+                f.seek(self.offset)
+                appended = f.read()
+        except FileNotFoundError:
+            return self
+
+        # a line that is still being appended is picked up next time
+        complete = appended[:appended.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                self.count += 1
+                b = Backup(self.count, **json.loads(line))
+                self.latest[b.path] = b
+                self.counts[b.path] = self.counts.get(b.path, 0) + 1
+        self.offset += len(complete)
+        return self
+
+
+# index of the store at store_dir, kept between backups so that backing up a
+# file doesn't mean reading the whole index again
+index: Optional[Index] = None
+
+
+### FUNCTIONS ###
+def object_path(digest: str) -> str:
+    '''path in the store of content with the given sha256'''
+    return os.path.join(store_dir, 'objects', digest[:2], digest)
+
+def index_path() -> str:
+    '''path of the index of all backups, one json object per line'''
+    return os.path.join(store_dir, 'index.jsonl')
+
+def hash_file(path: str) -> tuple[str, int]:
+    '''sha256 and size of file at path'''
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 16):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def clone(source: str, destination: str):
+    '''copies source to destination as cheaply as the filesystem allows
+
+    tries a copy-on-write clone, then a regular copy; never a hard link, since
+    writing to either file in place would change the other
+
+    Parameters
+    ----------
+    source : str
+        file to copy
+    destination : str
+        path of the copy; must not exist
+    '''
+    with open(source, 'rb') as s, open(destination, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            shutil.copyfileobj(s, d, 1 << 16)
+
+def load() -> list[Backup]:
+    '''all backups, oldest first'''
+    try:
+        with open(index_path()) as f:
+            return [Backup(i, **json.loads(line)) for i, line in enumerate(f, start=1) if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def current_index() -> Index:
+    '''index of the store at store_dir, refreshed'''
+    global index
+    if not index or index.path != index_path():
+        index = Index(index_path())
+    return index.refresh()
+
+def latest(path: str) -> Optional[Backup]:
+    '''latest backup of the file at path (absolute), if there is one'''
+    return current_index().latest.get(os.path.realpath(path))
+
+def history(path: str) -> list[Backup]:
+    '''backups of the file at path (absolute), newest first'''
+    path = os.path.realpath(path)
+    return [b for b in reversed(load()) if b.path == path]
+
+def store(path: str) -> Backup:
+    '''backs up the file at path
+
+    identical content is only stored once; new content is cloned into the
+    store (see clone), so the backup is unaffected by later edits of the file,
+    and the oldest backups of the file are pruned once it has too many (see
+    max_backups and prune)
+
+    a symlink is backed up as the file it links to, under that file's path,
+    so the backup is found through either path
+
+    Parameters
+    ----------
+    path : str
+        absolute path of file to back up
+
+    Returns
+    -------
+    Backup
+        the backup, or the latest backup of path if its content hasn't changed since
+    '''
+    path = os.path.realpath(path)
+    digest, size = hash_file(path)
+
+    # held throughout, so that a prune can't remove the content in between
+    with lock:
+        previous = latest(path)
+        if previous and previous.digest == digest:
+            return previous
+
+        destination = object_path(digest)
+        if not os.path.exists(destination):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            tmp = f'{destination}.{os.getpid()}.tmp'
+            clone(path, tmp)
+            os.replace(tmp, destination)
+
+        entry = {'time': time.time(), 'path': path, 'digest': digest, 'size': size, 'mode': os.stat(path).st_mode}
+        with open(index_path(), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        if current_index().counts[path] >= 2 * max_backups:
+            prune()
+        return latest(path)
+
+def prune(keep: Optional[int] = None):
+    '''removes all but the newest backups of each file, and the content no backup refers to anymore
+
+    the ids of the remaining backups change, since they are positions in the
+    index
+
+    Parameters
+    ----------
+    keep : int, optional
+        backups to keep of each file (default is None, meaning max_backups)
+    '''
+    if not os.path.exists(index_path()):
+        return
+
+    keep = keep if keep is not None else max_backups
+    kept, counts = [], {}
+    for b in reversed(load()):
+        counts[b.path] = counts.get(b.path, 0) + 1
+        if counts[b.path] <= keep:
+            kept.append(b)
+    kept.reverse()
+
+    tmp = f'{index_path()}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        for b in kept:
+            f.write(json.dumps({'time': b.time, 'path': b.path, 'digest': b.digest, 'size': b.size, 'mode': b.mode}) + '\n')
+    os.replace(tmp, index_path())
+
+    referenced = {b.digest for b in kept}
+    objects_dir = os.path.join(store_dir, 'objects')
+    for prefix in os.listdir(objects_dir):
+        for digest in os.listdir(os.path.join(objects_dir, prefix)):
+            if digest not in referenced and not digest.endswith('.tmp'):
+                os.remove(os.path.join(objects_dir, prefix, digest))
+
+def restore(path: str, id: Optional[int] = None) -> Backup:
+    '''restores a backed up version of the file at path
+
+    the current file is backed up first, so a restore can be undone; a symlink
+    is kept, and the file it links to is restored
+
+    Parameters
+    ----------
+    path : str
+        absolute path of file to restore
+    id : int, optional
+        id of the backup to restore (default is None, meaning the latest backup of path)
+
+    Returns
+    -------
+    Backup
+        the restored backup
+
+    Raises
+    ------
+    BackupNotFoundError
+        if there is no such backup of path
+    '''
+    path = os.path.realpath(path)
+    backups = history(path)
+    backup = next((b for b in backups if id is None or b.id == id), None)
+    if not backup:
+        raise BackupNotFoundError(f'no backup{f" {id}" if id else ""} of {path}')
+
+    if os.path.exists(path):
+        store(path)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.pclean'
+    # never link, or editing the restored file would change the backup
+    clone(backup.object_path, tmp)
+    os.chmod(tmp, backup.mode)
+    os.replace(tmp, path)
+
+    return backup
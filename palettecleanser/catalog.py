@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+from . import config
+from . import metrics
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+### GLOBAL VARS ###
+# index of the saved palettes and themes
+catalog_path = os.path.join(config.config_dir, 'catalog.json')
+# bumped when the layout of the catalog changes, so older catalogs are rebuilt
+version = 1
+# bytes of an image hashed at a time
+hash_chunk_size = 1 << 20
+
+
+### CLASSES ###
+@dataclass
+class ThemeEntry:
+    '''
+    what the catalog knows about a saved theme
+
+    Attributes
+    ----------
+    stat : list[int]
+        mtime (ns) and size of the theme's yml file when it was indexed
+    palettes : list[str]
+        names of the theme's palettes
+    image_path : str
+        the theme's image
+    image_stat : list[int], optional
+        mtime (ns) and size of the image when it was hashed; None if it didn't exist
+    image_hash : str, optional
+        sha256 of the image; None if it didn't exist
+    settings : list[str]
+        keys of the theme's settings
+    error : str, optional
+        why the theme's yml file couldn't be read, if it couldn't
+    '''
+    stat: list[int]
+    palettes: list[str] = field(default_factory=list)
+    image_path: str = ''
+    image_stat: Optional[list[int]] = None
+    image_hash: Optional[str] = None
+    settings: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class Catalog:
+    '''
+    index of the saved palettes and themes, so the library can be checked
+    without parsing every yml file
+
+    entries are revalidated by the mtime and size of their files, so files
+    edited by hand are reindexed the next time the catalog is refreshed
+
+    Attributes
+    ----------
+    path : str, optional
+        file the catalog is persisted to (default is None, meaning it isn't persisted)
+    palettes : dict[str, list[int]]
+        mtime (ns) and size of each saved palette's yml file
+    themes : dict[str, ThemeEntry]
+        entry of each saved theme
+    modified : bool
+        whether the catalog changed since it was loaded
+    '''
+    path: Optional[str] = None
+    palettes: dict[str, list[int]] = field(default_factory=dict)
+    themes: dict[str, ThemeEntry] = field(default_factory=dict)
+    modified: bool = False
+
+    def record_palettes(self, names: list[str]):
+        '''indexes saved palettes'''
+        for name in names:
+            stat = file_stat(os.path.join(config.palettes_dir, f'{name}.yml'))
+            if stat:
+                self.palettes[name] = stat
+            else:
+                self.palettes.pop(name, None)
+        self.modified = True
+
+    def record_theme(self, name: str, saved_theme: Any, stat: Optional[list[int]] = None):
+        '''indexes a saved theme
+
+        Parameters
+        ----------
+        name : str
+            name the theme is saved under
+        saved_theme : theme.Theme
+            the theme
+        stat : list[int], optional
+            mtime and size of the theme's yml file (default is None, meaning
+            the file is stat'd)
+        '''
+        stat = stat if stat else file_stat(os.path.join(config.themes_dir, f'{name}.yml'))
+        if not stat:
+            self.forget_theme(name)
+            return
+
+        previous = self.themes.get(name)
+        image_stat = file_stat(image_file(saved_theme.image_path))
+        if previous and previous.image_path == saved_theme.image_path and previous.image_stat == image_stat:
+            image_hash = previous.image_hash
+        else:
+            image_hash = hash_file(image_file(saved_theme.image_path))
+
+        self.themes[name] = ThemeEntry(
+            stat,
+            list(saved_theme.palettes),
+            saved_theme.image_path,
+            image_stat,
+            image_hash,
+            sorted(saved_theme.settings) if saved_theme.settings else []
+        )
+        self.modified = True
+
+    def forget_palette(self, name: str):
+        '''removes a palette from the index'''
+        if self.palettes.pop(name, None) is not None:
+            self.modified = True
+
+    def forget_theme(self, name: str):
+        '''removes a theme from the index'''
+        if self.themes.pop(name, None) is not None:
+            self.modified = True
+
+    def refresh(self):
+        '''brings the index up to date with the palettes and themes directories
+
+        only the yml files of themes that were added or modified since they
+        were last indexed are parsed; palettes are only listed
+        '''
+        with metrics.span('refresh catalog'):
+            palettes = listing(config.palettes_dir)
+            if palettes != self.palettes:
+                self.palettes = palettes
+                self.modified = True
+
+            themes = listing(config.themes_dir)
+            for name in set(self.themes) - set(themes):
+                self.forget_theme(name)
+
+            for name, stat in themes.items():
+                entry = self.themes.get(name)
+                if entry and entry.stat == stat:
+                    continue
+
+                metrics.add('themes indexed')
+                try:
+                    saved_theme = config.load_yaml(os.path.join(config.themes_dir, f'{name}.yml'))
+                    self.record_theme(name, saved_theme, stat)
+                except Exception as e:
+                    self.themes[name] = ThemeEntry(stat, error=f'{type(e).__name__}: {e}')
+                    self.modified = True
+
+    def save(self):
+        '''persists the catalog, if it has a path and changed'''
+        if not self.path or not self.modified:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({
+                'version': version,
+                'palettes': self.palettes,
+                'themes': {name: vars(entry) for name, entry in self.themes.items()},
+            }, f)
+        os.replace(self.path + '.tmp', self.path)
+        self.modified = False
+
+
+### FUNCTIONS ###
+def file_stat(path: str) -> Optional[list[int]]:
+    '''mtime (ns) and size of a file, or None if it doesn't exist'''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+def image_file(image_path: str) -> str:
+    '''the file a theme's image path refers to'''
+    return os.path.expanduser(image_path) if image_path else ''
+
+def hash_file(path: str) -> Optional[str]:
+    '''sha256 of a file, or None if it can't be read'''
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(hash_chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def listing(directory: str) -> dict[str, list[int]]:
+    '''mtime (ns) and size of each yml file in directory, by name'''
+    try:
+        with os.scandir(directory) as it:
+            entries = [(entry.name[:-4], entry.stat()) for entry in it if entry.name.endswith('.yml') and entry.is_file()]
+    except FileNotFoundError:
+        return {}
+    return {name: [st.st_mtime_ns, st.st_size] for name, st in entries}
+
+def load(path: str = None) -> Catalog:
+    '''loads the persisted catalog
+
+    the catalog isn't refreshed; see Catalog.refresh
+
+    Parameters
+    ----------
+    path : str, optional
+        file the catalog is persisted to (default is catalog_path)
+
+    Returns
+    -------
+    Catalog
+        persisted catalog; empty if there is none, it is unreadable or it is
+        of an older version
+    '''
+    path = path if path else catalog_path
+    try:
+        with open(path) as f:
+            persisted = json.load(f)
+        if persisted.get('version') != version:
+            raise ValueError
+        return Catalog(
+            path,
+            persisted['palettes'],
+            {name: ThemeEntry(**entry) for name, entry in persisted['themes'].items()}
+        )
+    except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+        return Catalog(path)
+
+def refreshed(path: str = None) -> Catalog:
+    '''loads the persisted catalog, brings it up to date and persists it again'''
+    catalog = load(path)
+    catalog.refresh()
+    catalog.save()
+    return catalog
+
+def record_palettes(names: list[str]):
+    '''indexes palettes that were just saved'''
+    catalog = load()
+    catalog.record_palettes(names)
+    catalog.save()
+
+def record_theme(saved_theme: Any):
+    '''indexes a theme that was just saved'''
+    catalog = load()
+    catalog.record_theme(saved_theme.name, saved_theme)
+    catalog.save()
+
+def forget_palette(name: str):
+    '''removes a palette that was just removed from the index'''
+    catalog = load()
+    catalog.forget_palette(name)
+    catalog.save()
+
+def forget_theme(name: str):
+    '''removes a theme that was just removed from the index'''
+    catalog = load()
+    catalog.forget_theme(name)
+    catalog.save()
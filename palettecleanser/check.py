@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import os
+import yaml
+
+from . import catalog as cat
+from . import config
+from . import emitters
+from . import template
+from . import tree
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Optional
+
+
+### GLOBAL VARS ###
+# problems that break deploying a theme; the others are only clutter
+errors = ['unreadable theme', 'unreadable config', 'missing palette', 'missing image', 'missing template', 'unknown emitter']
+warnings = ['changed image', 'orphaned palette', 'unused template']
+
+
+### CLASSES ###
+@dataclass
+class Problem:
+    '''
+    something wrong with the library
+
+    Attributes
+    ----------
+    kind : str
+        one of errors or warnings
+    subject : str
+        the theme, palette or template (relative to $HOME) with the problem
+    detail : str
+        what exactly is wrong
+    '''
+    kind: str
+    subject: str
+    detail: str
+
+    @property
+    def is_error(self) -> bool:
+        '''whether the problem breaks deploying a theme'''
+        return self.kind in errors
+
+
+### FUNCTIONS ###
+def check_themes(catalog: cat.Catalog) -> list[Problem]:
+    '''themes that can't be read, or refer to palettes or images that don't
+    exist, and images that changed since their theme was saved'''
+    problems = []
+    for name, entry in sorted(catalog.themes.items()):
+        if entry.error:
+            problems.append(Problem('unreadable theme', name, entry.error))
+            continue
+
+        for p in entry.palettes:
+            if p not in catalog.palettes:
+                problems.append(Problem('missing palette', name, f"palette '{p}' isn't saved"))
+
+        if not entry.image_path:
+            continue
+        image = cat.image_file(entry.image_path)
+        stat = cat.file_stat(image)
+        if not stat:
+            problems.append(Problem('missing image', name, f"'{entry.image_path}' doesn't exist"))
+        elif entry.image_hash and stat != entry.image_stat and cat.hash_file(image) != entry.image_hash:
+            problems.append(Problem('changed image', name, f"'{entry.image_path}' changed since the theme was saved"))
+
+    return problems
+
+def check_palettes(catalog: cat.Catalog) -> list[Problem]:
+    '''palettes that no theme uses'''
+    used = {p for entry in catalog.themes.values() for p in entry.palettes}
+    return [
+        Problem('orphaned palette', name, 'not used by any theme')
+        for name in sorted(catalog.palettes)
+        if name not in used
+    ]
+
+def check_templates() -> list[Problem]:
+    '''managed files without a template (or with an unknown emitter), and templates that aren't of a managed file
+
+    each managed file is checked on its own, so an unknown emitter doesn't
+    hide the problems of the others
+
+    Returns
+    -------
+    list[Problem]
+        the problems; none if there is no config.yml listing managed files, and
+        an unreadable config problem if config.yml can't be read or is malformed
+    '''
+    try:
+        settings = config.get_config_settings()
+    except FileNotFoundError:
+        # nothing is managed without a config.yml
+        return []
+    except (OSError, yaml.YAMLError) as e:
+        return [Problem('unreadable config', 'config.yml', str(e))]
+
+    # an empty config.yml loads as None
+    settings = settings if settings is not None else {}
+    if not isinstance(settings, Mapping):
+        return [Problem('unreadable config', 'config.yml', 'expected a mapping of settings')]
+    if 'managed_files' not in settings:
+        return []
+    if not isinstance(settings['managed_files'], list):
+        return [Problem('unreadable config', 'config.yml', "'managed_files' isn't a list")]
+
+    problems = []
+    managed = set()
+    # files of entries with an unknown emitter
+    unknown = set()
+    snapshot = tree.load_snapshot()
+    for entry in settings['managed_files']:
+        try:
+            ts = template.from_paths(config.templates_dir, [entry], snapshot)
+        except emitters.UnknownEmitterError as e:
+            problems.append(Problem('unknown emitter', 'config.yml', str(e)))
+            unknown.update(entry if isinstance(entry, Mapping) else [entry])
+            continue
+        except (TypeError, AttributeError):
+            # e.g. a number, or a mapping to something other than a mapping
+            problems.append(Problem('unreadable config', 'config.yml', f'malformed managed file {entry!r}'))
+            continue
+        # emitted files have no template
+        managed.update(f.path for t in ts for f in t.files() if not isinstance(f, template.EmittedFile))
+    snapshot.save()
+
+    saved = set()
+    for directory, _, files in os.walk(config.templates_dir):
+        for f in files:
+            if f.endswith('.j2'):
+                saved.add(os.path.relpath(template.remove_j2(os.path.join(directory, f)), config.templates_dir))
+
+    return problems + [
+        Problem('missing template', path, f"'{path}' is managed, but has no template")
+        for path in sorted(managed - saved)
+    ] + [
+        Problem('unused template', path, f"'{path}' isn't a managed file")
+        # an unknown emitter is more likely a typo than a template left over
+        for path in sorted(saved - managed - unknown)
+    ]
+
+def check(catalog: Optional[cat.Catalog] = None) -> list[Problem]:
+    '''checks the whole library in one pass, from the catalog
+
+    Parameters
+    ----------
+    catalog : Catalog, optional
+        the catalog to check (default is None, meaning the persisted catalog,
+        refreshed first)
+
+    Returns
+    -------
+    list[Problem]
+        the problems, errors first
+    '''
+    catalog = catalog if catalog else cat.refreshed()
+    problems = check_themes(catalog) + check_palettes(catalog) + check_templates()
+    order = errors + warnings
+    return sorted(problems, key=lambda p: order.index(p.kind))
@@ -0,0 +1,59 @@
+from .. import backup
+from typing import Optional
+from tabulate import tabulate
+from datetime import datetime
+
+import typer
+import sys
+import os
+
+app = typer.Typer(help=f'''manages backups of the files replaced by deploys
+
+every file a deploy replaces is kept (once per distinct content) in
+{backup.store_dir}
+
+once a file has {2 * backup.max_backups} backups, all but the newest {backup.max_backups} are pruned''')
+
+def absolute(path: str) -> str:
+    '''path relative to $HOME, made absolute'''
+    return os.path.abspath(os.path.join(os.environ['HOME'], os.path.expanduser(path)))
+
+def relative(path: str) -> str:
+    '''absolute path, made relative to $HOME when it is under $HOME'''
+    home = os.environ['HOME']
+    return os.path.relpath(path, home) if path.startswith(home.rstrip('/') + '/') else path
+
+@app.command()
+def ls(path: Optional[str] = typer.Argument(None, help='only list backups of this file (relative to $HOME)')):
+    '''lists backups, newest first'''
+    backups = backup.history(absolute(path)) if path else list(reversed(backup.load()))
+    print(tabulate(
+        [
+            [b.id, datetime.fromtimestamp(b.time).strftime('%Y-%m-%d %H:%M:%S'), relative(b.path), b.size, b.digest[:12]]
+            for b in backups
+        ],
+        headers=['id', 'time', 'path', 'bytes', 'sha256']
+    ))
+
+@app.command(help='''restores a backed up version of a file
+
+the file's current version is backed up first, so a restore can be undone''')
+def restore(
+        path: str = typer.Argument(..., help='file to restore (relative to $HOME)'),
+        id: Optional[int] = typer.Option(None, help='id of the backup to restore (default is the latest backup of the file)')
+):
+    try:
+        b = backup.restore(absolute(path), id)
+    except backup.BackupNotFoundError as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
+
+    print(f'"{path}" restored from backup {b.id}')
+
+@app.command(help='''removes all but the newest backups of each file
+
+the ids of the remaining backups change''')
+def prune(keep: int = typer.Option(backup.max_backups, min=0, help='backups to keep of each file')):
+    before = len(backup.load())
+    backup.prune(keep)
+    print(f'removed {before - len(backup.load())} backups')
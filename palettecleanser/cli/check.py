@@ -0,0 +1,34 @@
+from .. import check as chk
+from .. import catalog
+from tabulate import tabulate
+
+import typer
+import sys
+
+
+def check(
+        strict: bool = typer.Option(False, '--strict', help='also exit with 1 for warnings (changed images, orphaned palettes, unused templates)')
+):
+    problems = chk.check()
+    if problems:
+        print(tabulate(
+            [[p.kind, p.subject, p.detail] for p in problems],
+            headers=['problem', 'in', 'detail']
+        ))
+
+    errors = sum(p.is_error for p in problems)
+    print(f'{errors} errors, {len(problems) - errors} warnings', file=sys.stderr)
+
+    if errors or (strict and problems):
+        raise typer.Exit(1)
+
+description = f'''checks the whole library for broken references
+
+reports themes that refer to palettes or images that don't exist, managed
+files without a template, an unreadable or malformed config.yml (errors, which
+break deploying), images that changed
+since their theme was saved, palettes no theme uses and templates of files
+that aren't managed (warnings); exits with 1 if there are errors
+
+checks the index at {catalog.catalog_path} rather than every theme, so only
+themes added or edited since the last check are read'''
@@ -0,0 +1,91 @@
+'''lightweight entry point for pclean
+
+forwards the commands that are worth keeping fast (see forwarded_commands) to
+the palette-cleanser daemon when it is running, and only falls back to
+importing the full cli (numpy, pywal, jinja2, ...) when it isn't
+'''
+from .. import paths
+from typing import Optional
+
+import json
+import os
+import socket
+import sys
+
+# argv prefixes that may be served by the daemon
+forwarded_commands = [
+    ['theme', 'deploy'],
+    ['palette', 'show'],
+]
+
+def is_forwarded(argv: list[str]) -> bool:
+    '''whether the command line should be served by the daemon
+
+    Parameters
+    ----------
+    argv : list[str]
+        command line arguments, not including the program name
+
+    Returns
+    -------
+    bool
+        True if argv is one of the forwarded commands and isn't asking for --help
+    '''
+    return (
+        any(argv[:len(command)] == command for command in forwarded_commands)
+        and '--help' not in argv
+    )
+
+def request(argv: list[str]) -> dict:
+    '''message asking the daemon to run a command line as if it were run here
+
+    the daemon runs it in this process's working directory and environment,
+    so relative paths, $PAGER and the environment of reload hooks are the
+    caller's rather than the daemon's
+
+    Parameters
+    ----------
+    argv : list[str]
+        command line arguments, not including the program name
+    '''
+    return {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+
+def send(message: dict) -> Optional[dict]:
+    '''sends a single message to the daemon and waits for the reply
+
+    Parameters
+    ----------
+    message : dict
+        json serializable request
+
+    Returns
+    -------
+    Optional[dict]
+        the daemon's reply; None if the daemon isn't running
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(paths.daemon_socket)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        with connection.makefile('rb') as replies:
+            reply = replies.readline()
+
+    # the daemon went away mid-request
+    return json.loads(reply) if reply else None
+
+def main():
+    '''pclean entry point'''
+    argv = sys.argv[1:]
+
+    if is_forwarded(argv):
+        reply = send(request(argv))
+        if reply is not None:
+            sys.stdout.write(reply['stdout'])
+            sys.stderr.write(reply['stderr'])
+            sys.exit(reply['code'])
+
+    from .main import app
+    app()
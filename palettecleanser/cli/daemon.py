@@ -0,0 +1,242 @@
+from .. import paths
+
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import typer
+
+from . import client
+from typing import Iterator, Optional
+
+app = typer.Typer(help=f'''keeps themes, palettes and compiled templates loaded between commands
+
+while the daemon is running, {", ".join(" ".join(c) for c in client.forwarded_commands)}
+are served by it over {paths.daemon_socket} instead of starting from scratch''')
+
+
+@contextlib.contextmanager
+def context(cwd: str, env: Optional[dict[str, str]] = None) -> Iterator[None]:
+    '''switches the daemon to the working directory and environment of a request, and back afterwards'''
+    original_cwd, original_env = os.getcwd(), dict(os.environ)
+    os.chdir(cwd)
+    if env is not None:
+        os.environ.clear()
+        os.environ.update(env)
+
+    try:
+        yield
+    finally:
+        os.chdir(original_cwd)
+        if env is not None:
+            os.environ.clear()
+            os.environ.update(original_env)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    '''handles one json message per line
+
+    messages are either {"argv": [...], "cwd": ..., "env": {...}}, which runs a
+    pclean command line in the given working directory and environment (see
+    client.request), or {"control": "ping" | "stop"}
+    '''
+    def handle(self):
+        for line in self.rfile:
+            message = json.loads(line)
+
+            if 'argv' in message:
+                reply = self.server.run(message['argv'], message.get('cwd'), message.get('env'))
+            elif message.get('control') == 'stop':
+                reply = {'stopped': True}
+            else:
+                reply = self.server.status()
+
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+            if message.get('control') == 'stop':
+                self.server.shutdown()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''unix socket server that runs pclean commands in-process
+
+    each connection is handled in its own thread, but commands run one at a
+    time, which keeps captured output from interleaving and serializes
+    deploys; deploys waiting for their turn are coalesced like deploys run
+    from separate processes (see palettecleanser.deploy.run): once a newer
+    deploy of the same scope is waiting, the older one is dropped
+    '''
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        super().__init__(path, RequestHandler)
+        os.chmod(path, 0o600)
+        self.started = time.time()
+        self.served = 0
+        # held while a command runs
+        self.lock = threading.Lock()
+        # guards the tickets below, which are issued before waiting for lock
+        self.tickets_lock = threading.Lock()
+        self.issued = 0
+        # latest ticket and number of dropped deploys of each scope
+        self.latest: dict[str, int] = {}
+        self.coalesced: dict[str, int] = {}
+
+    def deploy_scope(self, argv: list[str], cwd: str) -> Optional[str]:
+        '''scope of a command line that deploys a theme (see cli.theme.deploy_scope), or None for any other command line'''
+        if argv[:2] != ['theme', 'deploy']:
+            return None
+
+        from typer.main import get_command
+        from . import theme as theme_cli
+
+        try:
+            params = get_command(theme_cli.app).get_command(None, 'deploy').make_context('deploy', argv[2:], resilient_parsing=True).params
+        except Exception:
+            # the command reports malformed command lines itself
+            return None
+        if params['dry_run']:
+            return None
+
+        return theme_cli.deploy_scope(params['path'], [os.path.abspath(os.path.join(cwd, r)) for r in params['root']])
+
+    def run(self, argv: list[str], cwd: Optional[str] = None, env: Optional[dict[str, str]] = None) -> dict:
+        '''runs a pclean command line once no other command is running, capturing its output and exit code
+
+        Parameters
+        ----------
+        argv : list[str]
+            command line arguments, not including the program name
+        cwd : str, optional
+            working directory to run the command in (default is None, meaning
+            the daemon's)
+        env : dict[str, str], optional
+            environment to run the command in (default is None, meaning the
+            daemon's)
+
+        Returns
+        -------
+        dict
+            "code", "stdout" and "stderr" of the command
+        '''
+        # imported here since the cli imports this module
+        from .main import app
+
+        cwd = cwd if cwd else os.getcwd()
+        scope = self.deploy_scope(argv, cwd)
+        if scope is not None:
+            with self.tickets_lock:
+                self.issued += 1
+                ticket = self.latest[scope] = self.issued
+
+        with self.lock:
+            coalesced = 0
+            if scope is not None:
+                with self.tickets_lock:
+                    if self.latest[scope] != ticket:
+                        # latest wins: a newer deploy of the same scope is waiting
+                        self.coalesced[scope] = self.coalesced.get(scope, 0) + 1
+                        return {'code': 0, 'stdout': 'skipped: superseded by a newer deploy\n', 'stderr': ''}
+                    coalesced = self.coalesced.pop(scope, 0)
+
+            stdout, stderr = io.StringIO(), io.StringIO()
+            if coalesced:
+                print(f'coalesced {coalesced} pending deploy{"s" if coalesced > 1 else ""} into this one', file=stdout)
+
+            code = 0
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    with context(cwd, env):
+                        app(argv, prog_name='pclean')
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else 1
+                except Exception as e:
+                    print(f'{type(e).__name__}: {e}', file=sys.stderr)
+                    code = 1
+
+            self.served += 1
+            return {'code': code, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+    def status(self) -> dict:
+        '''process id, uptime and number of commands served so far'''
+        return {'pid': os.getpid(), 'uptime': time.time() - self.started, 'served': self.served}
+
+    def serve(self):
+        '''handles requests until a stop message is received'''
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            os.remove(self.server_address)
+
+
+def bind(path: str) -> Server:
+    '''binds a Server to path, replacing the socket of a daemon that didn't shut down cleanly
+
+    Parameters
+    ----------
+    path : str
+        socket path
+
+    Returns
+    -------
+    Server
+        server bound to path
+
+    Raises
+    ------
+    FileExistsError
+        if another daemon is already listening on path
+    '''
+    if os.path.exists(path):
+        if client.send({'control': 'ping'}) is not None:
+            raise FileExistsError(f'a daemon is already listening on {path}')
+        os.remove(path)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return Server(path)
+
+
+@app.command()
+def start():
+    '''runs the daemon in the foreground'''
+    try:
+        server = bind(paths.daemon_socket)
+    except FileExistsError as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
+
+    # pay for the heavy imports up front rather than on the first request
+    from . import main
+
+    print(f'listening on {paths.daemon_socket}')
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command()
+def stop():
+    '''stops the running daemon'''
+    if client.send({'control': 'stop'}) is None:
+        print('daemon is not running', file=sys.stderr)
+        raise typer.Exit(1)
+
+    print('daemon stopped')
+
+
+@app.command()
+def status():
+    '''prints whether the daemon is running'''
+    reply = client.send({'control': 'ping'})
+    if reply is None:
+        print('daemon is not running')
+        raise typer.Exit(1)
+
+    print(f"daemon running as pid {reply['pid']} for {reply['uptime']:.0f}s, served {reply['served']} commands")
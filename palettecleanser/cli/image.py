@@ -0,0 +1,43 @@
+from .. import dedupe as dd
+from .. import quantize
+from typing import Optional
+
+import typer
+import sys
+import os
+
+app = typer.Typer(help='works with collections of images (e.g. wallpapers)')
+
+@app.command(help='''lists groups of near-duplicate images under a directory
+
+images are compared by perceptual hash, so resized, recompressed or lightly
+edited copies of an image end up in the same group; the largest image of each
+group is listed first''')
+def dedupe(
+        directory: str = typer.Argument(..., help='directory to search for images'),
+        method: str = typer.Option('dhash', metavar='HASH', help=f'perceptual hash to compare images by: {" or ".join(dd.methods)} (more robust to edits, slower)'),
+        distance: int = typer.Option(dd.default_distance, min=0, max=64, metavar='BITS', help='most bits two hashes may differ in for their images to be duplicates'),
+        jobs: Optional[int] = typer.Option(None, metavar='N', help='number of processes to hash images with (default is one per cpu)')
+):
+    groups = find_groups(directory, method, distance, jobs)
+
+    duplicates = [g for g in groups if len(g) > 1]
+    for g in duplicates:
+        print(g[0].path)
+        for h in g[1:]:
+            print(f'  {h.path}')
+
+    images = sum(len(g) for g in groups)
+    print(f'{images} images, {len(groups)} distinct, {images - len(groups)} duplicates', file=sys.stderr)
+
+def find_groups(directory: str, method: str, distance: int, jobs: Optional[int]) -> list[list[dd.ImageHash]]:
+    '''groups the images under directory, exiting with a message on errors'''
+    if not os.path.isdir(directory):
+        print(f"'{directory}' is not a directory", file=sys.stderr)
+        raise typer.Exit(1)
+
+    try:
+        return dd.dedupe(directory, method, distance, jobs)
+    except (quantize.PillowNotFoundError, ValueError) as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
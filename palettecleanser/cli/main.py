@@ -3,8 +3,16 @@ import typer
 from . import palette
 from . import theme
 from . import template
+from . import daemon
+from . import backup
+from . import image
+from . import check
 
 app = typer.Typer(help='abstracts color scheming from desktop configuration')
 app.add_typer(palette.app, name='palette')
 app.add_typer(theme.app, name='theme')
 app.add_typer(template.app, name='template')
+app.add_typer(daemon.app, name='daemon')
+app.add_typer(backup.app, name='backup')
+app.add_typer(image.app, name='image')
+app.command(name='check', help=check.description)(check.check)
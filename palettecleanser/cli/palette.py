@@ -1,9 +1,18 @@
 from .. import palette as pal
 from .. import config
+from .. import catalog
+from .. import animation
+from .. import backends
+from .. import compare as cmp
+from .. import audit as aud
+from .. import harmony
+from .. import preview as pv
 from typing import Optional, Any
+from tabulate import tabulate
 
 import typer
 import subprocess
+import shutil
 import sys
 import os
 
@@ -24,10 +33,19 @@ def show(name: str = typer.Argument(..., help='name of saved palette')):
 
 
 @app.command()
-def ls():
+def ls(
+        preview: bool = typer.Option(False, '--preview', help='show the colors of each palette, as they load'),
+        pager: bool = typer.Option(True, help='page the preview with $PAGER (less by default) when printing to a terminal'),
+        jobs: Optional[int] = typer.Option(None, min=1, metavar='N', help='number of processes loading palettes for the preview (default is one per cpu)')
+):
     '''lists saved palettes'''
-    for palette_file in os.listdir(config.palettes_dir):
-        print(os.path.splitext(palette_file)[0])
+    if not preview:
+        for palette_file in os.listdir(config.palettes_dir):
+            print(os.path.splitext(palette_file)[0])
+        return
+
+    size = shutil.get_terminal_size()
+    pv.write(pv.palettes(pal.names(), size.columns, jobs), pager, size.lines)
 
 
 @app.command(help=f'''creates palette from list of colors
@@ -57,14 +75,21 @@ def generate_from_image(
         name: Optional[str] = None,
         light: bool = False,
         backend: str = 'wal',
-        saturate_percent: Optional[float] = None
+        saturate_percent: Optional[float] = None,
+        frame_stride: Optional[int] = None
 ):
     '''generates palette from image
 
     see palettecleanser.palette.from_image for more details
     '''
     try:
-        p = pal.from_image(image_path, name, light, backend, saturate_percent)
+        if frame_stride:
+            p = pal.from_animation(image_path, name, light, backend, saturate_percent, frame_stride)
+        else:
+            p = pal.from_image(image_path, name, light, backend, saturate_percent)
+    except (animation.FramesNotReadableError, backends.BackendNotAvailableError) as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
     except:
         print(f"'{image_path}' either couldn't be found or isn't an image", file=sys.stderr)
         raise typer.Exit(1)
@@ -75,17 +100,51 @@ def generate_from_image(
         print(f'"{name}" saved to {config.palettes_dir}/{name}.yml')
 
 
-# TODO: --help type flag for available algorithms
+def generate_from_harmony(
+        scheme: str,
+        seeds: list[str],
+        count: int = 1,
+        name: Optional[str] = None,
+        light: bool = False
+):
+    '''generates palettes in harmony with seed colors
+
+    see palettecleanser.harmony.generate for more details
+    '''
+    try:
+        palettes = harmony.generate([pal.from_hex(s) for s in seeds], scheme, count, light, name)
+    except (pal.MalformedHexError, ValueError) as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
+
+    # side by side, a few at a time
+    for i in range(0, len(palettes), 6):
+        print(tabulate({k: v for p in palettes[i:i + 6] for k, v in p.table().items()}, headers='keys'))
+        print()
+
+    if name:
+        pal.save_all(palettes)
+        print(f'{len(palettes)} palettes saved to {config.palettes_dir}')
+
+
 @app.command(help=f'''generates a palette
 
-if --name option is passed, saves palette to {config.palettes_dir}
-where it can be manually edited later''')
+with --harmony, generates --count candidate palettes for each --seed color,
+whose other colors are placed at harmonious hues
+
+if --name option is passed, saves palettes to {config.palettes_dir}
+where they can be manually edited later (palettes generated with --harmony
+are named NAME-RRGGBB-N, after their seed)''')
 def generate(
         from_image: str = typer.Option('', metavar='PATH', help='generate palette from image at the specified path'),
+        harmony_scheme: Optional[str] = typer.Option(None, '--harmony', metavar='SCHEME', help=f'generate palettes in harmony with --seed: {", ".join(harmony.schemes)}'),
+        seed: Optional[list[str]] = typer.Option(None, metavar='#RRGGBB', help='color to build harmonies around, e.g. a brand color; may be passed several times'),
+        count: int = typer.Option(1, min=1, metavar='N', help='number of candidate palettes per seed, with --harmony'),
         name: Optional[str] = typer.Option(None, metavar='NAME', help=f'saves the palette to "{config.palettes_dir}" with specified name'),
         light: bool = typer.Option(False, help='generate a light color palette'),
-        backend: str = typer.Option('wal', metavar='BACKEND', help='pywal backend to use for image-to-palette algorithm; --from-image must be passed'),
-        saturate_percent: Optional[float] = typer.Option(None, metavar='PERCENTAGE', help=f'amount to saturate colors by (5 means 5%)')
+        backend: str = typer.Option('wal', metavar='BACKEND', help=f'backend to use for image-to-palette algorithm ({", ".join(backends.names())}; see `pclean palette compare`); --from-image must be passed'),
+        saturate_percent: Optional[float] = typer.Option(None, metavar='PERCENTAGE', help=f'amount to saturate colors by (5 means 5%)'),
+        frame_stride: Optional[int] = typer.Option(None, min=1, metavar='N', help='treat the image as an animation (gif, apng, webp) or video (requires ffmpeg) and sample every Nth frame')
 ):
     if from_image:
         generate_from_image(
@@ -93,9 +152,115 @@ def generate(
             name,
             light,
             backend,
-            saturate_percent
+            saturate_percent,
+            frame_stride
         )
+    elif harmony_scheme:
+        if not seed:
+            print('--harmony needs at least one --seed color', file=sys.stderr)
+            raise typer.Exit(1)
+        generate_from_harmony(harmony_scheme, seed, count, name, light)
+
+
 
+@app.command(help='''extracts a palette from an image with every backend at once
+
+each palette is scored (0-1) on contrast against its background, how well
+its colors fit their ansi slots and how distinguishable they are, to help
+pick a backend for the image''')
+def compare(
+        image: str = typer.Argument(..., help='image to extract palettes from'),
+        backend: Optional[list[str]] = typer.Option(None, metavar='NAME', help=f'only compare this backend; may be passed several times (backends are {", ".join(backends.names())})'),
+        light: bool = typer.Option(False, help='generate light color palettes'),
+        saturate_percent: Optional[float] = typer.Option(None, metavar='PERCENTAGE', help=f'amount to saturate colors by (5 means 5%)'),
+        jobs: Optional[int] = typer.Option(None, metavar='N', help='number of processes (default is one per backend)')
+):
+    if not os.path.isfile(image):
+        print(f"'{image}' couldn't be found", file=sys.stderr)
+        raise typer.Exit(1)
+
+    unknown = [b for b in backend if b not in backends.names()] if backend else []
+    if unknown:
+        print(f"unknown backend{'s' if len(unknown) > 1 else ''} {', '.join(unknown)}; must be one of {', '.join(backends.names())}", file=sys.stderr)
+        raise typer.Exit(1)
+
+    results = cmp.compare(image, backend, light, saturate_percent, jobs)
+    print(tabulate(
+        [
+            [
+                r.backend,
+                ''.join(c.show() for c in r.palette.colors) if r.palette else r.error,
+                *([f'{r.scores.total:.2f}', f'{r.scores.contrast:.2f}', f'{r.scores.fit:.2f}', f'{r.scores.spread:.2f}'] if r.scores else [''] * 4),
+                f'{r.seconds:.2f}s'
+            ]
+            for r in results
+        ],
+        headers=['backend', 'palette', 'score', 'contrast', 'fit', 'spread', 'time']
+    ))
+
+
+@app.command(help=f'''checks that the colors of palettes are readable
+
+reports colors whose WCAG contrast ratio with the background is too low, and
+pairs of colors that look alike with a colour vision deficiency (protanopia,
+deuteranopia or tritanopia); exits with 1 if anything fails
+
+with --fix, saves copies of the palettes that fail the contrast check, with
+those colors lightened or darkened just enough, to {config.palettes_dir};
+saved palettes with the same names as the copies are overwritten''')
+def audit(
+        names: Optional[list[str]] = typer.Argument(None, help='names of saved palettes to audit'),
+        all: bool = typer.Option(False, '--all', help='audit every saved palette'),
+        background: int = typer.Option(0, min=0, metavar='INDEX', help='index of the background color'),
+        min_contrast: float = typer.Option(aud.default_min_contrast, min=1, max=21, metavar='RATIO', help='lowest contrast ratio allowed against the background (4.5 is WCAG AA, 7 is AAA)'),
+        min_distance: float = typer.Option(aud.default_min_distance, min=0, metavar='OKLAB', help='lowest oklab distance allowed between colors, as seen with a colour vision deficiency'),
+        fix: bool = typer.Option(False, '--fix', help='save adjusted copies of the palettes that fail the contrast check, overwriting saved palettes of the same names'),
+        suffix: str = typer.Option('-fixed', metavar='TEXT', help='appended to the names of the adjusted copies')
+):
+    if not names and not all:
+        print('pass the names of palettes to audit, or --all', file=sys.stderr)
+        raise typer.Exit(1)
+
+    palettes = []
+    for name in names if names else pal.names():
+        try:
+            p = pal.from_config(name)
+        except pal.PaletteNotFoundError:
+            print(f"couldn't find '{name}' in saved palettes", file=sys.stderr)
+            raise typer.Exit(1)
+        # reported by the name it is saved under
+        p.name = name
+        palettes.append(p)
+
+    short = [p.name for p in palettes if background >= len(p.colors)]
+    if short:
+        print(f"background index {background} is out of range for {', '.join(short)}; must be less than {min(len(p.colors) for p in palettes)}", file=sys.stderr)
+        raise typer.Exit(1)
+
+    report = aud.audit(palettes)
+    failures = report.failures(background, min_contrast, min_distance)
+    colors = {p.name: p.colors for p in palettes}
+    print(tabulate(
+        [
+            [f.palette, f.check, f'{colors[f.palette][f.first].show()} {colors[f.palette][f.second].show()}', f'{f.value:.2f}' if f.check == 'contrast' else f'{f.value:.3f}']
+            for f in failures
+        ],
+        headers=['palette', 'check', 'colors', 'value']
+    ))
+
+    failed = {f.palette for f in failures}
+    print(f'{len(palettes)} palettes audited, {len(failed)} with failures', file=sys.stderr)
+
+    if fix:
+        low = {f.palette for f in failures if f.check == 'contrast'}
+        fixed = [p for p in report.adjusted(background, min_contrast) if p.name in low]
+        for p in fixed:
+            p.name += suffix
+        pal.save_all(fixed)
+        print(f'{len(fixed)} adjusted palettes saved to {config.palettes_dir}', file=sys.stderr)
+
+    if failed:
+        raise typer.Exit(1)
 
 
 @app.command()
@@ -107,6 +272,7 @@ def remove(name: str = typer.Argument(..., help='name of palette to remove from
         print(f"couldn't find '{name}' in saved palettes", file=sys.stderr)
         print(f"check that '{name}.yml' exists in '{config.palettes_dir}'", file=sys.stderr)
         raise typer.Exit(1)
+    catalog.forget_palette(name)
 
     print(f'"{name}" successfully removed from saved palettes')
 
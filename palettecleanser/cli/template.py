@@ -1,5 +1,6 @@
 from .. import config
 from .. import template
+from typing import Optional
 
 import typer
 import sys
@@ -17,9 +18,23 @@ application working), the settings from the current configuration file, and
 overwrite settings (mostly template expressions for the given application's
 color schemes); in other words, the current configuration file will take
 precedence over the default settings and the overwrite settings will take
-precedence over the current configuration file.''')
-def create(path: str = typer.Argument(..., help='path to configuration file relative to $HOME')):
-    template.TemplateFile(path).create()
+precedence over the current configuration file.
+
+if no path is passed, creates templates for all managed files, skipping
+those whose inputs haven't changed since they were last created''')
+def create(
+        path: Optional[str] = typer.Argument(None, help='path to configuration file relative to $HOME'),
+        jobs: Optional[int] = typer.Option(None, metavar='N', help='number of templates to create at once when creating all managed files')
+):
+    if not path:
+        statuses = template.create_managed(jobs)
+        print(f"{statuses['created']} templates created, {statuses['unchanged']} unchanged, {statuses['binary']} binary files skipped, {statuses['emitted']} emitted files need none")
+        return
+
+    if template.TemplateFile(path).create()['binary']:
+        print(f'"{path}" is a binary file and can\'t be templated', file=sys.stderr)
+        raise typer.Exit(1)
+
     print(f'"{config.templates_dir}/{path}.j2" template successfully created')
 
 
@@ -1,11 +1,27 @@
 from .. import theme
 from .. import template
 from .. import config
+from .. import catalog
 from .. import palette as pal
-from typing import Optional, Any
+from .. import deploy as dep
+from .. import isolate
+from .. import metrics
+from .. import quantize
+from .. import animation
+from .. import backends
+from .. import dedupe as dd
+from .. import preview as pv
+from .. import transition as tr
+from .. import emitters
+from . import image as image_cli
+from contextlib import contextmanager
+from typing import Optional, Any, Iterator
+from tabulate import tabulate
 
 import typer
 import subprocess
+import shutil
+import json
 import sys
 import os
 import jinja2 as j2
@@ -14,6 +30,60 @@ app = typer.Typer(help=f'''manages your themes
 
 saved themes can be found and manually edited at {config.themes_dir}''')
 
+# instrumentation options shared by deploy, transition, generate and batch
+profile_option = typer.Option(False, '--profile', help='print how long each stage took (e.g. compile, render, write, commit), and counters such as bytes written and cache hits')
+metrics_json_option = typer.Option(None, '--metrics-json', metavar='PATH', help='write the stage timings and counters to PATH as json')
+cprofile_option = typer.Option(None, '--cprofile', metavar='PATH', help='run cProfile and save its stats to PATH')
+trace_memory_option = typer.Option(False, '--trace-memory', help='trace memory allocations and report the largest allocation sites; implies --profile unless --metrics-json is passed')
+
+
+@contextmanager
+def instrumented(profile: bool, metrics_json: Optional[str], cprofile: Optional[str], trace_memory: bool) -> Iterator[None]:
+    '''records metrics for the enclosed command, if any instrumentation was asked for, and reports them'''
+    if not (profile or metrics_json or cprofile or trace_memory):
+        yield
+        return
+
+    try:
+        with metrics.recording(cprofile, trace_memory) as recorded:
+            yield
+    finally:
+        if profile or (trace_memory and not metrics_json):
+            print_metrics(recorded)
+        if metrics_json:
+            with open(metrics_json, 'w') as f:
+                json.dump(recorded.export(), f, indent=2)
+
+
+def print_metrics(recorded: metrics.Metrics):
+    '''prints stage timings, counters and allocation sites'''
+    print(file=sys.stderr)
+    print(tabulate(
+        [[name, s.count, f'{s.total:.4f}s', f'{s.longest:.4f}s'] for name, s in recorded.spans.items()] + [['total', '', f'{recorded.elapsed:.4f}s', '']],
+        headers=['stage', 'count', 'time', 'longest']
+    ), file=sys.stderr)
+
+    if recorded.counters:
+        print(file=sys.stderr)
+        print(tabulate(sorted(recorded.counters.items()), headers=['counter', 'value']), file=sys.stderr)
+
+    if recorded.allocations:
+        print(file=sys.stderr)
+        print(tabulate([[site, f'{size / 2**10:.1f} KiB'] for site, size in recorded.allocations], headers=['allocated at', 'size']), file=sys.stderr)
+
+
+def deploy_scope(path: Optional[str], roots: Optional[list[str]]) -> str:
+    '''scope of a deploy (see deploy.enqueue); deploys only supersede each other if they cover the same files
+
+    Parameters
+    ----------
+    path : str, optional
+        template being deployed, if only one is
+    roots : list[str], optional
+        absolute paths of the roots being deployed to, if not just $HOME
+    '''
+    return ':'.join([path if path else ''] + (roots if roots else []))
+
 
 @app.command()
 def show(name: str = typer.Argument(..., help='name of saved theme')):
@@ -26,10 +96,19 @@ def show(name: str = typer.Argument(..., help='name of saved theme')):
         raise typer.Exit(1)
 
 @app.command()
-def ls():
+def ls(
+        preview: bool = typer.Option(False, '--preview', help="show the colors of each theme's palettes, as they load"),
+        pager: bool = typer.Option(True, help='page the preview with $PAGER (less by default) when printing to a terminal'),
+        jobs: Optional[int] = typer.Option(None, min=1, metavar='N', help='number of processes loading themes for the preview (default is one per cpu)')
+):
     '''lists saved themes'''
-    for theme_file in os.listdir(config.themes_dir):
-        print(os.path.splitext(theme_file)[0])
+    if not preview:
+        for theme_file in os.listdir(config.themes_dir):
+            print(os.path.splitext(theme_file)[0])
+        return
+
+    size = shutil.get_terminal_size()
+    pv.write(pv.themes(theme.names(), size.columns, jobs), pager, size.lines)
 
 
 # TODO: add some sort of loading/processing text
@@ -37,26 +116,191 @@ def ls():
 @app.command(help=f'''evaluates jinja2 in managed templates and
 saves them to their respective paths under {os.environ['HOME']}
 
-if --template option is passed, only evaluates that specific template ''')
+if --template option is passed, only evaluates that specific template
+
+with --dry-run, nothing is written; the files that would change are listed
+(or, with --diff, shown as unified diffs) instead''')
 def deploy(
         name: str = typer.Argument(..., help='name of saved theme'),
-        path: Optional[str] = typer.Option(None, '--template', metavar='PATH', help='path to configuration file relative to $HOME')
+        path: Optional[str] = typer.Option(None, '--template', metavar='PATH', help='path to configuration file relative to $HOME'),
+        debug: bool = typer.Option(False, help='count and print the filesystem calls made for each file, by os function (e.g. stat, replace) and raw read and write'),
+        root: Optional[list[str]] = typer.Option(None, metavar='DIR', help='deploy to DIR instead of $HOME; may be passed several times to render once and write to each DIR'),
+        isolated: bool = typer.Option(False, help='render each template in a separate worker process with cpu time and memory limits; templates that fail or exceed them are skipped'),
+        cpu_time: float = typer.Option(isolate.default_cpu_time, metavar='SECONDS', help='cpu time each template may take to render, with --isolated'),
+        memory: int = typer.Option(isolate.default_memory // 2**20, metavar='MIB', help='memory each template may allocate, with --isolated'),
+        dry_run: bool = typer.Option(False, '--dry-run', help="render in memory and list the files that would change, without writing anything"),
+        diff: bool = typer.Option(False, '--diff', help='with --dry-run, print a unified diff of each change'),
+        profile: bool = profile_option,
+        metrics_json: Optional[str] = metrics_json_option,
+        cprofile: Optional[str] = cprofile_option,
+        trace_memory: bool = trace_memory_option
+):
+    with instrumented(profile, metrics_json, cprofile, trace_memory):
+        try:
+            t = theme.from_config(name)
+        except theme.ThemeNotFoundError:
+            print(f"couldn't find '{name}' in saved themes", file=sys.stderr)
+            print(f"check that '{name}.yml' exists in '{config.themes_dir}'", file=sys.stderr)
+            raise typer.Exit(1)
+
+        roots = [os.path.abspath(r) for r in root] if root else None
+        for r in roots if roots else []:
+            if not os.path.isdir(r):
+                print(f"'{r}' is not a directory", file=sys.stderr)
+                raise typer.Exit(1)
+
+        if dry_run:
+            try:
+                for r in roots if roots else [None]:
+                    print_changes(dep.preview_theme(t, path, r, diff), r if roots and len(roots) > 1 else None)
+            except j2.exceptions.TemplateNotFound:
+                print(f"couldn't find '{path}' in saved templates", file=sys.stderr)
+                print(f"check that '{config.themes_dir}/{path}.j2' exists", file=sys.stderr)
+                raise typer.Exit(1)
+            except emitters.UnknownEmitterError as e:
+                print(e, file=sys.stderr)
+                raise typer.Exit(1)
+            return
+
+        scope = deploy_scope(path, roots)
+
+        limits = isolate.Limits(cpu_time, memory * 2**20) if isolated else None
+
+        try:
+            report = dep.schedule(lambda: dep.deploy_theme(t, path, debug, roots, limits), scope)
+        except j2.exceptions.TemplateNotFound:
+            print(f"couldn't find '{path}' in saved templates", file=sys.stderr)
+            print(f"check that '{config.themes_dir}/{path}.j2' exists", file=sys.stderr)
+            raise typer.Exit(1)
+        except emitters.UnknownEmitterError as e:
+            print(e, file=sys.stderr)
+            raise typer.Exit(1)
+
+        if not report.ran:
+            print('skipped: superseded by a newer deploy')
+            return
+
+        if report.coalesced:
+            print(f'coalesced {report.coalesced} pending deploy{"s" if report.coalesced > 1 else ""} into this one')
+
+        print_deployment(report.result)
+
+        if report.result.failures or any(r.error for r in report.result.roots):
+            raise typer.Exit(1)
+
+
+@app.command(help=f'''gradually deploys one theme over another
+
+every palette color is interpolated between the themes, and the frames are
+deployed at a steady rate to the managed files that have reload hooks (or to
+--template), so live reloading applications fade from one theme to the
+other; frames are dropped when rendering falls behind; the destination theme
+is then deployed to every managed file
+
+the files replaced by the first frame are backed up, but the frames in
+between aren't''')
+def transition(
+        start: str = typer.Argument(..., metavar='FROM', help='name of saved theme to start from (usually the deployed one)'),
+        end: str = typer.Argument(..., metavar='TO', help='name of saved theme to end at'),
+        duration: str = typer.Option('2s', metavar='TIME', help='how long the transition takes, e.g. 2s, 500ms or 1m'),
+        fps: float = typer.Option(15, min=0.01, metavar='RATE', help='frames per second'),
+        path: Optional[list[str]] = typer.Option(None, '--template', metavar='PATH', help='transition this file (relative to $HOME) instead of those with reload hooks; may be passed several times'),
+        profile: bool = profile_option,
+        metrics_json: Optional[str] = metrics_json_option,
+        cprofile: Optional[str] = cprofile_option,
+        trace_memory: bool = trace_memory_option
 ):
     try:
-        t = theme.from_config(name)
-    except theme.ThemeNotFoundError:
-        print(f"couldn't find '{name}' in saved themes", file=sys.stderr)
-        print(f"check that '{name}.yml' exists in '{config.themes_dir}'", file=sys.stderr)
+        seconds = tr.parse_duration(duration)
+    except ValueError as e:
+        print(e, file=sys.stderr)
         raise typer.Exit(1)
 
-    try:
-        if path:
-            template.TemplateFile(path).template(t)
+    with instrumented(profile, metrics_json, cprofile, trace_memory):
+        themes = []
+        for name in [start, end]:
+            try:
+                themes.append(theme.from_config(name))
+            except theme.ThemeNotFoundError:
+                print(f"couldn't find '{name}' in saved themes", file=sys.stderr)
+                print(f"check that '{name}.yml' exists in '{config.themes_dir}'", file=sys.stderr)
+                raise typer.Exit(1)
+
+        try:
+            report = dep.schedule(lambda: tr.transition(*themes, seconds, fps, path))
+        except j2.exceptions.TemplateNotFound as e:
+            print(f"couldn't find '{e.name}' in saved templates", file=sys.stderr)
+            raise typer.Exit(1)
+        except emitters.UnknownEmitterError as e:
+            print(e, file=sys.stderr)
+            raise typer.Exit(1)
+
+        if not report.ran:
+            print('skipped: superseded by a newer deploy')
+            return
+
+        result = report.result
+        if not result.files:
+            print('no managed files have reload hooks, so only the final theme was deployed; pass --template to pick files to transition', file=sys.stderr)
         else:
-            template.template_managed(t)
-    except j2.exceptions.TemplateNotFound:
-        print(f"couldn't find '{path}' in saved templates", file=sys.stderr)
-        print(f"check that '{config.themes_dir}/{path}.j2' exists", file=sys.stderr)
+            print(f'{result.shown} frames of {len(result.files)} file{"" if len(result.files) == 1 else "s"} in {result.elapsed:.2f}s, {result.dropped} dropped, slowest {result.slowest * 1000:.1f}ms')
+        print_deployment(result.deployment)
+
+        if any(r.error for r in result.deployment.roots):
+            raise typer.Exit(1)
+
+
+def print_changes(changes: list[dep.Change], root: Optional[str] = None):
+    '''prints the changes a deploy would make, as diffs if they have them'''
+    prefix = f'{root}: ' if root else ''
+    for c in changes:
+        if c.diff:
+            for line in c.diff:
+                print(line, end='' if line.endswith('\n') else '\n\\ No newline at end of file\n')
+        else:
+            print(f"{prefix}{ {'added': 'A', 'modified': 'M', 'mode': 'm'}[c.status] } {c.path}")
+
+    print(f'{prefix}{len(changes)} file{"" if len(changes) == 1 else "s"} would change', file=sys.stderr)
+
+
+def print_deployment(deployment: dep.Deployment):
+    '''prints summary of a deploy'''
+    for f in deployment.failures:
+        print(f"skipped '{f.path}': {f.reason}", file=sys.stderr)
+
+    if len(deployment.roots) > 1:
+        print(tabulate(
+            [[r.root, len(r.changed), f'{r.elapsed:.3f}s', r.error if r.error else 'ok'] for r in deployment.roots],
+            headers=['root', 'changed', 'time', 'status']
+        ))
+        print()
+    else:
+        for r in deployment.roots:
+            if r.error:
+                print(f"couldn't deploy to {r.root}: {r.error}", file=sys.stderr)
+
+        print(f'{len(deployment.changed)} file{"" if len(deployment.changed) == 1 else "s"} changed', end=', ')
+
+    print(f'process high-water mark {deployment.peak_memory / 2**20:.1f} MiB (+{deployment.peak_memory_growth / 2**20:.1f} MiB during deploy)')
+
+    if deployment.syscalls:
+        calls = sorted({call for counts in deployment.syscalls.values() for call in counts})
+        print()
+        print(tabulate(
+            [[p] + [counts.get(call, 0) for call in calls] + [sum(counts.values())] for p, counts in sorted(deployment.syscalls.items())],
+            headers=['file'] + calls + ['total']
+        ))
+
+    if deployment.hook_results:
+        print()
+        print(tabulate(
+            [[r.hook.command, r.status, f'{r.elapsed:.3f}s'] for r in deployment.hook_results],
+            headers=['reload hook', 'status', 'time']
+        ))
+
+        for r in deployment.hook_results:
+            if r.returncode != 0 and r.output:
+                print(f'\n{r.hook.command}:\n{r.output}', file=sys.stderr, end='')
 
 
 @app.command(help=f'''creates theme from a list of palettes, name, image path, and additional settings
@@ -85,7 +329,8 @@ def generate_from_image(
         settings: Optional[dict[str, Any]] = None,
         light: bool = False,
         backend: str = 'wal',
-        saturate_percent: Optional[float] = None
+        saturate_percent: Optional[float] = None,
+        frame_stride: Optional[int] = None
 ):
     '''generates theme from image
 
@@ -95,16 +340,20 @@ def generate_from_image(
         settings = {}
 
     try:
-        t = theme.from_image(image_path, name, settings, light, backend, saturate_percent)
+        with metrics.span('generate'):
+            t = theme.from_image(image_path, name, settings, light, backend, saturate_percent, frame_stride)
+    except (animation.FramesNotReadableError, backends.BackendNotAvailableError) as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
     except:
         print(f"'{image_path}' either couldn't be found or isn't an image", file=sys.stderr)
         raise typer.Exit(1)
 
     print(t)
-    t.save()
+    with metrics.span('save theme'):
+        t.save()
 
 
-# TODO: --help type flag for available algorithms
 @app.command(help=f'''generates a theme and saves to
 {config.themes_dir} where it can be manually edited later''')
 def generate(
@@ -112,18 +361,119 @@ def generate(
         name: str = typer.Option(..., metavar='NAME', help=f'name of theme'),
         setting: Optional[list[str]] = typer.Option(None, metavar='KEY=VALUE', help='additional settings to initialize new theme with'),
         light: bool = typer.Option(False, help='generate a light color theme'),
-        backend: str = typer.Option('wal', metavar='BACKEND', help='pywal backend to use for image-to-palette algorithm; --from-image must be passed'),
-        saturate_percent: Optional[float] = typer.Option(None, metavar='PERCENTAGE', help=f'amount to saturate colors by (5 means 5%)')
+        backend: str = typer.Option('wal', metavar='BACKEND', help=f'backend to use for image-to-palette algorithm ({", ".join(backends.names())}; see `pclean palette compare`); --from-image must be passed'),
+        saturate_percent: Optional[float] = typer.Option(None, metavar='PERCENTAGE', help=f'amount to saturate colors by (5 means 5%)'),
+        frame_stride: Optional[int] = typer.Option(None, min=1, metavar='N', help='treat the image as an animation (gif, apng, webp) or video (requires ffmpeg) and sample every Nth frame'),
+        profile: bool = profile_option,
+        metrics_json: Optional[str] = metrics_json_option,
+        cprofile: Optional[str] = cprofile_option,
+        trace_memory: bool = trace_memory_option
 ):
     if from_image:
-        generate_from_image(
-            from_image,
-            name,
-            {k: v for k, v in [single_setting.split('=') for single_setting in setting]},
-            light,
-            backend,
-            saturate_percent
-        )
+        with instrumented(profile, metrics_json, cprofile, trace_memory):
+            generate_from_image(
+                from_image,
+                name,
+                {k: v for k, v in [single_setting.split('=') for single_setting in setting]},
+                light,
+                backend,
+                saturate_percent,
+                frame_stride
+            )
+
+
+@app.command(help=f'''generates a theme for every image under a directory and
+saves them to {config.themes_dir}
+
+near-duplicate images (resized, recompressed or lightly edited copies) are
+grouped first, and only the largest image of each group is extracted from;
+each theme is named after its image's file name''')
+def batch(
+        directory: str = typer.Argument(..., help='directory to search for images'),
+        prefix: str = typer.Option('', metavar='TEXT', help='prepended to the name of every theme'),
+        light: bool = typer.Option(False, help='generate light color themes'),
+        backend: str = typer.Option('wal', metavar='NAME', help=f'backend to use for image-to-palette algorithm ({", ".join(backends.names())})'),
+        saturate_percent: Optional[float] = typer.Option(None, metavar='PERCENTAGE', help=f'amount to saturate colors by (5 means 5%)'),
+        dedupe: bool = typer.Option(True, help='extract from one image per group of near-duplicates'),
+        method: str = typer.Option('dhash', metavar='HASH', help=f'perceptual hash to compare images by: {" or ".join(dd.methods)}'),
+        distance: int = typer.Option(dd.default_distance, min=0, max=64, metavar='BITS', help='most bits two hashes may differ in for their images to be duplicates'),
+        jobs: Optional[int] = typer.Option(None, metavar='N', help='number of processes to hash images with (default is one per cpu)'),
+        overwrite: bool = typer.Option(False, help='replace saved themes and palettes of the same names; otherwise images whose theme or palettes are already saved are skipped'),
+        profile: bool = profile_option,
+        metrics_json: Optional[str] = metrics_json_option,
+        cprofile: Optional[str] = cprofile_option,
+        trace_memory: bool = trace_memory_option
+):
+    if not os.path.isdir(directory):
+        print(f"'{directory}' is not a directory", file=sys.stderr)
+        raise typer.Exit(1)
+
+    with instrumented(profile, metrics_json, cprofile, trace_memory):
+        if dedupe:
+            with metrics.span('dedupe'):
+                groups = image_cli.find_groups(directory, method, distance, jobs)
+            images = [g[0].path for g in groups]
+            print(f'{sum(len(g) for g in groups)} images, {len(images)} distinct; extracting from the largest of each', file=sys.stderr)
+        else:
+            images = dd.find_images(directory)
+
+        failed = 0
+        for image_path in images:
+            name = prefix + os.path.splitext(os.path.basename(image_path))[0]
+            saved = [os.path.join(config.themes_dir, f'{name}.yml')] + [os.path.join(config.palettes_dir, f'{name}{tail}.yml') for tail in ['', '-dark', '-light']]
+            if not overwrite and any(os.path.exists(path) for path in saved):
+                print(f"skipped '{image_path}': {name} is already saved (pass --overwrite to replace it)", file=sys.stderr)
+                continue
+
+            try:
+                with metrics.span('generate'):
+                    # never ask, so the batch can run unattended
+                    t = theme.from_image(image_path, name, {}, light, backend, saturate_percent, overwrite=True)
+            except (Exception, SystemExit):
+                print(f"skipped '{image_path}': couldn't extract a palette", file=sys.stderr)
+                failed += 1
+                continue
+
+            with metrics.span('save theme'):
+                t.save(overwrite=True)
+            print(f'"{name}" saved to {config.themes_dir}/{name}.yml')
+
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command(help='''recolors an image to a theme's palettes
+
+every pixel is mapped to its nearest color in the theme's palettes, e.g. to
+make a wallpaper match the theme''')
+def recolor(
+        name: str = typer.Argument(..., help='name of saved theme'),
+        image: str = typer.Argument(..., help='image to recolor'),
+        out: str = typer.Argument(..., help='where to save the recolored image; the format is taken from the extension'),
+        dither: bool = typer.Option(False, help='apply ordered dithering, which approximates colors between palette colors with patterns'),
+        blend: float = typer.Option(0, min=0, max=1, metavar='FRACTION', help='fraction of the original color to keep in each pixel, to soften the result'),
+        jobs: Optional[int] = typer.Option(None, metavar='N', help='number of processes to spread the image across (default is one per cpu)')
+):
+    try:
+        t = theme.from_config(name)
+        colors = list({str(c): c for p in t.get_palettes() for c in p.colors}.values())
+    except (theme.ThemeNotFoundError, pal.PaletteNotFoundError) as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
+
+    try:
+        quantize.recolor(image, colors, out, dither, blend, jobs)
+    except quantize.PillowNotFoundError as e:
+        print(e, file=sys.stderr)
+        raise typer.Exit(1)
+    except ValueError:
+        print(f"can't tell which image format to save '{out}' as from its extension", file=sys.stderr)
+        raise typer.Exit(1)
+    except OSError:
+        print(f"'{image}' either couldn't be found or isn't an image", file=sys.stderr)
+        raise typer.Exit(1)
+
+    print(f'"{out}" recolored with {len(colors)} colors from {name}')
 
 
 @app.command()
@@ -135,6 +485,7 @@ def remove(name: str = typer.Argument(..., help='name of theme to remove from co
         print(f"couldn't find '{name}' in saved themes", file=sys.stderr)
         print(f"check that '{name}.yml' exists in '{config.themes_dir}'", file=sys.stderr)
         raise typer.Exit(1)
+    catalog.forget_theme(name)
 
     print(f'"{name}" successfully removed from saved themes')
 
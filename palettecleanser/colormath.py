@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+### GLOBAL VARS ###
+# linear srgb to lms, and cube-rooted lms to oklab (https://bottosson.github.io/posts/oklab/)
+oklab_m1 = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005],
+])
+oklab_m2 = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660],
+])
+oklab_m1_inverse = np.linalg.inv(oklab_m1)
+oklab_m2_inverse = np.linalg.inv(oklab_m2)
+# bisection steps when reducing chroma to fit the srgb gamut
+gamut_steps = 16
+
+
+### FUNCTIONS ###
+def to_linear(rgb: np.ndarray) -> np.ndarray:
+    '''converts srgb components (0-255) to linear light (0-1)'''
+    c = np.asarray(rgb, dtype=np.float64) / 255
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+def from_linear(linear: np.ndarray) -> np.ndarray:
+    '''converts linear light (0-1) to srgb components (0-255, unrounded)'''
+    c = np.clip(linear, 0, 1)
+    return 255 * np.where(c <= 0.0031308, c * 12.92, 1.055 * c ** (1 / 2.4) - 0.055)
+
+def luminance(rgb: np.ndarray) -> np.ndarray:
+    '''relative luminance (0-1) of srgb colors, as defined by WCAG
+
+    Parameters
+    ----------
+    rgb : np.ndarray
+        ... x 3 array of srgb components (0-255)
+
+    Returns
+    -------
+    np.ndarray
+        luminance of each color
+    '''
+    return to_linear(rgb) @ np.array([0.2126, 0.7152, 0.0722])
+
+def contrast(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    '''WCAG contrast ratio (1-21) between srgb colors
+
+    Parameters
+    ----------
+    a : np.ndarray
+        ... x 3 array of srgb components (0-255)
+    b : np.ndarray
+        ... x 3 array of srgb components (0-255), broadcastable with a
+
+    Returns
+    -------
+    np.ndarray
+        contrast ratio of each pair of colors
+    '''
+    la, lb = luminance(a), luminance(b)
+    return (np.maximum(la, lb) + 0.05) / (np.minimum(la, lb) + 0.05)
+
+def to_oklab(rgb: np.ndarray) -> np.ndarray:
+    '''converts srgb colors to oklab, a perceptually uniform space where
+    euclidean distance approximates how different colors look
+
+    Parameters
+    ----------
+    rgb : np.ndarray
+        ... x 3 array of srgb components (0-255)
+
+    Returns
+    -------
+    np.ndarray
+        ... x 3 array of lightness (0-1) and the a and b opponent axes
+    '''
+    return np.cbrt(to_linear(rgb) @ oklab_m1.T) @ oklab_m2.T
+
+def oklab_to_linear(lab: np.ndarray) -> np.ndarray:
+    '''converts oklab colors to linear light, which is outside of 0-1 for colors outside of the srgb gamut'''
+    return (np.asarray(lab) @ oklab_m2_inverse.T) ** 3 @ oklab_m1_inverse.T
+
+def from_oklab(lab: np.ndarray) -> np.ndarray:
+    '''converts oklab colors to srgb components (0-255, unrounded and clipped
+    to the srgb gamut)'''
+    return from_linear(oklab_to_linear(lab))
+
+def hue_chroma(lab: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''hue angle (radians) and chroma of oklab colors'''
+    return np.arctan2(lab[..., 2], lab[..., 1]), np.hypot(lab[..., 1], lab[..., 2])
+
+def from_oklch(lightness: np.ndarray, chroma: np.ndarray, hue: np.ndarray) -> np.ndarray:
+    '''converts colors given as oklab lightness, chroma and hue (radians) to
+    srgb components (0-255, unrounded)
+
+    colors outside of the srgb gamut lose chroma until they fit, keeping their
+    lightness and hue, rather than being clipped (which shifts both)
+
+    Parameters
+    ----------
+    lightness : np.ndarray
+        lightness of each color (0-1)
+    chroma : np.ndarray
+        chroma of each color (0 to about 0.37)
+    hue : np.ndarray
+        hue angle of each color, in radians
+
+    Returns
+    -------
+    np.ndarray
+        ... x 3 array of srgb components
+    '''
+    lightness, chroma, hue = np.broadcast_arrays(*map(np.asarray, [lightness, chroma, hue]))
+
+    def lab(c: np.ndarray) -> np.ndarray:
+        return np.stack([lightness, c * np.cos(hue), c * np.sin(hue)], axis=-1)
+
+    def fits(c: np.ndarray) -> np.ndarray:
+        linear = oklab_to_linear(lab(c))
+        return ((linear >= -1e-6) & (linear <= 1 + 1e-6)).all(axis=-1)
+
+    # bisect the largest chroma that fits, for the colors that don't as they are
+    low, high = np.zeros(chroma.shape), chroma.astype(np.float64)
+    inside = fits(high)
+    low = np.where(inside, high, low)
+    for _ in range(gamut_steps):
+        middle = (low + high) / 2
+        ok = fits(middle)
+        low = np.where(ok, middle, low)
+        high = np.where(ok, high, middle)
+
+    return from_oklab(lab(low))
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import numpy as np
+import time
+
+from . import backends
+from . import colormath
+from . import palette as pal
+from dataclasses import dataclass
+from typing import Optional
+
+
+### GLOBAL VARS ###
+# contrast ratio against the background at which a color counts as fully legible (WCAG AA)
+target_contrast = 4.5
+# oklab distance to its nearest neighbour at which a color counts as fully distinct
+target_spread = 0.15
+# oklab chroma below which a color is too gray for its hue to mean much
+min_chroma = 0.06
+
+
+### CLASSES ###
+@dataclass
+class Scores:
+    '''
+    how well a palette works as a terminal palette; every score is between 0 and 1
+
+    Attributes
+    ----------
+    contrast : float
+        how legible colors 1-7 are against color 0 (the background)
+    fit : float
+        how close the hues of colors 1-6 are to those of their ansi slots
+        (red, green, yellow, blue, purple, cyan)
+    spread : float
+        how distinguishable the colors are from each other
+    '''
+    contrast: float
+    fit: float
+    spread: float
+
+    @property
+    def total(self) -> float:
+        '''mean of the scores'''
+        return (self.contrast + self.fit + self.spread) / 3
+
+
+@dataclass
+class Result:
+    '''
+    palette extracted by a backend
+
+    Attributes
+    ----------
+    backend : str
+        name of the backend
+    seconds : float
+        time the extraction took
+    palette : Palette, optional
+        the palette; None if the extraction failed
+    scores : Scores, optional
+        scores of the palette; None if the extraction failed
+    error : str, optional
+        why the extraction failed
+    '''
+    backend: str
+    seconds: float
+    palette: Optional[pal.Palette] = None
+    scores: Optional[Scores] = None
+    error: Optional[str] = None
+
+
+class Messages(logging.Handler):
+    '''keeps the messages logged, which is how pywal explains failures'''
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+
+### FUNCTIONS ###
+def score(p: pal.Palette) -> Scores:
+    '''scores a palette of 8 colors in ansi order
+
+    Parameters
+    ----------
+    p : Palette
+        the palette
+
+    Returns
+    -------
+    Scores
+        the scores
+    '''
+    rgb = np.array([[c.red, c.green, c.blue] for c in p.colors])
+
+    ratios = colormath.contrast(rgb[1:], rgb[0])
+    contrast = float(np.minimum(ratios / target_contrast, 1).mean())
+
+    lab = colormath.to_oklab(rgb)
+    slots = colormath.to_oklab(np.array([[c.red, c.green, c.blue] for c in pal.ansi_normal_palette.colors[1:7]]))
+    hues, chromas = colormath.hue_chroma(lab[1:7])
+    slot_hues, _ = colormath.hue_chroma(slots)
+    # 1 for the slot's hue, 0 for a hue a quarter turn (or more) away, and
+    # grays count for as little as they carry hue
+    fit = float((np.maximum(np.cos(hues - slot_hues), 0) * np.minimum(chromas / min_chroma, 1)).mean())
+
+    distances = np.sqrt(((lab[:, None, :] - lab[None, :, :]) ** 2).sum(axis=-1))
+    np.fill_diagonal(distances, np.inf)
+    spread = float(np.minimum(distances.min(axis=1) / target_spread, 1).mean())
+
+    return Scores(contrast, fit, spread)
+
+def run(task: tuple[str, str, bool, Optional[float]]) -> Result:
+    '''extracts and scores a palette with one backend, in a worker'''
+    image_path, backend, light, saturate_percent = task
+
+    # pywal logs why a backend can't run, then exits
+    messages = Messages()
+    logging.getLogger().handlers = [messages]
+
+    start = time.perf_counter()
+    try:
+        p = pal.from_image(image_path, backend, light, backend, saturate_percent, cache=False)
+    except (Exception, SystemExit) as e:
+        error = messages.messages[0] if messages.messages else str(e) or type(e).__name__
+        return Result(backend, time.perf_counter() - start, error=error)
+    seconds = time.perf_counter() - start
+
+    return Result(backend, seconds, p, score(p))
+
+def compare(
+        image_path: str,
+        names: Optional[list[str]] = None,
+        light: bool = False,
+        saturate_percent: Optional[float] = None,
+        jobs: Optional[int] = None
+) -> list[Result]:
+    '''extracts a palette from an image with several backends at once, and scores each
+
+    Parameters
+    ----------
+    image_path : str
+        path to image file
+    names : list[str], optional
+        backends to compare (default is None, meaning every backend)
+    light : bool, optional
+        generate light color palettes (default is False)
+    saturate_percent : float, optional
+        amount to saturate colors by (saturate_percent=5 means 5%) (default is None)
+    jobs : int, optional
+        number of processes (default is None, meaning one per backend)
+
+    Returns
+    -------
+    list[Result]
+        a result per backend, best scoring first, then the failures
+    '''
+    names = names if names else backends.names()
+    tasks = [(image_path, backend, light, saturate_percent) for backend in names]
+
+    # each backend in its own process, so backends that exit (as pywal's do
+    # when a dependency is missing) or leak state don't affect the others
+    with multiprocessing.get_context('fork').Pool(jobs if jobs else len(tasks), maxtasksperchild=1) as pool:
+        results = pool.map(run, tasks, chunksize=1)
+
+    return sorted(results, key=lambda r: (r.scores is None, -r.scores.total if r.scores else 0, r.backend))
@@ -1,18 +1,61 @@
 import os
+import copy
 import yaml
-from typing import Any
 
-try:
-    config_root = os.environ['XDG_CONFIG_HOME']
-except KeyError:
-    config_root = os.path.join(os.environ['HOME'], '.config')
+from .paths import config_root, cache_root, config_dir
+from typing import Any
 
-config_dir = os.path.join(config_root, 'palette-cleanser')
 palettes_dir = os.path.join(config_dir, 'palettes')
 themes_dir = os.path.join(config_dir, 'themes')
 templates_dir = os.path.join(config_dir, 'templates')
+# caches that can be thrown away at any time
+cache_dir = os.path.join(cache_root, 'palette-cleanser')
+
+# libyaml's parser and emitter are several times faster than pyyaml's, when installed
+yaml_loader = getattr(yaml, 'CLoader', yaml.Loader)
+yaml_dumper = getattr(yaml, 'CDumper', yaml.Dumper)
+
+# parsed yaml files keyed by path, along with the (mtime, size) they were parsed at
+yaml_cache: dict[str, tuple[tuple[int, int], Any]] = {}
+
+def load_yaml(path: str) -> Any:
+    '''load a yaml file, reusing the previously parsed result if the file hasn't changed
+
+    the cache only pays off in long-lived processes (i.e. the daemon), where
+    the same themes and palettes are loaded over and over
+
+    Parameters
+    ----------
+    path : str
+        path to yaml file
+
+    Returns
+    -------
+    Any
+        a copy of the parsed yaml, so callers are free to mutate it
+
+    Raises
+    ------
+    FileNotFoundError
+        if the file doesn't exist
+    '''
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = yaml_cache.get(path)
+    if not cached or cached[0] != key:
+        with open(path) as f:
+            cached = (key, yaml.load(f, Loader=yaml_loader))
+        yaml_cache[path] = cached
+    else:
+        # imported here, since metrics imports cProfile and tracemalloc
+        from . import metrics
+        metrics.add('yaml cache hits')
+
+    return copy.deepcopy(cached[1])
 
 def get_config_settings() -> dict[str, Any]:
     ''' load config settings from $XDG_CONFIG_HOME/palette-cleanser/config.yml '''
-    with open(os.path.join(config_dir, 'config.yml')) as config_settings:
-        return yaml.load(config_settings, Loader=yaml.Loader)
+    from . import metrics
+    with metrics.span('load config'):
+        return load_yaml(os.path.join(config_dir, 'config.yml'))
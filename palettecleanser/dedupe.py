@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import multiprocessing
+import numpy as np
+import os
+
+from .quantize import PillowNotFoundError
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+
+### GLOBAL VARS ###
+# extensions of the files considered images when scanning a directory
+image_extensions = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+# hashes differing in at most this many of their 64 bits are of the same image
+default_distance = 10
+# perceptual hash functions, by name
+methods = ['dhash', 'phash']
+# size of the grayscale image each method hashes, as (width, height)
+sizes = {'dhash': (9, 8), 'phash': (32, 32)}
+# images hashed per task sent to a worker
+chunk_size = 16
+
+
+### CLASSES ###
+@dataclass
+class ImageHash:
+    '''
+    perceptual hash of an image
+
+    Attributes
+    ----------
+    path : str
+        path to the image
+    hash : int
+        64 bit perceptual hash
+    pixels : int
+        width times height of the image, so the best copy of a group can be picked
+    '''
+    path: str
+    hash: int
+    pixels: int
+
+
+@dataclass
+class BKTree:
+    '''
+    burkhard-keller tree of hashes, for finding every hash within some hamming
+    distance of another without comparing it with every hash
+
+    each child of a node is keyed by its distance to the node, so by the
+    triangle inequality a search only visits children whose key is within the
+    search distance of the query's distance to the node
+
+    Attributes
+    ----------
+    hash : int
+        hash at the root
+    items : list[ImageHash]
+        images with exactly this hash
+    children : dict[int, BKTree]
+        subtrees, by distance to hash
+    '''
+    hash: int
+    items: list[ImageHash] = field(default_factory=list)
+    children: dict[int, BKTree] = field(default_factory=dict)
+
+    def add(self, item: ImageHash):
+        '''adds an image to the tree'''
+        node = self
+        while True:
+            d = distance(node.hash, item.hash)
+            if d == 0:
+                node.items.append(item)
+                return
+            if d not in node.children:
+                node.children[d] = BKTree(item.hash, [item])
+                return
+            node = node.children[d]
+
+    def search(self, hash: int, radius: int) -> Iterator[ImageHash]:
+        '''images whose hash is at most radius bits away from hash'''
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            d = distance(node.hash, hash)
+            if d <= radius:
+                yield from node.items
+            pending.extend(child for key, child in node.children.items() if d - radius <= key <= d + radius)
+
+
+### FUNCTIONS ###
+def distance(a: int, b: int) -> int:
+    '''number of bits that differ between two hashes'''
+    return bin(a ^ b).count('1')
+
+def to_int(bits: np.ndarray) -> int:
+    '''packs an array of booleans into an int, first element as most significant bit'''
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+def dhash(pixels: np.ndarray) -> int:
+    '''difference hash: whether each of 8x8 cells is brighter than the one to its right
+
+    Parameters
+    ----------
+    pixels : np.ndarray
+        8 x 9 grayscale image
+    '''
+    return to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def dct_matrix(n: int) -> np.ndarray:
+    '''orthonormal type II discrete cosine transform, as an n x n matrix'''
+    k, i = np.mgrid[0:n, 0:n]
+    d = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    d[0] /= np.sqrt(2)
+    return d
+
+def phash(pixels: np.ndarray) -> int:
+    '''perceptual hash: whether each of the 8x8 lowest frequencies of the image is above their median
+
+    Parameters
+    ----------
+    pixels : np.ndarray
+        32 x 32 grayscale image
+    '''
+    d = dct_matrix(len(pixels))
+    low = (d @ pixels.astype(np.float64) @ d.T)[:8, :8]
+    return to_int(low > np.median(low))
+
+def hash_image(path: str, method: str = 'dhash') -> Optional[ImageHash]:
+    '''perceptual hash of the image at path
+
+    Parameters
+    ----------
+    path : str
+        path to the image
+    method : str, optional
+        'dhash' (faster) or 'phash' (more robust to edits) (default is 'dhash')
+
+    Returns
+    -------
+    Optional[ImageHash]
+        the hash; None if the file couldn't be read as an image
+    '''
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            pixels = image.width * image.height
+            # jpegs are decoded at a fraction of their size, which is all a hash needs
+            image.draft('L', (64, 64))
+            small = image.convert('L').resize(sizes[method], Image.BOX)
+    except OSError:
+        return None
+
+    function = dhash if method == 'dhash' else phash
+    return ImageHash(path, function(np.asarray(small, dtype=np.int16)), pixels)
+
+def hash_chunk(chunk: tuple[list[str], str]) -> list[Optional[ImageHash]]:
+    '''hashes a chunk of images, in a worker'''
+    paths, method = chunk
+    return [hash_image(path, method) for path in paths]
+
+def find_images(directory: str) -> list[str]:
+    '''paths of every image under directory, in a stable order'''
+    return sorted(
+        os.path.join(parent, name)
+        for parent, _, names in os.walk(directory)
+        for name in names
+        if os.path.splitext(name)[1].lower() in image_extensions
+    )
+
+def hash_images(paths: list[str], method: str = 'dhash', jobs: Optional[int] = None) -> list[ImageHash]:
+    '''perceptual hashes of images, computed across processes
+
+    Parameters
+    ----------
+    paths : list[str]
+        paths to the images
+    method : str, optional
+        'dhash' or 'phash' (default is 'dhash')
+    jobs : int, optional
+        number of processes (default is None, meaning one per cpu)
+
+    Returns
+    -------
+    list[ImageHash]
+        hashes of the images that could be read, in the order of paths
+
+    Raises
+    ------
+    PillowNotFoundError
+        if Pillow isn't installed
+    '''
+    try:
+        import PIL
+    except ImportError:
+        raise PillowNotFoundError("hashing images requires Pillow (pip install 'palettecleanser[images]')")
+
+    if method not in methods:
+        raise ValueError(f"unknown hash method '{method}'; must be one of {', '.join(methods)}")
+
+    chunks = [(paths[i:i + chunk_size], method) for i in range(0, len(paths), chunk_size)]
+    if len(chunks) > 1 and jobs != 1:
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            results = pool.map(hash_chunk, chunks)
+    else:
+        results = map(hash_chunk, chunks)
+
+    return [h for chunk in results for h in chunk if h]
+
+def group(hashes: list[ImageHash], max_distance: int = default_distance) -> list[list[ImageHash]]:
+    '''groups near-duplicate images
+
+    images are in the same group if a chain of images, each within
+    max_distance bits of the next, links them
+
+    Parameters
+    ----------
+    hashes : list[ImageHash]
+        hashes of the images
+    max_distance : int, optional
+        most bits two hashes may differ in for their images to be duplicates
+        (default is default_distance)
+
+    Returns
+    -------
+    list[list[ImageHash]]
+        the groups, in the order of their first image in hashes; each group
+        starts with its largest image, which is the one worth extracting from
+    '''
+    if not hashes:
+        return []
+
+    tree = BKTree(hashes[0].hash)
+    for h in hashes:
+        tree.add(h)
+
+    # union-find over the positions of the images in hashes
+    position = {id(h): i for i, h in enumerate(hashes)}
+    parent = list(range(len(hashes)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, h in enumerate(hashes):
+        for duplicate in tree.search(h.hash, max_distance):
+            a, b = find(i), find(position[id(duplicate)])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    groups: dict[int, list[ImageHash]] = {}
+    for i, h in enumerate(hashes):
+        groups.setdefault(find(i), []).append(h)
+
+    # stable sort, so equally large images keep their order
+    return [sorted(g, key=lambda h: -h.pixels) for g in groups.values()]
+
+def dedupe(directory: str, method: str = 'dhash', max_distance: int = default_distance, jobs: Optional[int] = None) -> list[list[ImageHash]]:
+    '''groups the near-duplicate images under a directory
+
+    see hash_images and group for more details
+    '''
+    return group(hash_images(find_images(directory), method, jobs), max_distance)
@@ -0,0 +1,475 @@
+from __future__ import annotations
+
+import difflib
+import fcntl
+import json
+import os
+import resource
+import stat
+import sys
+import tempfile
+import time
+import uuid
+
+from . import config
+from . import hooks
+from . import isolate
+from . import metrics
+from . import template
+from . import theme
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import IO, Any, Callable, Iterator, Optional
+
+
+### GLOBAL VARS ###
+# held for the whole duration of a deploy
+lock_path = os.path.join(config.config_dir, 'deploy.lock')
+# latest pending deploy, the process it belongs to and number of coalesced
+# deploys, for each deploy scope
+queue_path = os.path.join(config.config_dir, 'deploy.queue')
+
+
+### CLASSES ###
+@dataclass
+class DeployReport:
+    '''
+    outcome of a scheduled deploy
+
+    Attributes
+    ----------
+    ran : bool
+        False if the deploy was superseded by a newer one before it got the lock
+    coalesced : int
+        number of superseded deploys that this deploy stands in for
+    result : Any, optional
+        return value of the deploy, if it ran (default is None)
+    '''
+    ran: bool
+    coalesced: int = 0
+    result: Any = None
+
+@dataclass
+class RootDeployment:
+    '''
+    what deploying a theme did to one destination root
+
+    Attributes
+    ----------
+    root : str
+        destination root directory
+    changed : list[str]
+        paths (relative to root) whose content changed
+    elapsed : float
+        seconds it took to commit the files under root
+    error : str, optional
+        why the files couldn't be deployed to root (default is None)
+    '''
+    root: str
+    changed: list[str]
+    elapsed: float
+    error: Optional[str] = None
+
+@dataclass
+class Deployment:
+    '''
+    what deploying a theme did
+
+    Attributes
+    ----------
+    changed : list[str]
+        paths (relative to $HOME) whose content changed
+    roots : list[RootDeployment]
+        what was deployed to each destination root
+    hook_results : list[hooks.HookResult]
+        outcome of each reload hook triggered by the changed paths
+    peak_memory : int
+        resident high-water mark of the process after the deploy, in bytes;
+        it covers the whole life of the process (imports and, under the
+        daemon, every earlier request), not just the deploy
+    peak_memory_growth : int
+        bytes by which the deploy raised the high-water mark; 0 if the deploy
+        stayed under an earlier peak
+    syscalls : dict[str, dict[str, int]]
+        filesystem calls made for each file, if the deploy was run with debug
+    failures : list[isolate.RenderFailure], optional
+        templates that were skipped, if the deploy was run with render limits
+        (default is [])
+    '''
+    changed: list[str]
+    roots: list[RootDeployment]
+    hook_results: list[hooks.HookResult]
+    peak_memory: int
+    peak_memory_growth: int
+    syscalls: dict[str, dict[str, int]]
+    failures: list[isolate.RenderFailure] = field(default_factory=list)
+
+@dataclass
+class Change:
+    '''
+    change that deploying a theme would make to a file
+
+    Attributes
+    ----------
+    path : str
+        path (relative to the root) of the file
+    status : str
+        'added', 'modified' or 'mode' (only the permissions would change)
+    diff : list[str], optional
+        unified diff of the change, if it was asked for (default is [])
+    '''
+    path: str
+    status: str
+    diff: list[str] = field(default_factory=list)
+
+
+### FUNCTIONS ###
+@contextmanager
+def locked(path: str) -> Iterator[IO]:
+    '''holds an exclusive lock on path for the duration of the context
+
+    Parameters
+    ----------
+    path : str
+        lock file path; created if it doesn't exist
+
+    Yields
+    ------
+    IO
+        the lock file, opened for reading and writing
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+@contextmanager
+def queue() -> Iterator[dict[str, dict[str, Any]]]:
+    '''loads the deploy queue for modification and saves it on exit
+
+    Yields
+    ------
+    dict[str, dict[str, Any]]
+        last "issued" ticket, "latest" pending ticket and "pid" of the process
+        it belongs to, last ticket that "ran" and number of "coalesced"
+        deploys, keyed by scope
+    '''
+    with locked(queue_path) as f:
+        content = f.read()
+        # entries without ticket numbers were queued by an older version
+        state = {k: v for k, v in json.loads(content).items() if 'issued' in v} if content else {}
+        yield state
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+
+def enqueue(scope: str) -> int:
+    '''registers a pending deploy as the latest for its scope
+
+    Parameters
+    ----------
+    scope : str
+        what the deploy covers (e.g. a template path); only deploys of the
+        same scope are coalesced
+
+    Returns
+    -------
+    int
+        ticket identifying the pending deploy; tickets of a scope increase in
+        the order their deploys were enqueued
+    '''
+    with queue() as state:
+        pending = state.setdefault(scope, {'issued': 0, 'ran': 0, 'coalesced': 0})
+        ticket = pending['issued'] + 1
+        pending.update(issued=ticket, latest=ticket, pid=os.getpid())
+
+    return ticket
+
+def is_alive(pid: Optional[int]) -> bool:
+    '''whether a process with the given pid is running'''
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running, but as another user
+        return True
+    return True
+
+def run(scope: str, ticket: int, deploy: Callable[[], Any]) -> DeployReport:
+    '''waits for the deploy lock and runs deploy, unless it has been superseded in the meantime
+
+    a deploy is superseded once a newer deploy of its scope has run, even if
+    it only gets the lock afterwards, or while a newer one is waiting whose
+    process is still running; if that process died while waiting for the
+    lock, this deploy takes over as the latest instead
+
+    Parameters
+    ----------
+    scope : str
+        scope passed to enqueue
+    ticket : int
+        ticket returned by enqueue
+    deploy : Callable[[], Any]
+        performs the deploy
+
+    Returns
+    -------
+    DeployReport
+        whether deploy ran and how many deploys were coalesced into it
+    '''
+    with locked(lock_path):
+        with queue() as state:
+            pending = state.setdefault(scope, {'issued': ticket, 'latest': ticket, 'pid': os.getpid(), 'ran': 0, 'coalesced': 0})
+            newer_waiting = pending['latest'] > ticket and is_alive(pending.get('pid'))
+            if ticket <= pending['ran'] or newer_waiting:
+                # latest wins: a newer deploy already ran or is waiting, so this one is dropped
+                pending['coalesced'] += 1
+                return DeployReport(False)
+
+            coalesced = pending['coalesced']
+            pending.update(ran=ticket, coalesced=0)
+
+        return DeployReport(True, coalesced, deploy())
+
+def schedule(deploy: Callable[[], Any], scope: Optional[str] = None) -> DeployReport:
+    '''runs deploy once no other deploy is running, coalescing it with concurrent deploys of the same scope
+
+    Parameters
+    ----------
+    deploy : Callable[[], Any]
+        performs the deploy
+    scope : str, optional
+        what the deploy covers (e.g. a template path) (default is None, meaning
+        all managed files)
+
+    Returns
+    -------
+    DeployReport
+        whether deploy ran and how many deploys were coalesced into it
+    '''
+    scope = scope if scope else ''
+    return run(scope, enqueue(scope), deploy)
+
+def peak_memory() -> int:
+    '''resident high-water mark of the current process, in bytes
+
+    tracing allocations would measure the deploy alone, but slows rendering
+    down several times over
+    '''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS and kilobytes everywhere else
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def get_settings() -> dict[str, Any]:
+    '''config settings, or no settings if there is no config file'''
+    try:
+        return config.get_config_settings()
+    except FileNotFoundError:
+        return {}
+
+def owner(root: str) -> Optional[tuple[int, int]]:
+    '''uid and gid of root, if they differ from the current user's'''
+    st = os.stat(root)
+    return None if (st.st_uid, st.st_gid) == (os.geteuid(), os.getegid()) else (st.st_uid, st.st_gid)
+
+def copy_rendered(transaction: template.Transaction, rendered: template.Transaction) -> Optional[str]:
+    '''stages a copy of the rendered files in a root's transaction
+
+    Parameters
+    ----------
+    transaction : template.Transaction
+        transaction of the root
+    rendered : template.Transaction
+        transaction the files were rendered into
+
+    Returns
+    -------
+    str, optional
+        why the files couldn't be copied; None if they were
+    '''
+    try:
+        transaction.copy_from(rendered)
+    except OSError as e:
+        return str(e)
+
+def commit_root(transaction: template.Transaction, error: Optional[str] = None) -> RootDeployment:
+    '''commits a root's transaction
+
+    Parameters
+    ----------
+    transaction : template.Transaction
+        transaction of the root
+    error : str, optional
+        why the files couldn't be staged in the transaction (default is None);
+        if given, nothing is committed
+
+    Returns
+    -------
+    RootDeployment
+        what was deployed to the root; errors are reported rather than raised,
+        so one failing root doesn't stop the others
+    '''
+    start = time.perf_counter()
+    if error:
+        return RootDeployment(transaction.root, [], 0, error)
+
+    try:
+        return RootDeployment(transaction.root, transaction.commit(), time.perf_counter() - start)
+    except OSError as e:
+        return RootDeployment(transaction.root, [], time.perf_counter() - start, str(e))
+
+def deploy_theme(
+        template_theme: theme.Theme,
+        path: Optional[str] = None,
+        debug: bool = False,
+        roots: Optional[list[str]] = None,
+        limits: Optional[isolate.Limits] = None
+) -> Deployment:
+    '''populates templates with variable values from theme, writes them to $HOME and runs reload hooks
+
+    Parameters
+    ----------
+    template_theme : theme.Theme
+        theme that provides template variables
+    path : str, optional
+        only deploy the template for this path (relative to $HOME) (default is
+        None, meaning all managed files are deployed)
+    debug : bool, optional
+        count the filesystem calls made for each file (default is False)
+    roots : list[str], optional
+        directories to deploy to instead of $HOME (e.g. the home directories
+        of several users); templates are rendered once and the output is
+        copied to each root in parallel, owned by the owner of the root; roots
+        of other users are confined (see template.Transaction), so symlinks
+        in them that lead outside of them are refused and reported as the
+        root's error (default is None, meaning just $HOME)
+    limits : isolate.Limits, optional
+        render each template in a separate worker process with these resource
+        limits, skipping templates that fail or exceed them rather than
+        aborting the deploy (default is None, meaning templates are rendered
+        in this process and any failure aborts the deploy)
+
+    Returns
+    -------
+    Deployment
+        changed paths, per root summaries and reload hook results
+    '''
+    roots = roots if roots else [os.environ['HOME']]
+    template.debug = debug
+    template.syscalls.clear()
+    failures = []
+    memory_before = peak_memory()
+
+    try:
+        with ExitStack() as stack:
+            transactions = [stack.enter_context(template.Transaction(root, owner=owner(root))) for root in roots]
+
+            # render into a transaction of the current user, which is never confined
+            if transactions[0].confined:
+                rendered = stack.enter_context(template.Transaction(stack.enter_context(tempfile.TemporaryDirectory())))
+                targets = transactions
+            else:
+                rendered = transactions[0]
+                targets = transactions[1:]
+
+            if limits:
+                templates = [template.from_managed_path(path)] if path else template.from_managed(config.templates_dir)
+                files = [f for t in templates for f in t.files()]
+                failures = isolate.render(files, template_theme, rendered, limits)
+            elif path:
+                template.from_managed_path(path).template(template_theme, rendered)
+            else:
+                template.template_managed(template_theme, rendered)
+
+            with ThreadPoolExecutor(len(roots)) as pool:
+                # copy to the other roots before the first root's commit moves the rendered files away
+                with metrics.span('copy to roots'):
+                    errors = [None] * (len(roots) - len(targets)) + list(pool.map(copy_rendered, targets, [rendered] * len(targets)))
+                results = list(pool.map(commit_root, transactions, errors))
+    finally:
+        template.debug = False
+
+    memory = peak_memory()
+    syscalls = {p: dict(calls) for p, calls in template.syscalls.items()}
+
+    # reload hooks are for the current user's applications
+    home = os.path.realpath(os.environ['HOME'])
+    changed = next((r.changed for r in results if os.path.realpath(r.root) == home), [])
+    declared = hooks.from_settings(get_settings(), template_theme.settings)
+
+    with metrics.span('reload hooks'):
+        hook_results = hooks.run(declared, changed)
+
+    return Deployment(changed, results, hook_results, memory, memory - memory_before, syscalls, failures)
+
+def preview_theme(
+        template_theme: theme.Theme,
+        path: Optional[str] = None,
+        root: Optional[str] = None,
+        diff: bool = False
+) -> list[Change]:
+    '''renders templates in memory and compares them with the files a deploy would replace
+
+    nothing is written; compiled templates are cached just as for a deploy
+
+    Parameters
+    ----------
+    template_theme : theme.Theme
+        theme that provides template variables
+    path : str, optional
+        only preview the template for this path (relative to root) (default is
+        None, meaning all managed files are previewed)
+    root : str, optional
+        directory the files are relative to (default is None, meaning $HOME)
+    diff : bool, optional
+        include a unified diff of each change (default is False)
+
+    Returns
+    -------
+    list[Change]
+        files that would change
+    '''
+    root = root if root else os.environ['HOME']
+    templates = [template.from_managed_path(path)] if path else template.from_managed(config.templates_dir)
+
+    changes = []
+    for f in (f for t in templates for f in t.files()):
+        rendered, mode = f.render(template_theme)
+        # deploys write through symlinks
+        destination = os.path.realpath(os.path.join(root, f.path))
+
+        try:
+            with open(destination, 'rb') as current_file:
+                current = current_file.read()
+            current_mode = stat.S_IMODE(os.stat(destination).st_mode)
+        except FileNotFoundError:
+            current, current_mode = None, None
+
+        if current is None:
+            change = Change(f.path, 'added')
+        elif current != rendered.encode():
+            change = Change(f.path, 'modified')
+        elif current_mode != stat.S_IMODE(mode):
+            change = Change(f.path, 'mode')
+        else:
+            continue
+
+        if diff and change.status != 'mode':
+            before = current.decode(errors='replace').splitlines(keepends=True) if current else []
+            change.diff = list(difflib.unified_diff(
+                before,
+                rendered.splitlines(keepends=True),
+                fromfile='/dev/null' if current is None else f'a/{f.path}',
+                tofile=f'b/{f.path}'
+            ))
+        changes.append(change)
+
+    return changes
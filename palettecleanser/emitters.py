@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+
+from . import palette as pal
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+### EXCEPTIONS ###
+class UnknownEmitterError(Exception):
+    '''thrown when a managed file asks for an emitter that doesn't exist'''
+    pass
+
+
+### CLASSES ###
+@dataclass
+class Scheme:
+    '''
+    colors of a theme in the slots that terminal and desktop color formats share
+
+    follows the layout of the templates: the first palette holds the normal
+    colors (0 is the background, 7 the foreground), the second the dim ones
+    and the third the bright ones
+
+    Attributes
+    ----------
+    name : str
+        name of the theme
+    normal : list[str]
+        "#rrggbb" of colors 0-7
+    bright : list[str]
+        "#rrggbb" of colors 8-15
+    dim : list[str]
+        "#rrggbb" of the dim variants of colors 0-7
+    colors : list[Color]
+        normal colors then bright colors, for formats that derive colors
+    '''
+    name: str
+    normal: list[str]
+    bright: list[str]
+    dim: list[str]
+    colors: list[pal.Color]
+
+    @property
+    def background(self) -> str:
+        '''color 0'''
+        return self.normal[0]
+
+    @property
+    def foreground(self) -> str:
+        '''color 7'''
+        return self.normal[7]
+
+    @property
+    def ansi(self) -> list[str]:
+        '''colors 0-15'''
+        return self.normal + self.bright
+
+
+@dataclass
+class Emitter:
+    '''
+    writes a color format straight from a Scheme, without a template
+
+    Attributes
+    ----------
+    name : str
+        name managed files refer to the emitter by
+    emit : Callable[[Scheme], str]
+        produces the file's content
+    comment : str, optional
+        format of a comment line (e.g. '# {}'), used for the templated
+        signature; None if the format has no comments, in which case emit
+        embeds the signature itself
+    '''
+    name: str
+    emit: Callable[[Scheme], str]
+    comment: Optional[str] = '# {}'
+
+
+### FUNCTIONS ###
+def scheme(template_theme: Any) -> Scheme:
+    '''collects the colors of a theme into a Scheme
+
+    Parameters
+    ----------
+    template_theme : theme.Theme
+        the theme; its first palette needs at least 8 colors, and if it has 16,
+        colors 8-15 are the bright colors when there is no third palette
+
+    Returns
+    -------
+    Scheme
+        the colors; missing dim or bright colors are the normal colors
+    '''
+    palettes = template_theme.get_palettes()
+    normal = palettes[0].colors[:8]
+    if len(palettes) > 2:
+        bright = palettes[2].colors[:8]
+    elif len(palettes[0].colors) >= 16:
+        bright = palettes[0].colors[8:16]
+    else:
+        bright = normal
+    dim = palettes[1].colors[:8] if len(palettes) > 1 else normal
+
+    return Scheme(template_theme.name, [str(c) for c in normal], [str(c) for c in bright], [str(c) for c in dim], normal + bright)
+
+def xresources(s: Scheme) -> str:
+    '''X resources, for xrdb'''
+    lines = [f'*background: {s.background}', f'*foreground: {s.foreground}', f'*cursorColor: {s.foreground}']
+    lines += [f'*color{i}: {c}' for i, c in enumerate(s.ansi)]
+    return '\n'.join(lines) + '\n'
+
+def kitty(s: Scheme) -> str:
+    '''kitty.conf colors, e.g. for an include'''
+    lines = [
+        f'background {s.background}',
+        f'foreground {s.foreground}',
+        f'cursor {s.foreground}',
+        f'selection_background {s.foreground}',
+        f'selection_foreground {s.background}',
+    ]
+    lines += [f'color{i} {c}' for i, c in enumerate(s.ansi)]
+    return '\n'.join(lines) + '\n'
+
+def alacritty(s: Scheme) -> str:
+    '''alacritty.yml colors'''
+    names = ['black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white']
+    lines = ['colors:', '  primary:', f"    background: '{s.background}'", f"    foreground: '{s.foreground}'"]
+    for group, colors in [('normal', s.normal), ('bright', s.bright), ('dim', s.dim)]:
+        lines.append(f'  {group}:')
+        lines += [f"    {name}: '{c}'" for name, c in zip(names, colors)]
+    return '\n'.join(lines) + '\n'
+
+def css(s: Scheme) -> str:
+    '''css custom properties on :root'''
+    lines = [':root {', f'  --background: {s.background};', f'  --foreground: {s.foreground};']
+    lines += [f'  --color{i}: {c};' for i, c in enumerate(s.ansi)]
+    return '\n'.join(lines + ['}']) + '\n'
+
+def json_colors(s: Scheme) -> str:
+    '''json in the layout of pywal's colors.json, with the signature as its first key'''
+    # imported here, since template imports this module
+    from .template import templated_signature
+
+    return json.dumps({
+        'generator': templated_signature,
+        'name': s.name,
+        'special': {'background': s.background, 'foreground': s.foreground, 'cursor': s.foreground},
+        'colors': {f'color{i}': c for i, c in enumerate(s.ansi)},
+    }, indent=2) + '\n'
+
+def base16(s: Scheme) -> str:
+    '''base16 scheme yaml
+
+    base00-05 step from the background to the foreground, base06-07 on to
+    bright white; base08-0F are the accents, with orange halfway between red
+    and yellow and brown a darkened red
+    '''
+    colors = s.colors
+    grays = colors[0].spectrum(colors[7], 6) + colors[7].spectrum(colors[15], 3)[1:]
+    accents = [colors[1], colors[1].spectrum(colors[3], 3)[1], colors[3], colors[2], colors[6], colors[4], colors[5], colors[1].tone(40, False)]
+
+    lines = [f'scheme: "{s.name}"', 'author: "palette-cleanser"']
+    lines += [f'base0{i:X}: "{str(c)[1:]}"' for i, c in enumerate(grays + accents)]
+    return '\n'.join(lines) + '\n'
+
+# emitters by name
+emitters = {e.name: e for e in [
+    Emitter('xresources', xresources, '! {}'),
+    Emitter('kitty', kitty),
+    Emitter('alacritty', alacritty),
+    Emitter('css', css, '/* {} */'),
+    Emitter('json', json_colors, None),
+    Emitter('base16', base16),
+]}
+
+def get(name: str) -> Emitter:
+    '''looks up an emitter by name
+
+    Raises
+    ------
+    UnknownEmitterError
+        if there is no emitter of that name
+    '''
+    try:
+        return emitters[name]
+    except KeyError:
+        raise UnknownEmitterError(f"unknown emitter '{name}'; must be one of {', '.join(emitters)}")
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import numpy as np
+
+from . import colormath
+from . import palette as pal
+from typing import Optional
+
+
+### GLOBAL VARS ###
+# hue offsets (degrees) from the seed of the anchor colors of each harmony
+schemes = {
+    'complementary': [0, 180],
+    'triadic': [0, 120, 240],
+    'analogous': [0, -30, 30],
+    'tetradic': [0, 90, 180, 270],
+}
+# colors of a palette between black and white
+accents = 6
+# accents beyond the anchors drift from them, alternately either way, by
+# multiples of this many degrees (scaled per candidate)
+drift = 20
+# and alternately lighter and darker by multiples of this much lightness
+step = 0.08
+# oklab lightness and chroma of the background and foreground, for dark and light palettes
+background = {False: (0.2, 0.02), True: (0.97, 0.015)}
+foreground = {False: (0.93, 0.015), True: (0.25, 0.02)}
+# lightness the accents center on, for dark and light palettes
+accent_lightness = {False: 0.72, True: 0.52}
+# chroma given to the accents of gray seeds, whose hue means little
+default_chroma = 0.12
+
+
+### FUNCTIONS ###
+def generate(
+        seeds: list[pal.Color],
+        scheme: str,
+        count: int = 1,
+        light: bool = False,
+        name: Optional[str] = None
+) -> list[pal.Palette]:
+    '''generates palettes whose colors are in harmony with seed colors
+
+    colors are computed in oklch (oklab's lightness, chroma and hue), where
+    hue angles and lightness steps look even, for every seed and candidate at
+    once; the seed itself is always one of the colors, the others are placed
+    around the harmony's hues, and the candidates for a seed vary how far the
+    accents drift from those hues and how light they are; accents are then
+    ordered for the ansi slots as from_image orders colors
+
+    Parameters
+    ----------
+    seeds : list[Color]
+        seed colors (e.g. brand colors); each gets its own candidates
+    scheme : str
+        one of schemes (complementary, triadic, analogous, tetradic)
+    count : int, optional
+        number of candidate palettes per seed (default is 1)
+    light : bool, optional
+        True to generate light color palettes, False to generate dark color
+        palettes (default is False)
+    name : str, optional
+        prefix of the names of the palettes (default is None, meaning scheme);
+        palettes are named "<name>-<seed rrggbb>-<candidate>"
+
+    Returns
+    -------
+    list[Palette]
+        count palettes per seed, seed after seed
+
+    Raises
+    ------
+    ValueError
+        if scheme isn't one of schemes
+    '''
+    try:
+        offsets = np.radians(schemes[scheme])
+    except KeyError:
+        raise ValueError(f"unknown harmony '{scheme}'; must be one of {', '.join(schemes)}")
+
+    seed_lab = colormath.to_oklab(np.array([[c.red, c.green, c.blue] for c in seeds]))
+    seed_hue, seed_chroma = colormath.hue_chroma(seed_lab)
+    # s seeds x n candidates x k accents
+    lightness0 = seed_lab[:, 0, None, None]
+    hue0 = seed_hue[:, None, None]
+    chroma0 = np.where(seed_chroma < 0.05, default_chroma, seed_chroma)[:, None, None]
+
+    # candidates spread evenly over how far accents drift, and over how light
+    # they are (in a golden ratio sequence, so no two candidates pair up the same)
+    candidate = np.arange(count)
+    spread = (0.6 + 0.8 * (candidate + .5) / count)[None, :, None]
+    shift = (((candidate * 0.6180339887) % 1 - .5) * 0.2)[None, :, None]
+
+    k = np.arange(accents)
+    anchor = offsets[k % len(offsets)]
+    ring = k // len(offsets)
+    # 0, 1, -1, 2, -2, ...
+    alternating = np.where(ring % 2, (ring + 1) // 2, -(ring // 2))
+
+    hue = hue0 + anchor + np.radians(drift) * alternating * spread
+    lightness = np.clip(accent_lightness[light] + shift + step * alternating, 0.3, 0.9)
+    lightness = np.broadcast_to(lightness, hue.shape).copy()
+    chroma = np.broadcast_to(chroma0, hue.shape).copy()
+    # the seed itself
+    lightness[:, :, 0], chroma[:, :, 0], hue[:, :, 0] = lightness0[:, :, 0], seed_chroma[:, None], hue0[:, :, 0]
+
+    (bg_lightness, bg_chroma), (fg_lightness, fg_chroma) = background[light], foreground[light]
+    s, n = len(seeds), count
+    lightness = np.concatenate([np.full((s, n, 1), bg_lightness), lightness, np.full((s, n, 1), fg_lightness)], axis=-1)
+    chroma = np.concatenate([np.full((s, n, 1), bg_chroma), chroma, np.full((s, n, 1), fg_chroma)], axis=-1)
+    hue = np.concatenate([np.broadcast_to(hue0, (s, n, 1)), hue, np.broadcast_to(hue0, (s, n, 1))], axis=-1)
+
+    rgb = np.rint(colormath.from_oklch(lightness, chroma, hue)).astype(int)
+
+    palettes = []
+    for seed, candidates in zip(seeds, rgb):
+        for i, colors in enumerate(candidates):
+            colors = [pal.Color(*map(int, c)) for c in colors]
+            # background and foreground keep the first and last slots (as in
+            # pywal's palettes, light or dark); the accents fill the rest
+            ordered = [colors[0]] + pal.ansi_order(colors[1:-1], pal.ansi_normal_palette.colors[1:-1]) + [colors[-1]]
+            palettes.append(pal.Palette(ordered, f'{name if name else scheme}-{str(seed)[1:]}-{i + 1}'))
+    return palettes
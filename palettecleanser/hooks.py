@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import time
+
+from dataclasses import dataclass
+from typing import Any, Optional
+from collections.abc import Mapping
+
+
+### GLOBAL VARS ###
+# seconds a reload command may run before it is killed
+default_timeout = 10.0
+
+
+### CLASSES ###
+@dataclass
+class Hook:
+    '''
+    command that reloads an application after one of its files changed
+
+    Attributes
+    ----------
+    path : str
+        managed file/directory path (relative to $HOME) the command reloads
+    command : str
+        shell command to run
+    timeout : float, optional
+        seconds the command may run before it is killed (default is default_timeout)
+    '''
+    path: str
+    command: str
+    timeout: float = default_timeout
+
+    def is_triggered_by(self, changed: list[str]) -> bool:
+        '''whether any of the changed paths is (or is under) the hook's path
+
+        Parameters
+        ----------
+        changed : list[str]
+            paths (relative to $HOME) of files whose content changed
+
+        Returns
+        -------
+        bool
+            True if the hook should run
+        '''
+        path = self.path.rstrip('/')
+        return any(c == path or c.startswith(path + '/') for c in changed)
+
+@dataclass
+class HookResult:
+    '''
+    outcome of running a hook
+
+    Attributes
+    ----------
+    hook : Hook
+        the hook that was run
+    returncode : int, optional
+        exit status of the command; None if it timed out
+    elapsed : float
+        seconds the command ran for
+    output : str
+        combined stdout and stderr of the command
+    '''
+    hook: Hook
+    returncode: Optional[int]
+    elapsed: float
+    output: str
+
+    @property
+    def status(self) -> str:
+        '''short description of how the hook went'''
+        if self.returncode is None:
+            return f'timed out after {self.hook.timeout:g}s'
+        return 'ok' if self.returncode == 0 else f'exit {self.returncode}'
+
+
+### FUNCTIONS ###
+def from_settings(*settings: Mapping[str, Any]) -> list[Hook]:
+    '''reads hooks from the "reload_hooks" entry of settings dictionaries
+
+    each entry maps a managed path to either a command or a dictionary with
+    "command" and optionally "timeout"; later settings take precedence, so theme
+    settings can override config settings
+
+    Parameters
+    ----------
+    *settings : Mapping[str, Any]
+        config settings, theme settings, etc.
+
+    Returns
+    -------
+    list[Hook]
+        declared hooks
+    '''
+    declared = {}
+    for s in settings:
+        declared |= s.get('reload_hooks') or {}
+
+    timeouts = [s['reload_timeout'] for s in settings if 'reload_timeout' in s]
+    timeout = float(timeouts[-1]) if timeouts else default_timeout
+
+    return [
+        Hook(path, value['command'], float(value.get('timeout', timeout)))
+        if isinstance(value, Mapping)
+        else Hook(path, value, timeout)
+        for path, value in declared.items()
+    ]
+
+async def run_hook(hook: Hook) -> HookResult:
+    '''runs a single hook, killing it if it exceeds its timeout
+
+    Parameters
+    ----------
+    hook : Hook
+        hook to run
+
+    Returns
+    -------
+    HookResult
+        outcome of the hook
+    '''
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_shell(
+        hook.command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        # own process group, so a timeout also kills whatever the shell started
+        start_new_session=True
+    )
+
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), hook.timeout)
+        returncode = process.returncode
+    except asyncio.TimeoutError:
+        os.killpg(process.pid, signal.SIGKILL)
+        output, _ = await process.communicate()
+        returncode = None
+
+    return HookResult(hook, returncode, time.perf_counter() - start, output.decode(errors='replace'))
+
+async def run_hooks(hooks: list[Hook]) -> list[HookResult]:
+    '''runs hooks concurrently'''
+    return list(await asyncio.gather(*(run_hook(hook) for hook in hooks)))
+
+def run(hooks: list[Hook], changed: list[str]) -> list[HookResult]:
+    '''runs the hooks triggered by the changed paths, all at once
+
+    Parameters
+    ----------
+    hooks : list[Hook]
+        declared hooks
+    changed : list[str]
+        paths (relative to $HOME) of files whose content changed
+
+    Returns
+    -------
+    list[HookResult]
+        outcome of each hook that ran, in the order they were declared
+    '''
+    triggered = [hook for hook in hooks if hook.is_triggered_by(changed)]
+    if not triggered:
+        return []
+
+    return asyncio.run(run_hooks(triggered))
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+
+from . import config
+from functools import lru_cache
+
+
+### GLOBAL VARS ###
+# bits per channel of the lookup tables; a table has 2**bits cells per channel
+table_bits = 5
+# bumped whenever the format of the tables on disk changes
+table_version = 1
+# the 16 system colors, as xterm shows them by default
+xterm_system = [
+    (0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0),
+    (0, 0, 238), (205, 0, 205), (0, 205, 205), (229, 229, 229),
+    (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+    (92, 92, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+]
+# levels of the 6x6x6 color cube (indices 16-231)
+xterm_cube_levels = [0, 95, 135, 175, 215, 255]
+
+
+### EXCEPTIONS ###
+class UnknownTableError(Exception):
+    '''thrown when asking for an indexed color table that doesn't exist'''
+    pass
+
+
+### CLASSES ###
+class IndexedTable:
+    '''maps rgb colors to the index of the nearest color of an indexed (e.g. xterm) palette
+
+    rgb space is split into cells; for each cell, the table holds the few
+    palette colors that can be nearest to some point in the cell, so looking
+    up a color takes a few array reads and, only near cell boundaries between
+    palette colors, comparing a handful of distances; results are exact
+
+    the table is computed once and memory-mapped from the cache directory
+
+    Attributes
+    ----------
+    name : str
+        name of the indexed palette (e.g. 'xterm256')
+    indices : np.ndarray
+        index (e.g. xterm color number) of each palette color
+    colors : np.ndarray
+        rgb of each palette color, as a k x 3 array
+    offsets : np.ndarray
+        start of each cell's candidates in candidates (plus the end of the last)
+    candidates : np.ndarray
+        positions in colors of the candidates of every cell, cell after cell
+    '''
+    def __init__(self, name: str, indices: list[int], colors: list[tuple[int, int, int]]):
+        self.name = name
+        self.indices = np.array(indices)
+        self.colors = np.array(colors, dtype=np.int32)
+        self.offsets, self.candidates = load_cells(name, self.colors)
+
+    def lookup(self, red: int, green: int, blue: int) -> int:
+        '''index of the nearest palette color
+
+        Parameters
+        ----------
+        red : int
+            red component
+        green : int
+            green component
+        blue : int
+            blue component
+
+        Returns
+        -------
+        int
+            index of the nearest palette color (the lowest index, if several are equally near)
+        '''
+        shift = 8 - table_bits
+        cell = (((red >> shift) << table_bits | (green >> shift)) << table_bits) | (blue >> shift)
+        start, end = self.offsets[cell], self.offsets[cell + 1]
+
+        if end - start == 1:
+            return int(self.indices[self.candidates[start]])
+
+        candidates = self.candidates[start:end]
+        distances = ((self.colors[candidates] - (red, green, blue)) ** 2).sum(axis=1)
+        return int(self.indices[candidates[distances.argmin()]])
+
+
+### FUNCTIONS ###
+def xterm256() -> tuple[list[int], list[tuple[int, int, int]]]:
+    '''indices and colors of the xterm 256 color palette, leaving out the 16
+    system colors, whose actual colors depend on the terminal's theme'''
+    cube = [(r, g, b) for r in xterm_cube_levels for g in xterm_cube_levels for b in xterm_cube_levels]
+    grays = [(v, v, v) for v in range(8, 248, 10)]
+    return list(range(16, 256)), cube + grays
+
+def xterm16() -> tuple[list[int], list[tuple[int, int, int]]]:
+    '''indices and colors of the 16 system colors, as xterm shows them by default'''
+    return list(range(16)), xterm_system
+
+# indexed palettes that tables can be looked up for
+palettes = {'xterm256': xterm256, 'xterm16': xterm16}
+
+def build_cells(colors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''finds the candidates for nearest color of each cell of rgb space
+
+    a color is a candidate for a cell if its distance to the nearest point of
+    the cell is at most the smallest distance any color has to the furthest
+    point of the cell
+
+    Parameters
+    ----------
+    colors : np.ndarray
+        k x 3 array of palette colors
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        offsets and candidates, as in IndexedTable
+    '''
+    n = 1 << table_bits
+    width = 256 // n
+    low = np.arange(n) * width
+    high = low + width - 1
+
+    # per channel, the squared distance from each cell to each color's component (n x k)
+    near = np.maximum(np.maximum(low[:, None] - colors.T[:, None, :], colors.T[:, None, :] - high[:, None]), 0) ** 2
+    far = np.maximum(np.abs(low[:, None] - colors.T[:, None, :]), np.abs(high[:, None] - colors.T[:, None, :])) ** 2
+
+    counts = np.empty(n ** 3, dtype=np.uint32)
+    candidates = []
+    for r in range(n):
+        # every cell with red index r (n*n x k)
+        nearest = (near[0][r][None, None, :] + near[1][:, None, :] + near[2][None, :, :]).reshape(n * n, -1)
+        furthest = (far[0][r][None, None, :] + far[1][:, None, :] + far[2][None, :, :]).reshape(n * n, -1)
+        mask = nearest <= furthest.min(axis=1, keepdims=True)
+        counts[r * n * n:(r + 1) * n * n] = mask.sum(axis=1)
+        candidates.append(np.nonzero(mask)[1].astype(np.uint8))
+
+    offsets = np.zeros(n ** 3 + 1, dtype=np.uint32)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, np.concatenate(candidates)
+
+def load_cells(name: str, colors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''memory-maps the cells of a table from the cache directory, building them first if they aren't cached'''
+    prefix = os.path.join(config.cache_dir, f'{name}-v{table_version}-{table_bits}bit')
+    paths = [f'{prefix}-offsets.npy', f'{prefix}-candidates.npy']
+
+    try:
+        return tuple(np.load(path, mmap_mode='r') for path in paths)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    cells = build_cells(colors)
+    try:
+        os.makedirs(config.cache_dir, exist_ok=True)
+        for path, array in zip(paths, cells):
+            # np.save would add .npy to a temporary name that doesn't end in it
+            with open(f'{path}.{os.getpid()}.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(f'{path}.{os.getpid()}.tmp', path)
+    except OSError:
+        # not being able to cache the table only makes the next lookup slower
+        pass
+    return cells
+
+@lru_cache(maxsize=None)
+def table(name: str) -> IndexedTable:
+    '''the lookup table of an indexed palette
+
+    Parameters
+    ----------
+    name : str
+        'xterm256' (the color cube and grayscale ramp, 16-255) or 'xterm16'
+        (the system colors, 0-15)
+
+    Returns
+    -------
+    IndexedTable
+        the table
+
+    Raises
+    ------
+    UnknownTableError
+        if there is no indexed palette of that name
+    '''
+    try:
+        indices, colors = palettes[name]()
+    except KeyError:
+        raise UnknownTableError(f"unknown indexed palette '{name}'; must be one of {', '.join(palettes)}")
+    return IndexedTable(name, indices, colors)
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import signal
+import tempfile
+import time
+
+from . import metrics
+from . import template
+from . import theme
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from typing import Any, Optional
+
+
+### GLOBAL VARS ###
+# cpu time each template may take to render, in seconds
+default_cpu_time = 10.0
+# memory each template may allocate on top of what the worker starts with, in bytes
+default_memory = 1 << 30
+# a worker that hasn't finished after this many times its cpu time limit (e.g.
+# because it is blocked rather than busy) is killed
+wall_time_factor = 4
+
+
+### EXCEPTIONS ###
+class CPUTimeExceededError(Exception):
+    '''thrown in a worker when its template exceeds the cpu time limit'''
+    pass
+
+
+### CLASSES ###
+@dataclass
+class Limits:
+    '''
+    resource limits for rendering a single template
+
+    Attributes
+    ----------
+    cpu_time : float, optional
+        cpu seconds the template may take to render (default is default_cpu_time)
+    memory : int, optional
+        bytes the template may allocate (default is default_memory)
+    '''
+    cpu_time: float = default_cpu_time
+    memory: int = default_memory
+
+@dataclass
+class RenderFailure:
+    '''
+    template that was skipped because it failed to render
+
+    Attributes
+    ----------
+    path : str
+        path of the template, relative to $HOME
+    reason : str
+        why the template failed
+    '''
+    path: str
+    reason: str
+
+@dataclass
+class Worker:
+    '''
+    running worker process, as tracked by the parent
+
+    Attributes
+    ----------
+    tmpl : template.TemplateFile
+        template the worker is rendering
+    process : Any
+        the worker process
+    deadline : float
+        time.monotonic() after which the worker is killed
+    staging_dir : str
+        directory the worker stages into, created and owned by the parent
+    staged : list[str]
+        files the worker reported staging so far, including any outside of
+        staging_dir (e.g. on another device than it)
+    '''
+    tmpl: template.TemplateFile
+    process: Any
+    deadline: float
+    staging_dir: str
+    staged: list[str]
+
+
+### FUNCTIONS ###
+def address_space() -> int:
+    '''bytes of address space the current process is using (0 if unknown)'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        return 0
+
+def exceeded_cpu_time(signum, frame):
+    raise CPUTimeExceededError()
+
+def work(tmpl: template.TemplateFile, template_theme: theme.Theme, transaction: template.Transaction, limits: Limits, staging_dir: str, conn: Connection):
+    '''renders a template in a forked worker and sends what it staged back to the parent
+
+    Parameters
+    ----------
+    tmpl : template.TemplateFile
+        template to render
+    template_theme : theme.Theme
+        theme that provides template variables
+    transaction : template.Transaction
+        the parent's transaction; the worker's copy of it only tracks what the
+        worker stages
+    limits : Limits
+        resource limits for the worker
+    staging_dir : str
+        directory to stage into, created by the parent
+    conn : Connection
+        pipe to the parent
+    '''
+    cpu_time = math.ceil(limits.cpu_time)
+    signal.signal(signal.SIGXCPU, exceeded_cpu_time)
+    # the soft limit raises CPUTimeExceededError, the hard limit kills the worker if that doesn't stop it
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time + 1))
+    memory = address_space() + limits.memory
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+    # stage into a directory of the worker's own, so staging file names can't
+    # clash with the parent's or other workers'
+    transaction.devices[staging_dir] = transaction.devices[transaction.staging_dir]
+    transaction.staging_dir = staging_dir
+    transaction.staged, transaction.paths, transaction.stats = {}, {}, {}
+    template.syscalls.clear()
+    metrics.current = metrics.Metrics()
+
+    stage = transaction.stage
+    def reported_stage(path: str) -> str:
+        staged = stage(path)
+        # tell the parent before anything is written, so it can remove the
+        # file if the worker is killed before it finishes
+        conn.send(('staged', staged))
+        return staged
+    transaction.stage = reported_stage
+
+    try:
+        tmpl.template(template_theme, transaction)
+        conn.send(('done', transaction.staged, transaction.paths, transaction.stats, dict(template.syscalls), metrics.current))
+    except BaseException as e:
+        # the parent removes whatever was staged
+        if isinstance(e, CPUTimeExceededError):
+            reason = f'exceeded {limits.cpu_time:g}s of cpu time'
+        elif isinstance(e, MemoryError):
+            reason = f'exceeded {limits.memory / 2**20:g} MiB of memory'
+        else:
+            reason = f'{type(e).__name__}: {e}'
+        conn.send(('failed', reason))
+    finally:
+        conn.close()
+
+def discard(worker: Worker):
+    '''removes everything a worker that failed staged'''
+    for staged in worker.staged:
+        try:
+            os.remove(staged)
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(worker.staging_dir, ignore_errors=True)
+
+def render(
+        templates: list[template.TemplateFile],
+        template_theme: theme.Theme,
+        transaction: template.Transaction,
+        limits: Optional[Limits] = None,
+        jobs: Optional[int] = None
+) -> list[RenderFailure]:
+    '''renders each template in its own forked worker process, with resource limits
+
+    at most jobs workers run at once; a template that raises, runs out of cpu
+    time or memory, or hangs is reported and skipped, whatever it staged is
+    removed, and the others are still staged in transaction
+
+    Parameters
+    ----------
+    templates : list[template.TemplateFile]
+        templates to render
+    template_theme : theme.Theme
+        theme that provides template variables
+    transaction : template.Transaction
+        transaction to stage the output in
+    limits : Limits, optional
+        resource limits for each template (default is None, meaning Limits())
+    jobs : int, optional
+        number of workers running at once (default is None, meaning one per cpu)
+
+    Returns
+    -------
+    list[RenderFailure]
+        templates that were skipped
+    '''
+    limits = limits if limits else Limits()
+    jobs = jobs if jobs else os.cpu_count() or 1
+    # fork, so workers start with the compiled templates and loaded theme
+    context = multiprocessing.get_context('fork')
+
+    pending = list(reversed(templates))
+    # receiving end of each running worker's pipe -> worker
+    running: dict[Connection, Worker] = {}
+    failures = []
+
+    def fail(receiver: Connection, reason: str):
+        worker = running.pop(receiver)
+        # pick up files the worker reported staging that haven't been read yet
+        try:
+            while receiver.poll():
+                message = receiver.recv()
+                if message[0] == 'staged':
+                    worker.staged.append(message[1])
+        except EOFError:
+            pass
+        receiver.close()
+        discard(worker)
+        failures.append(RenderFailure(worker.tmpl.path, reason))
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            tmpl = pending.pop()
+            staging_dir = tempfile.mkdtemp(dir=transaction.staging_dir)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=work, args=(tmpl, template_theme, transaction, limits, staging_dir, sender), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = Worker(tmpl, process, time.monotonic() + wall_time_factor * limits.cpu_time, staging_dir, [])
+
+        timeout = max(0, min(worker.deadline for worker in running.values()) - time.monotonic())
+        ready = wait(list(running), timeout)
+
+        for receiver in ready:
+            worker = running[receiver]
+            try:
+                message = receiver.recv()
+            except EOFError:
+                # killed before it could report, e.g. by the hard cpu time limit
+                worker.process.join()
+                message = ('failed', f'worker died with exit code {worker.process.exitcode}')
+
+            if message[0] == 'staged':
+                worker.staged.append(message[1])
+                continue
+
+            worker.process.join()
+            if message[0] == 'failed':
+                fail(receiver, message[1])
+                continue
+
+            del running[receiver]
+            receiver.close()
+            _, staged, paths, stats, syscalls, recorded = message
+            transaction.staged.update(staged)
+            transaction.paths.update(paths)
+            transaction.stats.update(stats)
+            for path, calls in syscalls.items():
+                template.syscalls[path].update(calls)
+            metrics.merge(recorded)
+
+        for receiver, worker in list(running.items()):
+            if time.monotonic() >= worker.deadline:
+                worker.process.kill()
+                worker.process.join()
+                fail(receiver, f'timed out after {wall_time_factor * limits.cpu_time:g}s')
+
+    return failures
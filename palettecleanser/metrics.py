@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import cProfile
+import threading
+import time
+import tracemalloc
+
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+
+### GLOBAL VARS ###
+# whether spans and counters are being recorded (see recording)
+enabled = False
+# number of allocation sites reported when tracing memory
+top_allocations = 10
+# spans and counters are recorded from several threads during a deploy
+lock = threading.Lock()
+
+
+### CLASSES ###
+@dataclass
+class Span:
+    '''
+    time spent in one stage, summed over every time the stage ran
+
+    Attributes
+    ----------
+    count : int, optional
+        number of times the stage ran (default is 0)
+    total : float, optional
+        seconds spent in the stage (default is 0)
+    longest : float, optional
+        seconds the slowest run of the stage took (default is 0)
+    '''
+    count: int = 0
+    total: float = 0
+    longest: float = 0
+
+@dataclass
+class Metrics:
+    '''
+    what was recorded while running a command
+
+    Attributes
+    ----------
+    spans : dict[str, Span], optional
+        time spent in each stage, in the order the stages first ran (default is {})
+    counters : Counter[str], optional
+        e.g. bytes written, files skipped and cache hits (default is empty)
+    elapsed : float, optional
+        seconds from the start to the end of recording (default is 0)
+    allocations : list[tuple[str, int]], optional
+        allocation sites and the bytes they allocated, largest first, if memory
+        was traced (default is [])
+    '''
+    spans: dict[str, Span] = field(default_factory=dict)
+    counters: Counter[str] = field(default_factory=Counter)
+    elapsed: float = 0
+    allocations: list[tuple[str, int]] = field(default_factory=list)
+
+    def export(self) -> dict[str, Any]:
+        '''converts metrics to a dictionary that can be written as json'''
+        return {
+            'elapsed': self.elapsed,
+            'spans': {name: vars(s) for name, s in self.spans.items()},
+            'counters': dict(self.counters),
+            'allocations': [{'site': site, 'bytes': size} for site, size in self.allocations]
+        }
+
+
+# metrics of the current (or last) recording
+current = Metrics()
+
+
+### FUNCTIONS ###
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    '''times the enclosed stage of a command, if metrics are being recorded
+
+    Parameters
+    ----------
+    name : str
+        name of the stage (e.g. 'render')
+    '''
+    if not enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def record(name: str, elapsed: float):
+    '''adds one run of a stage that was timed by the caller, if metrics are being recorded
+
+    for stages that are interleaved with others too finely to enclose in a
+    span (e.g. rendering and writing a streamed template)
+
+    Parameters
+    ----------
+    name : str
+        name of the stage
+    elapsed : float
+        how long the stage ran in seconds
+    '''
+    if not enabled:
+        return
+
+    with lock:
+        s = current.spans.setdefault(name, Span())
+        s.count += 1
+        s.total += elapsed
+        s.longest = max(s.longest, elapsed)
+
+def add(name: str, n: int = 1):
+    '''adds n to a counter, if metrics are being recorded
+
+    Parameters
+    ----------
+    name : str
+        name of the counter (e.g. 'bytes written')
+    n : int, optional
+        amount to add (default is 1)
+    '''
+    if enabled:
+        with lock:
+            current.counters[name] += n
+
+def merge(metrics: Metrics):
+    '''adds spans and counters recorded elsewhere (e.g. in a worker process) to the current recording
+
+    Parameters
+    ----------
+    metrics : Metrics
+        recorded spans and counters
+    '''
+    if not enabled:
+        return
+
+    with lock:
+        for name, other in metrics.spans.items():
+            s = current.spans.setdefault(name, Span())
+            s.count += other.count
+            s.total += other.total
+            s.longest = max(s.longest, other.longest)
+        current.counters.update(metrics.counters)
+
+@contextmanager
+def recording(profile_path: Optional[str] = None, trace_memory: bool = False) -> Iterator[Metrics]:
+    '''records spans and counters for the duration of the context
+
+    Parameters
+    ----------
+    profile_path : str, optional
+        also run cProfile and save its stats to this path, for use with pstats
+        or snakeviz (default is None)
+    trace_memory : bool, optional
+        also trace memory allocations with tracemalloc and report the largest
+        allocation sites (default is False)
+
+    Yields
+    ------
+    Metrics
+        filled in as the context runs
+    '''
+    global enabled, current
+    current = Metrics()
+    enabled = True
+
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.elapsed = time.perf_counter() - start
+        enabled = False
+
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if trace_memory:
+            current.allocations = [
+                (str(s.traceback), s.size) for s in tracemalloc.take_snapshot().statistics('lineno')[:top_allocations]
+            ]
+            tracemalloc.stop()
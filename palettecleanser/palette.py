@@ -3,14 +3,23 @@ from __future__ import annotations
 import yaml
 import numpy as np
 import os
+import tempfile
 
 from tabulate import tabulate
 from dataclasses import dataclass
+from contextlib import nullcontext
 from functools import reduce
 from typing import Optional, Callable
 from pywal import colors
+from pywal import util
+from pywal.settings import CACHE_DIR
 
+from . import animation
+from . import backends
+from . import catalog
 from . import config
+from . import indexed
+from . import metrics
 
 ### EXCEPTIONS ###
 class MalformedHexError(Exception):
@@ -115,6 +124,31 @@ class Color:
 
         return [Color(r(t), g(t), b(t)) for t in np.linspace(0, 1, n)]
 
+    def indexed(self, colors: int = 256) -> int:
+        '''finds the nearest indexed terminal color, for terminals and TUIs that can't show rgb colors
+
+        uses a precomputed lookup table, so this is cheap enough to call for
+        every color reference in a template
+
+        Parameters
+        ----------
+        colors : int, optional
+            256 for the xterm color cube and grayscale ramp (16-255; the system
+            colors are left out because terminal themes change them), or 16 for
+            the system colors as xterm shows them by default (0-15) (default is 256)
+
+        Returns
+        -------
+        int
+            index of the nearest indexed color
+
+        Raises
+        ------
+        indexed.UnknownTableError
+            if colors isn't 256 or 16
+        '''
+        return indexed.table(f'xterm{colors}').lookup(self.red, self.green, self.blue)
+
     def __str__(self) -> str:
         '''calculates hex code
 
@@ -127,9 +161,22 @@ class Color:
 
     def show(self):
         '''hex code where the background color is that represented by the current object'''
-        start = ';'.join(['\x1b[48', '2', str(self.red), str(self.green), str(self.blue) + 'm'])
-        end = '\x1b[0m'
-        return start + str(self) + end
+        return f'\x1b[48;2;{self.red};{self.green};{self.blue}m{self}\x1b[0m'
+
+    def swatch(self, width: int = 2) -> str:
+        '''blank cells whose background color is that represented by the current object
+
+        Parameters
+        ----------
+        width : int, optional
+            number of terminal cells (default is 2)
+
+        Returns
+        -------
+        str
+            the cells, with the escape codes that color them
+        '''
+        return f'\x1b[48;2;{self.red};{self.green};{self.blue}m{" " * width}\x1b[0m'
 
 @dataclass
 class Palette:
@@ -165,6 +212,21 @@ class Palette:
         '''
         return Palette([color.tone(percent, lighten) for color in self.colors], name)
 
+    def indexed(self, colors: int = 256) -> list[int]:
+        '''finds the nearest indexed terminal color for every color in palette
+
+        Parameters
+        ----------
+        colors : int, optional
+            256 or 16 (see Color.indexed) (default is 256)
+
+        Returns
+        -------
+        list[int]
+            index of the nearest indexed color for each color
+        '''
+        return [color.indexed(colors) for color in self.colors]
+
     def save(self):
         '''saves Palette to yml file at $XDG_CONFIG_HOME/palette-cleanser/palettes/
 
@@ -183,6 +245,7 @@ class Palette:
 
         with open(path, 'w') as f:
             yaml.dump(self, f)
+        catalog.record_palettes([self.name])
 
 
     def table(self) -> dict[str, list[Colors]]:
@@ -281,12 +344,35 @@ def from_hexes(hexcodes: list[str], name: str = None) -> Palette:
     return Palette([from_hex(hexcode) for hexcode in hexcodes], name)
 
 
+def ansi_order(colors: list[Color], slots: Optional[list[Color]] = None) -> list[Color]:
+    '''orders colors for the ansi slots (black, red, green, yellow, blue,
+    purple, cyan, white)
+
+    each slot in turn takes the remaining color closest to its ansi color
+
+    Parameters
+    ----------
+    colors : list[Color]
+        the colors, in any order; as many as there are slots
+    slots : list[Color], optional
+        ansi colors of the slots to fill (default is None, meaning all 8 of
+        ansi_normal_palette)
+
+    Returns
+    -------
+    list[Color]
+        the colors, in the order of the slots
+    '''
+    remaining = list(colors)
+    return [remaining.pop(c.closest(remaining)) for c in (slots if slots else ansi_normal_palette.colors)]
+
 def from_image(
         image_path: str,
         name: Optional[str] = None,
         light: bool = False,
         backend: str = 'wal',
-        saturate_percent: Optional[float] = None
+        saturate_percent: Optional[float] = None,
+        cache: bool = True
 ) -> Palette:
     '''constructs Palette object from an image (.jpg/.png file) using the provided pywal backend
 
@@ -301,33 +387,100 @@ def from_image(
         palette (default is False)
     backend : str, optional
         pywal backend generation algorithm to use (see more at
-        https://github.com/dylanaraps/pywal/tree/master/pywal/backends) (default is 'wal')
+        https://github.com/dylanaraps/pywal/tree/master/pywal/backends), or one
+        of the built-in backends in palettecleanser.backends, which only need
+        Pillow (default is 'wal')
     saturate_percent : float, optional
         amount to saturate colors by (saturate_percent=5 means 5%) (default is None)
+    cache : bool, optional
+        reuse (and save) the colors pywal extracted from this image before
+        (default is True)
 
     Returns
     -------
     Palette
         color palette based off of provided image
     '''
-    initial_colors = from_hexes(
-        list(colors.get(
-            image_path,
-            light=light,
-            backend=backend,
-            sat=str(saturate_percent / 100) if saturate_percent else ""
-        )['colors'].values())[:8] # pywal generates 16 colors, but we only want the first 8
-    ).colors
-
-    return Palette(
-        [
-            # reassign colors to their optimal positions based on ansi color palette
-            initial_colors.pop(c.closest(initial_colors))
-            for c in ansi_normal_palette.colors
-        ],
-        name
-    )
+    if backend in backends.builtin:
+        hexcodes = backends.extract(image_path, backend)
+        if saturate_percent:
+            hexcodes = [util.saturate_color(h, saturate_percent / 100) for h in hexcodes]
+        # images with fewer than 8 colors repeat some
+        hexcodes = (hexcodes * 8)[:8]
+    else:
+        with tempfile.TemporaryDirectory(prefix='pclean-') if not cache else nullcontext(CACHE_DIR) as cache_dir:
+            hexcodes = list(colors.get(
+                image_path,
+                light=light,
+                backend=backend,
+                cache_dir=cache_dir,
+                sat=str(saturate_percent / 100) if saturate_percent else ""
+            )['colors'].values())[:8] # pywal generates 16 colors, but we only want the first 8
+    p = Palette(ansi_order(from_hexes(hexcodes).colors), name)
+
+    # pywal puts the background first in light palettes; do the same for built-in backends
+    if light and backend in backends.builtin:
+        p.colors[0], p.colors[7] = p.colors[7], p.colors[0]
+
+    return p
+
+
+def from_animation(
+        path: str,
+        name: Optional[str] = None,
+        light: bool = False,
+        backend: str = 'wal',
+        saturate_percent: Optional[float] = None,
+        frame_stride: int = 1,
+        reservoir_size: int = animation.default_reservoir_size
+) -> Palette:
+    '''constructs Palette object from an animated image (gif, apng, webp) or,
+    if ffmpeg is installed, a video
+
+    frames are decoded one at a time and a bounded random sample of their
+    pixels is kept, so memory doesn't grow with the number of frames; the
+    sample is quantized once at the end, as with from_image; requires Pillow
+
+    Parameters
+    ----------
+    path : str
+        path to animation
+    name : str, optional
+        name of palette (default is None)
+    light : bool, optional
+        True to generate a light color palette, False to generate a dark color
+        palette (default is False)
+    backend : str, optional
+        pywal backend generation algorithm to use (default is 'wal')
+    saturate_percent : float, optional
+        amount to saturate colors by (saturate_percent=5 means 5%) (default is None)
+    frame_stride : int, optional
+        sample every frame_stride-th frame (default is 1)
+    reservoir_size : int, optional
+        number of pixels sampled from the whole animation (default is
+        animation.default_reservoir_size)
 
+    Returns
+    -------
+    Palette
+        color palette based off of provided animation
+
+    Raises
+    ------
+    animation.FramesNotReadableError
+        if the frames of the file can't be decoded
+    '''
+    with metrics.span('sample frames'):
+        pixels = animation.sample(path, frame_stride, reservoir_size)
+    if not len(pixels):
+        raise animation.FramesNotReadableError(f"'{path}' has no frames")
+
+    with tempfile.TemporaryDirectory(prefix='pclean-') as directory:
+        sample_path = os.path.join(directory, f'{os.path.basename(path)}.png')
+        animation.save_pixels(pixels, sample_path)
+        # pywal would cache the colors under the path of the sample, which is
+        # never seen again
+        return from_image(sample_path, name, light, backend, saturate_percent, cache=False)
 
 def from_config(name: str) -> Palette:
     '''pulls existing palette from config
@@ -348,7 +501,30 @@ def from_config(name: str) -> Palette:
         if the palette doesn't exist
     '''
     try:
-        with open(os.path.join(config.palettes_dir, f'{name}.yml')) as f:
-            return yaml.load(f, Loader=yaml.Loader)
+        with metrics.span('load palette'):
+            return config.load_yaml(os.path.join(config.palettes_dir, f'{name}.yml'))
     except FileNotFoundError:
         raise PaletteNotFoundError(f'{name} palette doesn\'t exist')
+
+def names() -> list[str]:
+    '''names of every saved palette'''
+    if not os.path.isdir(config.palettes_dir):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(config.palettes_dir) if f.endswith('.yml'))
+
+def save_all(palettes: list[Palette]):
+    '''saves many palettes at once to $XDG_CONFIG_HOME/palette-cleanser/palettes/
+
+    unlike Palette.save, never asks: palettes must be named, and saved palettes
+    of the same names are overwritten
+
+    Parameters
+    ----------
+    palettes : list[Palette]
+        palettes to save
+    '''
+    os.makedirs(config.palettes_dir, exist_ok=True)
+    for p in palettes:
+        with open(os.path.join(config.palettes_dir, f'{p.name}.yml'), 'w') as f:
+            yaml.dump(p, f, Dumper=config.yaml_dumper)
+    catalog.record_palettes([p.name for p in palettes])
@@ -0,0 +1,26 @@
+'''where palette-cleanser keeps its files
+
+kept apart from palettecleanser.config, which imports yaml, so that the
+lightweight entry point (see palettecleanser.cli.client) can find the daemon
+without importing anything else
+'''
+import os
+
+try:
+    config_root = os.environ['XDG_CONFIG_HOME']
+except KeyError:
+    config_root = os.path.join(os.environ['HOME'], '.config')
+
+try:
+    cache_root = os.environ['XDG_CACHE_HOME']
+except KeyError:
+    cache_root = os.path.join(os.environ['HOME'], '.cache')
+
+try:
+    runtime_root = os.environ['XDG_RUNTIME_DIR']
+except KeyError:
+    runtime_root = None
+
+config_dir = os.path.join(config_root, 'palette-cleanser')
+# unix socket the daemon listens on; falls back to the config dir if there is no runtime dir
+daemon_socket = os.path.join(runtime_root if runtime_root else config_dir, 'palette-cleanser.sock')
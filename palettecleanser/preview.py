@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shlex
+import subprocess
+import sys
+
+from . import palette as pal
+from . import theme as th
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+### GLOBAL VARS ###
+# libraries smaller than this are loaded without forking, which would cost more than it saves
+parallel_threshold = 64
+# names handed to a worker at a time
+chunk_size = 32
+# terminal cells per color
+swatch_width = 2
+# colors shown per palette; longer palettes are cut short with an ellipsis
+palette_colors = 8
+# longest name shown; longer names are cut short with an ellipsis
+max_name_width = 32
+# spaces between palettes on the same line
+gutter = 2
+# used when $PAGER isn't set
+default_pager = 'less'
+# passed to less when $LESS isn't set: quit if everything fits on one screen
+# (F), show colors (R) and leave the output on the screen (X)
+less_options = 'FRX'
+# bytes written to the pager at a time
+buffer_size = 1 << 16
+
+
+### FUNCTIONS ###
+def load_palette(name: str) -> tuple[str, Optional[list[pal.Color]]]:
+    '''colors of a saved palette, or None if it can't be loaded'''
+    try:
+        return name, pal.from_config(name).colors
+    except Exception:
+        return name, None
+
+def load_theme(name: str) -> tuple[str, Optional[list[list[pal.Color]]]]:
+    '''colors of each palette of a saved theme, or None if it can't be loaded'''
+    try:
+        return name, [p.colors for p in th.from_config(name).get_palettes()]
+    except Exception:
+        return name, None
+
+def load(names: list[str], loader: Callable[[str], Any], jobs: Optional[int] = None) -> Iterator[Any]:
+    '''loads many things at once, yielding each in order as soon as it (and
+    those before it) are loaded
+
+    Parameters
+    ----------
+    names : list[str]
+        names of the things to load
+    loader : Callable[[str], Any]
+        loads a thing by name (e.g. load_palette); must be a module level function
+    jobs : int, optional
+        number of processes (default is None, meaning one per cpu); libraries
+        smaller than parallel_threshold are loaded in this process
+
+    Returns
+    -------
+    Iterator[Any]
+        what loader returns, for each name
+    '''
+    if jobs == 1 or len(names) < parallel_threshold:
+        yield from map(loader, names)
+        return
+
+    pool = multiprocessing.get_context('fork').Pool(jobs)
+    try:
+        yield from pool.imap(loader, names, chunk_size)
+    finally:
+        # also when the pager is quit part way through
+        pool.terminate()
+        pool.join()
+
+def fit(text: str, width: int) -> str:
+    '''pads or cuts text to width cells'''
+    return text.ljust(width) if len(text) <= width else text[:width - 1] + '…'
+
+def swatches(colors: list[pal.Color], count: Optional[int] = None, width: int = swatch_width) -> str:
+    '''a row of swatches
+
+    Parameters
+    ----------
+    colors : list[Color]
+        colors of the swatches
+    count : int, optional
+        if passed, the row is always count swatches (and an extra cell) wide:
+        shorter rows are padded, longer ones cut short with an ellipsis
+        (default is None)
+    width : int, optional
+        cells per swatch (default is swatch_width)
+
+    Returns
+    -------
+    str
+        the swatches
+    '''
+    if count is None:
+        return ''.join(c.swatch(width) for c in colors)
+    row = ''.join(c.swatch(width) for c in colors[:count])
+    return row + ('…' if len(colors) > count else ' ' * ((count - len(colors)) * width + 1))
+
+def layout(names: list[str], columns: int) -> tuple[int, int]:
+    '''width of the names, and how many palettes fit side by side in a terminal columns wide'''
+    name_width = min(max(map(len, names), default=0), max_name_width)
+    cell = name_width + 1 + palette_colors * swatch_width + 1
+    return name_width, max(1, (columns + gutter) // (cell + gutter))
+
+def palette_rows(
+        palettes: Iterable[tuple[str, Optional[list[pal.Color]]]],
+        name_width: int,
+        per_row: int = 1
+) -> Iterator[str]:
+    '''lines of named palettes, per_row to a line, made as the palettes come in'''
+    empty = ' ' * (palette_colors * swatch_width + 1)
+    cells = []
+    for name, colors in palettes:
+        cells.append(f'{fit(name, name_width)} {swatches(colors, palette_colors) if colors is not None else fit("unreadable", len(empty))}')
+        if len(cells) == per_row:
+            yield (' ' * gutter).join(cells)
+            cells = []
+    if cells:
+        yield (' ' * gutter).join(cells)
+
+def theme_rows(
+        themes: Iterable[tuple[str, Optional[list[list[pal.Color]]]]],
+        name_width: int,
+        columns: int
+) -> Iterator[str]:
+    '''lines of named themes, one to a line, with the swatches of a theme narrowed to fit in columns'''
+    for name, palettes in themes:
+        if palettes is None:
+            yield f'{fit(name, name_width)} unreadable'
+            continue
+        room = columns - name_width - 1 - (len(palettes) - 1)
+        count = sum(len(colors) for colors in palettes)
+        width = max(1, min(swatch_width, room // count if count else swatch_width))
+        yield f'{fit(name, name_width)} ' + ' '.join(swatches(colors, width=width) for colors in palettes)
+
+def palettes(names: list[str], columns: int, jobs: Optional[int] = None) -> Iterator[str]:
+    '''preview lines of saved palettes, loaded in parallel, for a terminal columns wide'''
+    name_width, per_row = layout(names, columns)
+    return palette_rows(load(names, load_palette, jobs), name_width, per_row)
+
+def themes(names: list[str], columns: int, jobs: Optional[int] = None) -> Iterator[str]:
+    '''preview lines of saved themes, loaded in parallel, for a terminal columns wide'''
+    name_width = min(max(map(len, names), default=0), max_name_width)
+    return theme_rows(load(names, load_theme, jobs), name_width, columns)
+
+def open_pager() -> Optional[subprocess.Popen]:
+    '''starts $PAGER (or less), or returns None if it can't be started'''
+    env = os.environ.copy()
+    env.setdefault('LESS', less_options)
+    try:
+        return subprocess.Popen(
+            shlex.split(os.environ.get('PAGER') or default_pager),
+            stdin=subprocess.PIPE,
+            env=env,
+            text=True,
+            bufsize=buffer_size
+        )
+    except OSError:
+        return None
+
+def write(lines: Iterable[str], pager: bool = True, height: int = 24):
+    '''writes lines as they are made, so the first screen shows before the rest are
+
+    output is buffered rather than written line by line, except that the
+    first height lines are flushed as soon as they are ready
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        the lines
+    pager : bool, optional
+        write to $PAGER (or less) when stdout is a terminal (default is True)
+    height : int, optional
+        lines on a screen (default is 24)
+    '''
+    process = open_pager() if pager and sys.stdout.isatty() else None
+    stream = process.stdin if process else sys.stdout
+    # a terminal's stdout is flushed after every line otherwise
+    line_buffering = getattr(stream, 'line_buffering', False)
+    if line_buffering:
+        stream.reconfigure(line_buffering=False)
+
+    try:
+        for i, line in enumerate(lines, 1):
+            stream.write(line + '\n')
+            if i == height:
+                stream.flush()
+        stream.flush()
+    except BrokenPipeError:
+        # the pager was quit, or whatever stdout is piped to stopped reading;
+        # python would complain about the unwritten output on exit otherwise
+        if not process:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if process:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            process.wait()
+        elif line_buffering:
+            stream.reconfigure(line_buffering=True)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import multiprocessing
+import numpy as np
+import os
+
+from .palette import Color
+from typing import Any, Optional
+
+
+### GLOBAL VARS ###
+# bits per channel of the lookup table; each cell of a 6 bit table covers 4
+# values per channel, so a pixel maps to a palette color that is at most a few
+# levels further away than its true nearest one (8 bits makes it exact)
+lut_bits = 6
+# rows of the image processed at once, which bounds the memory used for
+# temporaries (the decoded image itself is held whole, see recolor)
+tile_rows = 256
+# images with fewer pixels than this aren't worth spreading across processes
+parallel_threshold = 1 << 20
+# 8x8 bayer matrix, for ordered dithering
+bayer = np.array([
+    [ 0, 32,  8, 40,  2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44,  4, 36, 14, 46,  6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [ 3, 35, 11, 43,  1, 33,  9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47,  7, 39, 13, 45,  5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+])
+# the image and mapping shared with forked workers (see recolor)
+shared: dict[str, Any] = {}
+
+
+### EXCEPTIONS ###
+class PillowNotFoundError(Exception):
+    '''thrown when reading or writing images without Pillow installed'''
+    pass
+
+
+### CLASSES ###
+class Mapper:
+    '''maps pixels to their nearest color in a palette
+
+    Attributes
+    ----------
+    colors : np.ndarray
+        the palette, as a k x 3 array
+    lut : np.ndarray
+        index of the nearest palette color for each cell of rgb space
+    bits : int
+        bits per channel of lut
+    dither : float
+        amplitude of the ordered dithering offset (0 means no dithering)
+    blend : float
+        fraction of the original color kept in each pixel
+    '''
+    def __init__(self, colors: list[Color], dither: bool = False, blend: float = 0, bits: int = lut_bits):
+        '''
+        Parameters
+        ----------
+        colors : list[Color]
+            palette to map to
+        dither : bool, optional
+            apply ordered (bayer) dithering, which approximates colors between
+            palette colors with patterns (default is False)
+        blend : float, optional
+            fraction of the original color to keep in each pixel, between 0 and
+            1; softens the result (default is 0)
+        bits : int, optional
+            bits per channel of the lookup table (default is lut_bits)
+        '''
+        self.colors = np.array([[c.red, c.green, c.blue] for c in colors], dtype=np.float32)
+        self.bits = bits
+        self.lut = nearest_lut(self.colors, bits)
+        self.dither = spacing(self.colors) if dither else 0
+        self.blend = blend
+
+    def map(self, pixels: np.ndarray, top: int = 0) -> np.ndarray:
+        '''maps pixels to the palette
+
+        Parameters
+        ----------
+        pixels : np.ndarray
+            h x w x 3 uint8 rgb pixels
+        top : int, optional
+            row of the image pixels starts at, so that dithering patterns line
+            up across tiles (default is 0)
+
+        Returns
+        -------
+        np.ndarray
+            h x w x 3 uint8 rgb pixels
+        '''
+        source = pixels
+        if self.dither:
+            h, w = pixels.shape[:2]
+            threshold = bayer[np.arange(top, top + h)[:, None] % 8, np.arange(w)[None, :] % 8]
+            offset = ((threshold + .5) / 64 - .5) * self.dither
+            source = np.clip(pixels + offset[..., None], 0, 255).astype(np.uint8)
+
+        cells = source >> (8 - self.bits)
+        mapped = self.colors[self.lut[cells[..., 0], cells[..., 1], cells[..., 2]]]
+
+        if self.blend:
+            mapped = mapped * (1 - self.blend) + pixels * self.blend
+
+        return np.rint(mapped).astype(np.uint8)
+
+
+### FUNCTIONS ###
+def nearest_lut(colors: np.ndarray, bits: int = lut_bits) -> np.ndarray:
+    '''index of the nearest color for the center of each cell of rgb space
+
+    Parameters
+    ----------
+    colors : np.ndarray
+        k x 3 array of palette colors
+    bits : int, optional
+        bits per channel; the table has 2**bits cells per channel (default is lut_bits)
+
+    Returns
+    -------
+    np.ndarray
+        2**bits x 2**bits x 2**bits uint8 array of indices into colors
+    '''
+    n = 1 << bits
+    centers = (np.arange(n, dtype=np.float32) + .5) * (256 / n) - .5
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    lut = np.empty(len(grid), dtype=np.uint8)
+    # |cell - color|^2 = |cell|^2 - 2 cell.color + |color|^2, and |cell|^2 is the
+    # same for every color, so the nearest color minimizes the rest
+    norms = (colors ** 2).sum(axis=1)
+    # chunked, so the k distances per cell never take more than a few MiB
+    chunk = max(1, (1 << 20) // len(colors))
+    for start in range(0, len(grid), chunk):
+        lut[start:start + chunk] = (norms - 2 * grid[start:start + chunk] @ colors.T).argmin(axis=1)
+
+    return lut.reshape(n, n, n)
+
+def spacing(colors: np.ndarray) -> float:
+    '''typical distance between neighbouring palette colors, which is how far dithering spreads pixels'''
+    if len(colors) < 2:
+        return 0
+    distances = np.sqrt(((colors[:, None, :] - colors[None, :, :]) ** 2).sum(axis=-1))
+    np.fill_diagonal(distances, np.inf)
+    return float(np.median(distances.min(axis=1)) / np.sqrt(3))
+
+def map_tile(top: int) -> tuple[int, bytes]:
+    '''maps the rows of the shared image starting at top, in a worker'''
+    image, mapper = shared['image'], shared['mapper']
+    bottom = min(top + tile_rows, image.height)
+    pixels = np.asarray(image.crop((0, top, image.width, bottom)))
+    return top, mapper.map(pixels, top).tobytes()
+
+def recolor(
+        image_path: str,
+        colors: list[Color],
+        out_path: str,
+        dither: bool = False,
+        blend: float = 0,
+        jobs: Optional[int] = None
+):
+    '''maps every pixel of an image to its nearest color in a palette
+
+    pixels are looked up in a table of the nearest palette color for each
+    cell of rgb space, rather than compared with every palette color, and the
+    image is processed in tiles of rows spread across processes; requires Pillow
+
+    Pillow decodes most formats all at once, so the whole image is held in
+    memory (once, as each tile is written back over the rows it was mapped
+    from), plus its alpha channel if it has one
+
+    Parameters
+    ----------
+    image_path : str
+        image to recolor
+    colors : list[Color]
+        palette to map to
+    out_path : str
+        where to save the recolored image; the format is taken from the extension
+    dither : bool, optional
+        apply ordered dithering (default is False)
+    blend : float, optional
+        fraction of the original color to keep in each pixel (default is 0)
+    jobs : int, optional
+        number of processes (default is None, meaning one per cpu)
+
+    Raises
+    ------
+    PillowNotFoundError
+        if Pillow isn't installed
+    '''
+    try:
+        from PIL import Image
+    except ImportError:
+        raise PillowNotFoundError("recoloring images requires Pillow (pip install 'palettecleanser[images]')")
+
+    with Image.open(image_path) as original:
+        image = original.convert('RGB')
+        alpha = original.getchannel('A') if 'A' in original.getbands() else None
+
+    mapper = Mapper(colors, dither, blend)
+    tops = range(0, image.height, tile_rows)
+
+    shared.update(image=image, mapper=mapper)
+    # fork, so workers share the decoded image and lookup table instead of each getting a copy
+    parallel = image.width * image.height >= parallel_threshold and jobs != 1
+    pool = multiprocessing.get_context('fork').Pool(jobs) if parallel else None
+
+    try:
+        for top, data in pool.imap_unordered(map_tile, tops) if pool else map(map_tile, tops):
+            # forked workers read the image as it was when they were forked
+            image.paste(Image.frombytes('RGB', (image.width, min(tile_rows, image.height - top)), data), (0, top))
+    finally:
+        shared.clear()
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    # jpeg has no alpha channel
+    if alpha and os.path.splitext(out_path)[1].lower() not in ['.jpg', '.jpeg']:
+        image.putalpha(alpha)
+    image.save(out_path)
@@ -1,23 +1,125 @@
 from __future__ import annotations
 
+import errno
+import io
 import jinja2 as j2
+import json
 import yaml
 import os
 import shutil
+import stat
+import tempfile
+import time
+import uuid
 
+from . import backup
+from . import emitters
 from . import theme
+from . import palette as pal
 from . import config
+from . import metrics
+from . import tree
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import IO, AnyStr, Optional, Union
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import IO, Any, AnyStr, Callable, Iterator, Optional, TypeVar, Union
+from collections import Counter, defaultdict
 from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+
+### JINJA ###
+class TemplateLoader(j2.FileSystemLoader):
+    '''FileSystemLoader that remembers the shebang and permissions of each template it loads
+
+    that way rendering a template never has to open or stat the template file
+    again after jinja has loaded it
+
+    Attributes
+    ----------
+    sources : dict[str, tuple[str, int]]
+        shebang (empty string if there is none) and permissions of each loaded template
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sources: dict[str, tuple[str, int]] = {}
+
+    def get_source(self, environment: j2.Environment, template: str) -> tuple[str, str, Callable[[], bool]]:
+        pieces = j2.loaders.split_template_path(template)
+
+        for searchpath in self.searchpath:
+            filename = os.path.join(searchpath, *pieces)
+            try:
+                f = counted_open(remove_j2(template), filename, 'rb')
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+
+            with f:
+                loaded = counted(remove_j2(template), os.fstat, f.fileno())
+                contents = f.read().decode(self.encoding)
+
+            first_line = contents[:contents.find('\n') + 1] if '\n' in contents else contents
+            self.sources[template] = (first_line if first_line[:2] == '#!' else '', loaded.st_mode)
+
+            def uptodate() -> bool:
+                try:
+                    st = counted(remove_j2(template), os.stat, filename)
+                except OSError:
+                    return False
+
+                # permissions can change without the content changing
+                self.sources[template] = (self.sources[template][0], st.st_mode)
+                return st.st_mtime_ns == loaded.st_mtime_ns
+
+            return contents, os.path.normpath(filename), uptodate
+
+        raise j2.TemplateNotFound(template)
+
+
+def xterm(color: Union[pal.Color, str], colors: int = 256) -> int:
+    '''jinja filter that approximates a color with the nearest indexed terminal color
+
+    e.g. {{ palettes[0].colors[1] | xterm }} or {{ '#ff0000' | xterm(16) }}
+
+    Parameters
+    ----------
+    color : Union[pal.Color, str]
+        color, or its hexcode
+    colors : int, optional
+        256 for the xterm color cube and grayscale ramp (16-255), or 16 for the
+        system colors (0-15) (default is 256)
+
+    Returns
+    -------
+    int
+        index of the nearest indexed color
+    '''
+    return (pal.from_hex(color) if isinstance(color, str) else color).indexed(colors)
 
 
 ### GLOBAL VARS ###
+# compiled templates kept by env (least recently used are dropped); larger than
+# jinja's default of 400, so deploying a large tree doesn't recompile it each
+# time, but bounded, since the daemon keeps env for as long as it runs and
+# templates that were renamed or removed would otherwise never be dropped
+template_cache_size = 4096
 # jinja environment
-env = j2.Environment(loader=j2.FileSystemLoader(config.templates_dir), trim_blocks=True, lstrip_blocks=True)
+env = j2.Environment(loader=TemplateLoader(config.templates_dir), trim_blocks=True, lstrip_blocks=True, cache_size=template_cache_size)
+env.filters['xterm'] = xterm
+# buffer size of files that template output is streamed into
+write_buffer_size = 1 << 16
+# number of bytes read from the start of a file to decide whether it is binary
+binary_check_size = 8192
+# whether to count the filesystem calls made for each file (see counted and counted_open)
+debug = False
+# filesystem calls made for each file (relative to $HOME), when debug is True
+syscalls: defaultdict[str, Counter] = defaultdict(Counter)
+# return type of a counted call
+T = TypeVar('T')
 # default 'signature' to put in a comment at the top of templated files
 templated_signature = '@palette-cleanser'
+# permissions of files written by emitters, which have no template to take them from
+emitted_mode = 0o644
 # templates to use when creating templates for user
 manual_templates_dir = os.path.join(os.path.dirname(__file__), '..', 'templates')
 # settings for file that can be overwritten by settings user's file
@@ -31,14 +133,20 @@ class NoShebangError(Exception):
     '''Thrown when no '#!/...' is found in a script file'''
     pass
 
+class UnsafePathError(OSError):
+    '''Thrown when a path under a root that belongs to another user leads outside of it'''
+    pass
+
 ### UTILITY FUNCTIONS ###
-def open_readable(path: str) -> Optional[IO[AnyStr]]:
+def open_readable(path: str, mode: str = 'r') -> Optional[IO[AnyStr]]:
     '''open a file for reading, if it exists
 
     Parameters
     ----------
     path : str
         file path
+    mode : str, optional
+        mode to open the file in (default is 'r')
 
     Returns
     -------
@@ -46,7 +154,7 @@ def open_readable(path: str) -> Optional[IO[AnyStr]]:
         object with read() method; None if file doesn't exist
     '''
     try:
-        return open(path, 'r')
+        return open(path, mode)
     except FileNotFoundError:
         return None
 
@@ -86,12 +194,664 @@ def get_shebang(path: str) -> str:
         raise NoShebangError('shebang not in first line of script file')
 
 
+def count(path: str, *calls: str):
+    '''records filesystem calls made for path, if debug is True
+
+    only called by the wrappers below, as the calls are made, so the counts
+    are of calls that actually happened
+
+    Parameters
+    ----------
+    path : str
+        file path relative to $HOME
+    *calls : str
+        name of each call (e.g. 'open', 'stat')
+    '''
+    if debug:
+        syscalls[path].update(calls)
+
+
+def counted(path: str, call: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    '''makes a filesystem call for path, counting it under the call's name (e.g. 'stat' for os.stat)
+
+    Parameters
+    ----------
+    path : str
+        file path relative to $HOME that the call is made for
+    call : Callable[..., T]
+        e.g. os.stat or os.replace
+    *args : Any
+        arguments of call
+    **kwargs : Any
+        keyword arguments of call
+
+    Returns
+    -------
+    T
+        what call returned
+    '''
+    count(path, call.__name__)
+    return call(*args, **kwargs)
+
+
+class CountedFileIO(io.FileIO):
+    '''raw file that counts each read and write it makes (see count)'''
+    def __init__(self, path: str, file: Union[str, int], mode: str = 'r', opener: Optional[Callable[[str, int], int]] = None):
+        super().__init__(file, mode, opener=opener)
+        self.path = path
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self.readall()
+        count(self.path, 'read')
+        return super().read(size)
+
+    def readall(self) -> bytes:
+        chunks = []
+        while chunk := self.read(io.DEFAULT_BUFFER_SIZE):
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, buffer: Any) -> Optional[int]:
+        count(self.path, 'read')
+        return super().readinto(buffer)
+
+    def write(self, data: Any) -> Optional[int]:
+        count(self.path, 'write')
+        return super().write(data)
+
+
+def counted_open(
+        path: str,
+        file: Union[str, int],
+        mode: str = 'r',
+        buffering: int = -1,
+        opener: Optional[Callable[[str, int], int]] = None
+) -> IO:
+    '''opens file like open, counting the open and every read and write it then makes, if debug is True
+
+    Parameters
+    ----------
+    path : str
+        file path relative to $HOME that file is opened for
+    file : Union[str, int]
+        file to open, or a file descriptor that is already open (whose open
+        isn't counted again)
+    mode : str, optional
+        'r', 'w', 'a' or 'x', optionally with 'b' (default is 'r')
+    buffering : int, optional
+        buffer size (default is -1, meaning io.DEFAULT_BUFFER_SIZE)
+    opener : Callable[[str, int], int], optional
+        opens file with the given flags, as for open (default is None)
+
+    Returns
+    -------
+    IO
+        the open file
+    '''
+    if not debug:
+        return open(file, mode, buffering, opener=opener)
+
+    if isinstance(file, str):
+        count(path, 'open')
+    raw_mode = mode.replace('b', '').replace('t', '')
+    raw = CountedFileIO(path, file, raw_mode, opener)
+    size = buffering if buffering > 0 else io.DEFAULT_BUFFER_SIZE
+    buffered = io.BufferedReader(raw, size) if raw_mode == 'r' else io.BufferedWriter(raw, size)
+    return buffered if 'b' in mode else io.TextIOWrapper(buffered)
+
+
+def template_source(name: str) -> tuple[str, int]:
+    '''shebang and permissions of a template
+
+    reuses what the loader saw when it last loaded the template, if env has a TemplateLoader
+
+    Parameters
+    ----------
+    name : str
+        template name (path relative to {config.templates_dir})
+
+    Returns
+    -------
+    tuple[str, int]
+        shebang (empty string if there is none) and permissions of the template
+    '''
+    if isinstance(env.loader, TemplateLoader) and name in env.loader.sources:
+        return env.loader.sources[name]
+
+    path = os.path.join(config.templates_dir, name)
+    try:
+        shebang = get_shebang(path)
+    except NoShebangError:
+        shebang = ''
+
+    return shebang, os.stat(path).st_mode
+
+
+def is_binary(path: str) -> bool:
+    '''whether file at path looks like a binary file (i.e. has a NUL byte near the start), like git decides it
+
+    Parameters
+    ----------
+    path : str
+        file path
+
+    Returns
+    -------
+    bool
+        True if the file is binary, False if it is text or doesn't exist
+    '''
+    try:
+        with open(path, 'rb') as f:
+            return b'\0' in f.read(binary_check_size)
+    except FileNotFoundError:
+        return False
+
+
+def fingerprint(path: str) -> Optional[list[int]]:
+    '''mtime and size of file at path; None if it doesn't exist'''
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
 def remove_j2(path: str):
     '''removes .j2 extension from filepath'''
     return path[:-3] if path[-3:] == '.j2' else path
 
 
+def has_signature(path: str) -> bool:
+    '''whether file at path is templated
+
+    Parameters
+    ----------
+    path : str
+        file path
+
+    Returns
+    -------
+    bool
+        True if file contains templated signature or doesn't exist, False otherwise
+    '''
+    try:
+        with open(path, 'r') as f:
+            return templated_signature in f.readline() + f.readline()
+    except FileNotFoundError:
+        # files that don't exist are considered templated
+        return True
+
+
+def is_unchanged(
+        path: str,
+        staged: str,
+        staged_stat: os.stat_result,
+        destination: str,
+        current: os.stat_result,
+        dir_fd: Optional[int] = None
+) -> bool:
+    '''whether destination already has the content and permissions of staged
+
+    Parameters
+    ----------
+    path : str
+        path the files are counted under (see count)
+    staged : str
+        path of staged file
+    staged_stat : os.stat_result
+        stat of staged file
+    destination : str
+        path of destination file
+    current : os.stat_result
+        stat of destination file
+    dir_fd : int, optional
+        directory that staged and destination are names in; they are then
+        opened without following symlinks (default is None, meaning they are
+        paths)
+
+    Returns
+    -------
+    bool
+        True if the files are identical
+    '''
+    if staged_stat.st_size != current.st_size or staged_stat.st_mode != current.st_mode:
+        return False
+
+    opener = (lambda name, flags: os.open(name, flags | os.O_NOFOLLOW, dir_fd=dir_fd)) if dir_fd is not None else None
+    with counted_open(path, staged, 'rb', opener=opener) as new, counted_open(path, destination, 'rb', opener=opener) as old:
+        while True:
+            new_chunk, old_chunk = new.read(write_buffer_size), old.read(write_buffer_size)
+            if new_chunk != old_chunk:
+                return False
+            if not new_chunk:
+                return True
+
+
+def existing_ancestor(path: str) -> str:
+    '''closest directory containing path (or path itself) that exists'''
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def copy_at(source: str, destination: str, dir_fd: int):
+    '''copies source to destination (both names in dir_fd) with its permissions, without following symlinks'''
+    with open(source, 'rb', opener=lambda name, flags: os.open(name, flags | os.O_NOFOLLOW, dir_fd=dir_fd)) as s:
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW
+        with open(os.open(destination, flags, 0o600, dir_fd=dir_fd), 'wb') as d:
+            shutil.copyfileobj(s, d, write_buffer_size)
+            os.fchmod(d.fileno(), stat.S_IMODE(os.fstat(s.fileno()).st_mode))
+
+
+def write_rendered(out_file: IO[str], chunks: Iterator[str]):
+    '''writes the output of a streamed template to out_file
+
+    rendering and writing are interleaved chunk by chunk, so they are timed
+    separately here, as the 'render' and 'write' stages
+
+    Parameters
+    ----------
+    out_file : IO[str]
+        file to write to
+    chunks : Iterator[str]
+        output of the template, rendered as it is iterated
+    '''
+    if not metrics.enabled:
+        out_file.writelines(chunks)
+        return
+
+    rendering = writing = 0.0
+    start = time.perf_counter()
+    try:
+        for chunk in chunks:
+            rendered = time.perf_counter()
+            out_file.write(chunk)
+            written = time.perf_counter()
+            rendering += rendered - start
+            writing += written - rendered
+            start = written
+    finally:
+        metrics.record('render', rendering + time.perf_counter() - start)
+        metrics.record('write', writing)
+
 ### CLASSES ###
+@dataclass
+class Transaction:
+    '''
+    set of files that are written to a staging area and then moved into place all at once
+
+    files are staged in a hidden directory under root, so that committing them
+    is just a rename; destinations on another filesystem are staged right next
+    to the destination instead
+
+    a root that belongs to another user (see owner) is confined: its owner
+    could swap any path under it for a symlink at any time, so nothing under
+    it is reached by path; every directory is opened from the root without
+    following symlinks, files are staged right next to their destination,
+    written through the descriptor they were created with and moved by name
+    within their directory, and a symlink that leads outside of the root is
+    refused with an UnsafePathError
+
+    Attributes
+    ----------
+    root : str
+        directory that staged paths are relative to (e.g. $HOME)
+    staged : dict[str, str]
+        destination path for each staged file
+    paths : dict[str, str]
+        path relative to root for each staged file
+    changed : list[str]
+        paths relative to root whose content was changed by the commit
+    owner : tuple[int, int], optional
+        uid and gid to give written files and created directories (default is
+        None, meaning they are owned by the current user); if given, the
+        transaction is confined
+    keep_backups : bool, optional
+        back up the files the commit replaces (default is True); transitions
+        turn it off for their intermediate frames, and files of confined
+        roots are never backed up, since they aren't the current user's
+    '''
+    root: str
+    staged: dict[str, str] = field(default_factory=dict)
+    paths: dict[str, str] = field(default_factory=dict)
+    changed: list[str] = field(default_factory=list)
+    owner: Optional[tuple[int, int]] = None
+    keep_backups: bool = True
+
+    def __post_init__(self):
+        # stat of each staged file, recorded when it was written
+        self.stats: dict[str, os.stat_result] = {}
+        # destination directories that are known to exist
+        self.made_dirs: set[str] = set()
+        # directory fd, staged file name and destination name of each file
+        # staged in a confined root
+        self.locations: dict[str, tuple[int, str, str]] = {}
+        # files staged in a confined root, open until they are written
+        self.fds: dict[str, int] = {}
+
+        if self.confined:
+            self.staging_dir = ''
+            self.real_root = os.path.realpath(self.root)
+            # fd of each directory (relative to the real root) opened so far
+            self.dir_fds = {'': os.open(self.real_root, os.O_RDONLY | os.O_DIRECTORY)}
+            return
+
+        self.staging_dir = tempfile.mkdtemp(prefix='.pclean-staging-', dir=self.root)
+        # device of each destination directory, so each is only looked up once
+        self.devices = {self.staging_dir: os.stat(self.staging_dir).st_dev}
+
+    @property
+    def confined(self) -> bool:
+        '''whether root belongs to another user'''
+        return self.owner is not None
+
+    def __enter__(self) -> Transaction:
+        return self
+
+    def __exit__(self, *exc_info):
+        '''discards whatever hasn't been committed'''
+        for fd in self.fds.values():
+            os.close(fd)
+
+        for staged in self.staged:
+            dir_fd, name, _ = self.location(staged)
+            try:
+                os.remove(name, dir_fd=dir_fd)
+            except FileNotFoundError:
+                pass
+
+        if self.confined:
+            for fd in self.dir_fds.values():
+                os.close(fd)
+        else:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def location(self, staged: str) -> tuple[Optional[int], str, str]:
+        '''directory fd (None for paths), staged file name and destination name of a staged file'''
+        return self.locations.get(staged, (None, staged, self.staged[staged]))
+
+    def makedirs(self, directory: str, path: str = ''):
+        '''creates directory and its missing parents, giving them to owner
+
+        Parameters
+        ----------
+        directory : str
+            directory to create
+        path : str, optional
+            path (relative to root) the directory is created for, that the
+            calls are counted under (default is '')
+        '''
+        missing = []
+        parent = directory
+        while not os.path.isdir(parent):
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+
+        for d in reversed(missing):
+            try:
+                counted(path, os.mkdir, d)
+            except FileExistsError:
+                # created by another transaction in the meantime
+                pass
+            if self.owner:
+                counted(path, os.chown, d, *self.owner)
+
+        self.made_dirs.add(directory)
+
+    def open_dir(self, directory: str, path: str = '') -> int:
+        '''opens a directory of a confined root, creating it and its missing parents for owner
+
+        each component is opened from its parent without following symlinks,
+        so the directory is under root whatever root's owner does meanwhile
+
+        Parameters
+        ----------
+        directory : str
+            directory relative to the real path of root
+        path : str, optional
+            path (relative to root) the directory is opened for, that the
+            calls are counted under (default is '')
+
+        Returns
+        -------
+        int
+            fd of the directory, kept open until the transaction exits
+
+        Raises
+        ------
+        UnsafePathError
+            if a component of directory is a symlink
+        '''
+        if directory in self.dir_fds:
+            return self.dir_fds[directory]
+
+        parent = self.open_dir(os.path.dirname(directory), path)
+        name = os.path.basename(directory)
+        try:
+            counted(path, os.mkdir, name, dir_fd=parent)
+            counted(path, os.chown, name, *self.owner, dir_fd=parent, follow_symlinks=False)
+        except FileExistsError:
+            pass
+
+        try:
+            fd = counted(path, os.open, name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent)
+        except OSError as e:
+            if e.errno == errno.ELOOP:
+                raise UnsafePathError(f"'{os.path.join(self.root, directory)}' is a symlink")
+            raise
+
+        self.dir_fds[directory] = fd
+        return fd
+
+    def device(self, directory: str) -> int:
+        '''device that directory is (or would be created) on'''
+        if directory not in self.devices:
+            self.devices[directory] = os.stat(existing_ancestor(directory)).st_dev
+        return self.devices[directory]
+
+    def stage(self, path: str) -> str:
+        '''reserves a staging file for path
+
+        Parameters
+        ----------
+        path : str
+            destination path, relative to root
+
+        Returns
+        -------
+        str
+            path to write the staged content to; for confined roots, write it
+            with create or copy_from instead, which use the descriptor the file
+            was created with
+
+        Raises
+        ------
+        UnsafePathError
+            if root is confined and path leads outside of it
+        '''
+        if self.confined:
+            return self.stage_confined(path)
+
+        destination = os.path.join(self.root, path)
+        try:
+            if stat.S_ISLNK(counted(path, os.lstat, destination).st_mode):
+                # write through symlinks (e.g. dotfiles managed by stow) rather than replacing them
+                destination = counted(path, os.path.realpath, destination)
+        except FileNotFoundError:
+            pass
+
+        directory = os.path.dirname(destination)
+        if self.device(directory) == self.devices[self.staging_dir]:
+            staged = os.path.join(self.staging_dir, str(len(self.staged)))
+        else:
+            self.makedirs(directory, path)
+            fd, staged = counted(path, tempfile.mkstemp, prefix=f'.{os.path.basename(destination)}.', suffix='.pclean', dir=directory)
+            os.close(fd)
+
+        self.staged[staged] = destination
+        self.paths[staged] = path
+        return staged
+
+    def stage_confined(self, path: str) -> str:
+        '''reserves a staging file for path in a confined root, next to its destination (see stage)'''
+        # symlinks are still written through, as long as they stay under root
+        destination = counted(path, os.path.realpath, os.path.join(self.real_root, path))
+        relative = os.path.relpath(destination, self.real_root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            raise UnsafePathError(f"'{os.path.join(self.root, path)}' leads outside of {self.root}, to {destination}")
+
+        dir_fd = self.open_dir(os.path.dirname(relative), path)
+        name = f'.{os.path.basename(relative)}.{uuid.uuid4().hex[:8]}.pclean'
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW
+        fd = counted(path, os.open, name, flags, 0o600, dir_fd=dir_fd)
+
+        staged = os.path.join(os.path.dirname(destination), name)
+        self.fds[staged] = fd
+        self.locations[staged] = (dir_fd, name, os.path.basename(relative))
+        self.staged[staged] = destination
+        self.paths[staged] = path
+        return staged
+
+    def open_staged(self, path: str, staged: str, mode: str) -> IO:
+        '''opens a staged file for writing, through the descriptor it was created with if it has one'''
+        return counted_open(path, self.fds.pop(staged, staged), mode, buffering=write_buffer_size)
+
+    @contextmanager
+    def create(self, path: str, mode: int) -> Iterator[IO[str]]:
+        '''opens a new staging file for path
+
+        Parameters
+        ----------
+        path : str
+            destination path, relative to root
+        mode : int
+            permissions of the file
+
+        Yields
+        ------
+        IO[str]
+            buffered file to write the staged content to
+        '''
+        staged = self.stage(path)
+        with self.open_staged(path, staged, 'w') as f:
+            yield f
+            with metrics.span('write'):
+                f.flush()
+            with metrics.span('chmod'):
+                counted(path, os.fchmod, f.fileno(), mode)
+                if self.owner:
+                    counted(path, os.fchown, f.fileno(), *self.owner)
+            self.stats[staged] = counted(path, os.fstat, f.fileno())
+
+        metrics.add('bytes written', self.stats[staged].st_size)
+
+    def copy_from(self, transaction: Transaction):
+        '''stages a copy of everything staged in another transaction
+
+        lets output that was rendered once be deployed to several roots
+
+        Parameters
+        ----------
+        transaction : Transaction
+            transaction whose staged files are copied; it mustn't be confined
+        '''
+        for staged, path in transaction.paths.items():
+            copy = self.stage(path)
+            with open(staged, 'rb') as source, self.open_staged(path, copy, 'wb') as f:
+                counted(path, shutil.copyfileobj, source, f, write_buffer_size)
+                f.flush()
+                counted(path, os.fchmod, f.fileno(), stat.S_IMODE((transaction.stats.get(staged) or os.fstat(source.fileno())).st_mode))
+                if self.owner:
+                    counted(path, os.fchown, f.fileno(), *self.owner)
+                self.stats[copy] = counted(path, os.fstat, f.fileno())
+
+    def commit(self) -> list[str]:
+        '''moves every staged file into place, backing up the destinations it replaces (see keep_backups)
+
+        destinations whose content and permissions wouldn't change are left
+        untouched; if any move fails, the destinations that were already
+        replaced are restored
+
+        Returns
+        -------
+        list[str]
+            paths relative to root whose content changed
+
+        Raises
+        ------
+        UnsafePathError
+            if root is confined and a destination was replaced by a symlink
+            since it was staged
+        '''
+        # (path, directory fd, destination, hard link to its previous version) for each replaced destination
+        committed = []
+
+        try:
+            for staged, destination in self.staged.items():
+                path = self.paths[staged]
+                dir_fd, staged_name, name = self.location(staged)
+                staged_stat = self.stats.get(staged) or os.stat(staged_name, dir_fd=dir_fd)
+
+                try:
+                    current = counted(path, os.stat, name, dir_fd=dir_fd, follow_symlinks=not self.confined)
+                except FileNotFoundError:
+                    current = None
+
+                previous = None
+                if current and self.confined:
+                    if stat.S_ISLNK(current.st_mode):
+                        raise UnsafePathError(f"'{destination}' was replaced by a symlink")
+                    # only compare with files of the owner, which may be hard links to anything
+                    comparable = stat.S_ISREG(current.st_mode) and current.st_uid == self.owner[0]
+                    if comparable and is_unchanged(path, staged_name, staged_stat, name, current, dir_fd):
+                        metrics.add('files unchanged')
+                        continue
+
+                    previous = staged_name + '.previous'
+                    try:
+                        counted(path, os.link, name, previous, src_dir_fd=dir_fd, dst_dir_fd=dir_fd, follow_symlinks=False)
+                    except OSError:
+                        # filesystem without hard links
+                        counted(path, copy_at, name, previous, dir_fd)
+                elif current:
+                    if is_unchanged(path, staged, staged_stat, destination, current):
+                        metrics.add('files unchanged')
+                        continue
+
+                    if self.keep_backups:
+                        # keep the file being replaced in the backup store
+                        with metrics.span('backup'):
+                            counted(path, backup.store, destination)
+
+                    previous = staged + '.previous'
+                    try:
+                        counted(path, os.link, destination, previous)
+                    except OSError:
+                        # filesystem without hard links
+                        counted(path, shutil.copy2, destination, previous)
+                elif not self.confined and os.path.dirname(destination) not in self.made_dirs:
+                    self.makedirs(os.path.dirname(destination), path)
+
+                with metrics.span('commit'):
+                    counted(path, os.replace, staged_name, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+                committed.append((path, dir_fd, name, previous))
+                self.changed.append(path)
+        except BaseException:
+            for _, dir_fd, name, previous in reversed(committed):
+                if previous:
+                    os.replace(previous, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+                else:
+                    os.remove(name, dir_fd=dir_fd)
+            raise
+
+        for path, dir_fd, _, previous in committed:
+            if previous:
+                counted(path, os.remove, previous, dir_fd=dir_fd)
+
+        return self.changed
+
+
 @dataclass
 class Template(ABC):
     '''abstract class for template
@@ -104,18 +864,39 @@ class Template(ABC):
     path: str
 
     @abstractmethod
-    def create(self):
-        '''create a template and save it to {config.templates_dir}'''
+    def create(self, manifest: Optional[dict[str, Any]] = None) -> Counter[str]:
+        '''create a template and save it to {config.templates_dir}
+
+        Parameters
+        ----------
+        manifest : dict[str, Any], optional
+            fingerprints of the inputs each template was last created from;
+            templates whose inputs haven't changed are skipped (default is
+            None, meaning templates are always created)
+
+        Returns
+        -------
+        Counter[str]
+            number of templates that were 'created', 'unchanged' or skipped for being 'binary'
+        '''
+        pass
+
+    @abstractmethod
+    def files(self) -> list[TemplateFile]:
+        '''all TemplateFiles this template consists of'''
         pass
 
     @abstractmethod
-    def template(self, template_theme: theme.Theme):
+    def template(self, template_theme: theme.Theme, transaction: Optional[Transaction] = None):
         '''populate tempate with variable values and save to $HOME
 
         Parameters
         ----------
         template_theme : theme.Theme
             theme that provides template variables
+        transaction : Transaction, optional
+            transaction to stage the output in (default is None, meaning the
+            output is committed on its own)
         '''
         pass
 
@@ -153,72 +934,194 @@ class TemplateFile(Template):
         return signature + '\n'
 
 
-    def create(self):
-        '''create a template based on current configuration and save it to {config.templates_dir}'''
+    def create(self, manifest: Optional[dict[str, Any]] = None) -> Counter[str]:
+        '''create a template based on current configuration and save it to {config.templates_dir}
+
+        Parameters
+        ----------
+        manifest : dict[str, Any], optional
+            fingerprints of the inputs each template was last created from;
+            the template is skipped if its inputs haven't changed (default is
+            None, meaning the template is always created)
+
+        Returns
+        -------
+        Counter[str]
+            whether the template was 'created', 'unchanged' or skipped for being 'binary'
+        '''
         template_file_name = os.path.join(config.templates_dir, self.path + '.j2')
+        sources = [
+            # file whose elements will be overwritten by user's current configuration
+            os.path.join(default_templates, self.path + '.j2'),
+            # current configuration
+            os.path.join(os.environ['HOME'], self.path),
+            # file whose elements will overwrite user's current configuration
+            os.path.join(overwrite_templates, self.path + '.j2')
+        ]
+
+        if is_binary(sources[1]):
+            # jinja can't render binary files, so there is no point in templating them
+            return Counter(['binary'])
+
+        fingerprints = [fingerprint(source) for source in sources]
+        if manifest is not None and manifest.get(self.path) == fingerprints and os.path.exists(template_file_name):
+            return Counter(['unchanged'])
+
         os.makedirs(os.path.dirname(template_file_name), exist_ok=True)
 
-        with open(template_file_name, 'w') as template_file:
-            for path in [
-                    # file whose elements will be overwritten by user's current configuration
-                    (default_templates, self.path + '.j2'),
-                    # current configuration
-                    (os.environ['HOME'], self.path),
-                    # file whose elements will overwrite user's current configuration
-                    (overwrite_templates, self.path + '.j2')
-            ]:
-                readable = open_readable(os.path.join(*path))
+        with open(template_file_name, 'wb') as template_file:
+            for source in sources:
+                readable = open_readable(source, 'rb')
                 if readable:
-                    template_file.write(readable.read())
+                    shutil.copyfileobj(readable, template_file, write_buffer_size)
 
                 close_readable(readable)
 
+        if manifest is not None:
+            manifest[self.path] = fingerprints
 
-    def is_templated(self) -> bool:
-        '''whether file at $HOME/{self.path} is templated
+        return Counter(['created'])
+
+    def files(self) -> list[TemplateFile]:
+        '''the template itself'''
+        return [self]
+
+
+    def is_templated(self, root: Optional[str] = None) -> bool:
+        '''whether file at {root}/{self.path} is templated
+
+        Parameters
+        ----------
+        root : str, optional
+            directory the file is relative to (default is None, meaning $HOME)
 
         Returns
         -------
         bool
             True if file contains templated signature, False otherwise
         '''
-        try:
-            with open(os.path.join(os.environ['HOME'], self.path), 'r') as f:
-                return templated_signature in f.readline() + f.readline()
-        except FileNotFoundError:
-            # files that don't exist are considered templated
-            return True
+        return has_signature(os.path.join(root if root else os.environ['HOME'], self.path))
+
+
+    def render(self, template_theme: theme.Theme) -> tuple[str, int]:
+        '''populate template with variable values in memory, without writing anything
 
+        Parameters
+        ----------
+        template_theme : theme.Theme
+            theme that provides template variables
 
-    def template(self, template_theme: theme.Theme):
+        Returns
+        -------
+        tuple[str, int]
+            the output and its permissions
+        '''
+        with metrics.span('compile'):
+            tmpl = env.get_template(self.path + '.j2')
+        shebang, mode = template_source(self.path + '.j2')
+        variables = template_theme.export()
+        with metrics.span('render'):
+            return shebang + self.generate_signature() + tmpl.render(variables), mode
+
+
+    def template(self, template_theme: theme.Theme, transaction: Optional[Transaction] = None):
         '''populate tempate with variable values and save to $HOME
 
         Parameters
         ----------
         template_theme : theme.Theme
             theme that provides template variables
+        transaction : Transaction, optional
+            transaction to stage the output in (default is None, meaning the
+            output is committed on its own)
         '''
-        destination = os.path.join(os.environ['HOME'], self.path)
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with staged(transaction) as transaction:
+            with metrics.span('compile'):
+                tmpl = env.get_template(self.path + '.j2')
+            # the output gets the shebang and permissions of the template
+            shebang, mode = template_source(self.path + '.j2')
+            variables = template_theme.export()
+
+            with transaction.create(self.path, mode) as out_file:
+                out_file.write(shebang)
+                out_file.write(self.generate_signature())
+                # stream the output straight into the staged file rather than
+                # building it up in memory; if rendering fails partway, the
+                # transaction throws the staged file away
+                write_rendered(out_file, tmpl.generate(variables))
 
-        output = env.get_template(self.path + '.j2').render(template_theme.export())
 
-        if not self.is_templated():
-            # backup user's current file, unless it was generated by palette-cleanser
-            shutil.move(destination, destination + '.backup')
+@dataclass
+class EmittedFile(TemplateFile):
+    '''
+    file written by a built-in emitter (see palettecleanser.emitters) instead of a template
 
-        with open(destination, 'w') as out_file:
-            try:
-                # write the shebang if template is a script file (e.g. .sh)
-                out_file.write(get_shebang(os.path.join(config.templates_dir, self.path + '.j2')))
-            except NoShebangError:
-                pass
+    the output gets the templated signature, in the emitter's comment syntax,
+    like any templated file; emitted files have no template, so no shebang,
+    and get emitted_mode permissions
+
+    Attributes
+    ----------
+    path : str
+        relative filepath from home directory
+    emitter : str
+        name of the emitter
+    '''
+    emitter: str
+
+    def __post_init__(self):
+        # fail on unknown emitters when the managed files are read, not halfway through a deploy
+        emitters.get(self.emitter)
+
+    def generate_signature(self) -> str:
+        '''returns comment to put at top of file to indicate it was templated by
+        palette-cleanser; empty for formats without comments, whose emitters
+        embed the signature themselves'''
+        comment = emitters.get(self.emitter).comment
+        return comment.format(templated_signature) + '\n' if comment else ''
+
+    def create(self, manifest: Optional[dict[str, Any]] = None) -> Counter[str]:
+        '''nothing to create, since the file is emitted
+
+        Returns
+        -------
+        Counter[str]
+            the file was 'emitted'
+        '''
+        return Counter(['emitted'])
+
+    def render(self, template_theme: theme.Theme) -> tuple[str, int]:
+        '''emit the file in memory, without writing anything
+
+        Parameters
+        ----------
+        template_theme : theme.Theme
+            theme that provides the colors
+
+        Returns
+        -------
+        tuple[str, int]
+            the output and its permissions
+        '''
+        with metrics.span('emit'):
+            return self.generate_signature() + emitters.get(self.emitter).emit(emitters.scheme(template_theme)), emitted_mode
 
-            out_file.write(self.generate_signature())
-            out_file.write(output)
+    def template(self, template_theme: theme.Theme, transaction: Optional[Transaction] = None):
+        '''emit the file and save it to $HOME
 
-        # change file permissions to match the template
-        os.chmod(destination, os.stat(os.path.join(config.templates_dir, self.path + '.j2')).st_mode)
+        Parameters
+        ----------
+        template_theme : theme.Theme
+            theme that provides the colors
+        transaction : Transaction, optional
+            transaction to stage the output in (default is None, meaning the
+            output is committed on its own)
+        '''
+        with staged(transaction) as transaction:
+            output, mode = self.render(template_theme)
+            with transaction.create(self.path, mode) as out_file:
+                with metrics.span('write'):
+                    out_file.write(output)
 
 
 @dataclass
@@ -234,27 +1137,71 @@ class TemplateDirectory(Template):
     '''
     children: list[Template]
 
-    def create(self):
-        '''create a template and save it to {config.templates_dir} for each child template'''
-        for child in self.children:
-            child.create()
+    def create(self, manifest: Optional[dict[str, Any]] = None) -> Counter[str]:
+        '''create a template and save it to {config.templates_dir} for each child template
+
+        Parameters
+        ----------
+        manifest : dict[str, Any], optional
+            fingerprints of the inputs each template was last created from;
+            templates whose inputs haven't changed are skipped (default is
+            None, meaning templates are always created)
+
+        Returns
+        -------
+        Counter[str]
+            number of templates that were 'created', 'unchanged' or skipped for being 'binary'
+        '''
+        return sum((child.create(manifest) for child in self.children), Counter())
 
-    def template(self, template_theme: theme.Theme):
+    def files(self) -> list[TemplateFile]:
+        '''all TemplateFiles under the directory'''
+        return [f for child in self.children for f in child.files()]
+
+    def template(self, template_theme: theme.Theme, transaction: Optional[Transaction] = None):
         '''populate template with variable values and save to $HOME for each child template
 
         Parameters
         ----------
         template_theme : theme.Theme
             theme that provides template variables
+        transaction : Transaction, optional
+            transaction to stage the output in (default is None, meaning the
+            output of all children is committed together)
         '''
-        for child in self.children:
-            child.template(template_theme)
+        with staged(transaction) as transaction:
+            for child in self.children:
+                child.template(template_theme, transaction)
 
 
 
 ### FUNCTIONS ###
+@contextmanager
+def staged(transaction: Optional[Transaction] = None) -> Iterator[Transaction]:
+    '''provides a transaction to stage template output in
+
+    Parameters
+    ----------
+    transaction : Transaction, optional
+        transaction that is already open (default is None, meaning a new
+        transaction on $HOME is opened and committed when the context exits
+        without error)
+
+    Yields
+    ------
+    Transaction
+        transaction to stage template output in
+    '''
+    if transaction:
+        yield transaction
+        return
+
+    with Transaction(os.environ['HOME']) as transaction:
+        yield transaction
+        transaction.commit()
+
 
-def from_path(root: str, path: str, ignored_files: list[str] = []) -> Template:
+def from_path(root: str, path: str, ignored_files: list[str] = [], snapshot: Optional[tree.Snapshot] = None) -> Template:
     '''create Template from path that exists under specified root
 
     Parameters
@@ -264,34 +1211,42 @@ def from_path(root: str, path: str, ignored_files: list[str] = []) -> Template:
     path : str
         file/directory path (relative to root)
     ignored_files : list[str], optional
-        subfiles/folders to exclude when creating a TemplateDirectory
+        gitignore-style patterns (relative to path) of subfiles/folders to
+        exclude when creating a TemplateDirectory
+    snapshot : tree.Snapshot, optional
+        directory listings to reuse (default is None, meaning every directory is listed)
 
     Returns
     -------
     Template
         template object corresponding to the provided file path
     '''
-    root_path = os.path.join(root, path)
-
-    if not os.path.isdir(root_path):
-        # base case: path is a file or doesn't exist
-
-        # peal off .j2 extension if we're getting the path from a template directory
+    ignored = tree.compile_patterns(tuple(ignored_files))
+    snapshot = snapshot if snapshot else tree.Snapshot()
+
+    def from_directory(relative_path: str) -> TemplateDirectory:
+        children = []
+        for name, is_dir in snapshot.listdir(os.path.join(root, path, relative_path)):
+            child = os.path.join(relative_path, remove_j2(name)) if relative_path else remove_j2(name)
+            if ignored and ignored.matches(child, is_dir):
+                continue
+
+            if is_dir:
+                children.append(from_directory(child))
+            else:
+                # peal off .j2 extension if we're getting the path from a template directory
+                children.append(TemplateFile(os.path.join(path, child)))
+
+        return TemplateDirectory(os.path.join(path, relative_path) if relative_path else path, children)
+
+    if not os.path.isdir(os.path.join(root, path)):
+        # path is a file or doesn't exist
         return TemplateFile(remove_j2(path))
 
-    # because we recurse down the file tree, peel off root folder of ignored_files for next call
-    next_ignored_files = ['/'.join(ignored_file.split('/')[1:]) for ignored_file in ignored_files]
-
-    # recursive case: path is a directory
-    return TemplateDirectory(
-        path,
-        [from_path(root, os.path.join(path, child), next_ignored_files)
-         for child in os.listdir(root_path)
-         if remove_j2(child) not in ignored_files]
-    )
+    return from_directory('')
 
 
-def from_paths(root: str, paths: list[Union(str, dict[str, Any])]) -> list[Template]:
+def from_paths(root: str, paths: list[Union(str, dict[str, Any])], snapshot: Optional[tree.Snapshot] = None) -> list[Template]:
     '''creates list of Templates from list of paths that exists under specified root
 
     Parameters
@@ -300,7 +1255,11 @@ def from_paths(root: str, paths: list[Union(str, dict[str, Any])]) -> list[Templ
         root directory under which path exists (e.g. $HOME)
     paths : list[Union(str, dict[str, Any])]
         file/directory paths (relative to root), where each path might be a
-        dictionary whose single value is an 'ignored_files' list
+        dictionary whose single value is a dictionary with an 'ignored_files'
+        list, or the name of the 'emitter' that writes the file (see
+        palettecleanser.emitters) instead of a template
+    snapshot : tree.Snapshot, optional
+        directory listings to reuse (default is None, meaning every directory is listed)
 
     Returns
     -------
@@ -312,30 +1271,113 @@ def from_paths(root: str, paths: list[Union(str, dict[str, Any])]) -> list[Templ
     for path in paths:
         if isinstance(path, Mapping):
             # list element is a singleton dictionary whose key is the file
-            # and value includes a list of ignored files
+            # and value includes a list of ignored files or an emitter
             for k, v in path.items():
-                ts.append(from_path(root, k, v['ignored_files']))
+                if 'emitter' in v:
+                    ts.append(EmittedFile(k, v['emitter']))
+                else:
+                    ts.append(from_path(root, k, v.get('ignored_files', []), snapshot))
         else:
             # list element is just a file name
-            ts.append(from_path(root, path))
+            ts.append(from_path(root, path, snapshot=snapshot))
 
     return ts
 
-def create_managed():
-    '''create templates for all listed managed files and save to {config.templates_dir}'''
-    for t in from_paths(os.environ['HOME'], config.get_config_settings()['managed_files']):
-        t.create()
 
-def template_managed(template_theme: theme.Theme):
+def from_managed_path(path: str) -> TemplateFile:
+    '''creates the Template for a single managed file
+
+    Parameters
+    ----------
+    path : str
+        file path (relative to $HOME)
+
+    Returns
+    -------
+    TemplateFile
+        an EmittedFile if the file is listed in the managed files with an
+        emitter, a TemplateFile otherwise
+    '''
+    try:
+        managed_files = config.get_config_settings().get('managed_files', [])
+    except FileNotFoundError:
+        managed_files = []
+
+    for managed in managed_files:
+        if isinstance(managed, Mapping) and isinstance(managed.get(path), Mapping) and 'emitter' in managed[path]:
+            return EmittedFile(path, managed[path]['emitter'])
+    return TemplateFile(path)
+
+def from_managed(root: str) -> list[Template]:
+    '''creates Templates for all listed managed files under root, reusing the persisted directory snapshot
+
+    Parameters
+    ----------
+    root : str
+        root directory under which managed files exist (e.g. $HOME)
+
+    Returns
+    -------
+    list[Template]
+        list of template objects corresponding to the managed files
+    '''
+    managed_files = config.get_config_settings()['managed_files']
+    with metrics.span('discover templates'):
+        snapshot = tree.load_snapshot()
+        ts = from_paths(root, managed_files, snapshot)
+        snapshot.save()
+    return ts
+
+def create_managed(jobs: Optional[int] = None) -> Counter[str]:
+    '''create templates for all listed managed files and save to {config.templates_dir}
+
+    templates are created across a pool of worker threads, and templates whose
+    inputs haven't changed since the last run are skipped
+
+    Parameters
+    ----------
+    jobs : int, optional
+        number of worker threads (default is None, meaning one per cpu)
+
+    Returns
+    -------
+    Counter[str]
+        number of templates that were 'created', 'unchanged' or skipped for
+        being 'binary' or 'emitted'
+    '''
+    manifest_path = os.path.join(config.cache_dir, 'create.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+
+    files = [f for t in from_managed(os.environ['HOME']) for f in t.files()]
+    with ThreadPoolExecutor(jobs) as pool:
+        statuses = sum(pool.map(lambda f: f.create(manifest), files), Counter())
+
+    os.makedirs(config.cache_dir, exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    return statuses
+
+def template_managed(template_theme: theme.Theme, transaction: Optional[Transaction] = None):
     '''populate all listed managed files with variable values from provided theme and write to $HOME
 
     Parameters
     ----------
     template_theme : theme.Theme
         theme that provides template variables
+    transaction : Transaction, optional
+        transaction to stage the output in (default is None, meaning the
+        output is committed once every managed file has been rendered)
     '''
-    for t in from_paths(config.templates_dir, config.get_config_settings()['managed_files']):
-        t.template(template_theme)
+    # render everything before touching $HOME, so a failing template leaves the previous theme intact
+    with staged(transaction) as transaction:
+        for t in from_managed(config.templates_dir):
+            t.template(template_theme, transaction)
 
     # for path in config.get_config_settings()['managed_files']:
     #     if isinstance(path, Mapping):
@@ -3,11 +3,12 @@ import yaml
 
 from . import palette as pal
 from . import config
+from . import metrics
+from . import catalog
 
 from tabulate import tabulate
 from collections import defaultdict
 from dataclasses import dataclass
-from functools import reduce
 from typing import Any, Optional
 
 ### EXCEPTIONS ###
@@ -65,21 +66,28 @@ class Theme:
         return vars(self)|{'palettes': self.get_palettes()}
 
 
-    def save(self):
+    def save(self, overwrite: bool = False):
         '''saves Theme to yml file at $XDG_CONFIG_HOME/palette-cleanser/themes/
 
         defaults to ~/.config/palette-cleanser/themes/
+
+        Parameters
+        ----------
+        overwrite : bool, optional
+            overwrite a saved theme of the same name without asking (default is
+            False, meaning the user is asked)
         '''
         if not os.path.exists(config.themes_dir):
             os.makedirs(config.themes_dir)
 
         path = os.path.join(config.themes_dir, f'{self.name}.yml')
 
-        if os.path.exists(path) and input(f'a theme for {self.name} already exists; overwrite? [y/N] ') not in ['y', 'Y', 'yes' 'Yes']:
+        if os.path.exists(path) and not overwrite and input(f'a theme for {self.name} already exists; overwrite? [y/N] ') not in ['y', 'Y', 'yes' 'Yes']:
             return
 
         with open(path, 'w') as f:
             yaml.dump(self, f)
+        catalog.record_theme(self)
 
     def table(self) -> dict[str, list[pal.Color]]:
         '''converts palette to data that can be tabulated
@@ -89,8 +97,7 @@ class Theme:
         dict[str, list[palette.Color]]
             set of columns where the headers are names of palattes and cells are colors
         '''
-        palette_tables = [p.table() for p in self.get_palettes()]
-        return reduce(lambda x, y: x|y, palette_tables)
+        return {k: v for p in self.get_palettes() for k, v in p.table().items()}
 
     def __str__(self):
         non_palettes_info = vars(self).copy()
@@ -106,7 +113,9 @@ def from_image(
         settings: Optional[dict[str, Any]] = None,
         light: bool = False,
         backend: str = 'wal',
-        saturate_percent: Optional[float] = None
+        saturate_percent: Optional[float] = None,
+        frame_stride: Optional[int] = None,
+        overwrite: bool = False
 ) -> Theme:
     '''generates a theme from an image
 
@@ -131,17 +140,30 @@ def from_image(
         https://github.com/dylanaraps/pywal/tree/master/pywal/backends) (default is 'wal')
     saturate_percent : float, optional
         amount to saturate colors by (saturate_percent=5 means 5%) (default is None)
+    frame_stride : int, optional
+        if passed, the image is an animation or video, and the palette is
+        extracted from every frame_stride-th frame (see
+        palettecleanser.palette.from_animation) (default is None)
+    overwrite : bool, optional
+        overwrite saved palettes of the same names without asking (default is
+        False, meaning the user is asked)
 
     Returns
     -------
     Theme
         new theme based off of provided image
     '''
-    main_palette = pal.from_image(image_path, name, light, backend, saturate_percent)
+    if frame_stride:
+        main_palette = pal.from_animation(image_path, name, light, backend, saturate_percent, frame_stride)
+    else:
+        main_palette = pal.from_image(image_path, name, light, backend, saturate_percent)
     dark_palette = main_palette.tone(35, False, name + "-dark")
     light_palette = main_palette.tone(20, True, name + "-light")
-    for p in [main_palette, dark_palette, light_palette]:
-        p.save()
+    if overwrite:
+        pal.save_all([main_palette, dark_palette, light_palette])
+    else:
+        for p in [main_palette, dark_palette, light_palette]:
+            p.save()
 
     return Theme(name, [name + tail for tail in ["", "-dark", "-light"]], image_path, settings if settings else {})
 
@@ -164,7 +186,13 @@ def from_config(name: str) -> Theme:
         if the theme doesn't exist
     '''
     try:
-        with open(os.path.join(config.themes_dir, f'{name}.yml')) as f:
-            return yaml.load(f, Loader=yaml.Loader)
+        with metrics.span('load theme'):
+            return config.load_yaml(os.path.join(config.themes_dir, f'{name}.yml'))
     except FileNotFoundError:
         raise ThemeNotFoundError(f'{name} theme doesn\'t exist')
+
+def names() -> list[str]:
+    '''names of every saved theme'''
+    if not os.path.isdir(config.themes_dir):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(config.themes_dir) if f.endswith('.yml'))
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+import re
+import time
+
+from . import colormath
+from . import config
+from . import deploy as dep
+from . import hooks
+from . import metrics
+from . import palette as pal
+from . import template
+from . import theme
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+### GLOBAL VARS ###
+# seconds per unit of a duration
+duration_units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+### CLASSES ###
+class Frame(theme.Theme):
+    '''theme whose palettes are interpolated in memory rather than saved'''
+    def __init__(self, base: theme.Theme, palettes: list[pal.Palette]):
+        super().__init__(base.name, [p.name for p in palettes], base.image_path, base.settings)
+        self.interpolated = palettes
+
+    def get_palettes(self) -> list[pal.Palette]:
+        '''the interpolated palettes'''
+        return self.interpolated
+
+    def export(self) -> dict[str, Any]:
+        '''converts frame to dictionary, as Theme.export does'''
+        exported = super().export()
+        del exported['interpolated']
+        return exported
+
+
+@dataclass
+class Transition:
+    '''
+    what a transition did
+
+    Attributes
+    ----------
+    files : list[str]
+        paths (relative to $HOME) of the files that were transitioned
+    shown : int
+        number of frames deployed
+    dropped : int
+        number of frames skipped because the previous ones ran late
+    slowest : float
+        seconds the slowest frame took to render, write and reload
+    elapsed : float
+        seconds the frames took, until the final deploy
+    deployment : deploy.Deployment
+        the final deploy of the destination theme, for every managed file
+    '''
+    files: list[str]
+    shown: int
+    dropped: int
+    slowest: float
+    elapsed: float
+    deployment: dep.Deployment
+
+
+### FUNCTIONS ###
+def parse_duration(duration: str) -> float:
+    '''seconds in a duration such as "2s", "500ms", "1.5m" or "3" (seconds)
+
+    Raises
+    ------
+    ValueError
+        if duration isn't a non-negative number followed by one of duration_units
+    '''
+    match = re.fullmatch(r'\s*(\d+(?:\.\d*)?|\.\d+)\s*([a-z]*)\s*', duration)
+    if not match or match.group(2) not in list(duration_units) + ['']:
+        raise ValueError(f"'{duration}' isn't a duration (e.g. 2s, 500ms or 1m)")
+    return float(match.group(1)) * duration_units[match.group(2) if match.group(2) else 's']
+
+def interpolate(start: list[pal.Palette], end: list[pal.Palette], steps: int) -> list[list[pal.Palette]]:
+    '''palettes stepping from one list of palettes to another
+
+    palettes are paired by position, and so are their colors; colors move in
+    a straight line through oklab, so lightness and hue change evenly, and all
+    colors of all frames are computed at once; palettes (or colors) that
+    only the end has are taken as they are
+
+    Parameters
+    ----------
+    start : list[Palette]
+        palettes to start from
+    end : list[Palette]
+        palettes to end at; the frames' palettes are named after them
+    steps : int
+        number of frames (at least 1)
+
+    Returns
+    -------
+    list[list[Palette]]
+        palettes of each frame; the last frame is end
+    '''
+    pairs = [(i, j) for i, (a, b) in enumerate(zip(start, end)) for j in range(min(len(a.colors), len(b.colors)))]
+
+    def lab(palettes: list[pal.Palette]) -> np.ndarray:
+        colors = [palettes[i].colors[j] for i, j in pairs]
+        return colormath.to_oklab(np.array([[c.red, c.green, c.blue] for c in colors]).reshape(-1, 3))
+
+    lab_start, lab_end = lab(start), lab(end)
+
+    t = (np.arange(1, steps + 1) / steps)[:, None, None]
+    frames = np.rint(colormath.from_oklab(lab_start + t * (lab_end - lab_start))).astype(int)
+
+    interpolated = []
+    for colors in frames[:-1]:
+        palettes = [pal.Palette(list(p.colors), p.name) for p in end]
+        for (i, j), c in zip(pairs, colors):
+            palettes[i].colors[j] = pal.Color(*map(int, c))
+        interpolated.append(palettes)
+    return interpolated + [end]
+
+def live_files(declared: list[hooks.Hook], paths: Optional[list[str]] = None) -> list[template.TemplateFile]:
+    '''managed files worth transitioning: those with a reload hook, whose
+    applications pick up the change while it happens
+
+    Parameters
+    ----------
+    declared : list[hooks.Hook]
+        reload hooks
+    paths : list[str], optional
+        transition these files (relative to $HOME) instead (default is None)
+
+    Returns
+    -------
+    list[template.TemplateFile]
+        the files
+    '''
+    if paths:
+        return [template.from_managed_path(path) for path in paths]
+
+    files = [f for t in template.from_managed(config.templates_dir) for f in t.files()]
+    return [f for f in files if any(h.is_triggered_by([f.path]) for h in declared)]
+
+def show(frame: theme.Theme, files: list[template.TemplateFile], declared: list[hooks.Hook], keep_backups: bool) -> list[str]:
+    '''renders a frame, writes the files whose output changed and runs their reload hooks
+
+    Returns
+    -------
+    list[str]
+        paths (relative to $HOME) whose content changed
+    '''
+    with template.Transaction(os.environ['HOME'], keep_backups=keep_backups) as transaction:
+        for f in files:
+            f.template(frame, transaction)
+        changed = transaction.commit()
+
+    with metrics.span('reload hooks'):
+        hooks.run(declared, changed)
+    return changed
+
+def transition(
+        start: theme.Theme,
+        end: theme.Theme,
+        duration: float,
+        fps: float,
+        paths: Optional[list[str]] = None
+) -> Transition:
+    '''gradually deploys one theme over another
+
+    every palette color is interpolated from start to end, and the frames are
+    deployed to the files of live reloading applications (see live_files) at
+    a steady rate; templates are only compiled once, only the files whose
+    output changed are written, and only their reload hooks run, so a frame
+    usually takes a few milliseconds; frames that are due by the time the
+    previous one is done are dropped (the last never is); the files replaced
+    by the first frame are backed up, but the frames in between aren't; end
+    is then deployed to every managed file, as deploy_theme does
+
+    Parameters
+    ----------
+    start : theme.Theme
+        theme to transition from (usually the one deployed)
+    end : theme.Theme
+        theme to transition to
+    duration : float
+        seconds the transition takes
+    fps : float
+        frames per second
+    paths : list[str], optional
+        transition these files (relative to $HOME) instead of those with
+        reload hooks (default is None)
+
+    Returns
+    -------
+    Transition
+        frames shown and dropped, and the final deploy
+    '''
+    declared = hooks.from_settings(dep.get_settings(), end.settings)
+    files = live_files(declared, paths)
+
+    count = max(1, round(duration * fps))
+    frames = [Frame(end, palettes) for palettes in interpolate(start.get_palettes(), end.get_palettes(), count)[:-1]] + [end]
+    interval = 1 / fps
+
+    shown, dropped, slowest = 0, 0, 0.0
+    began = time.perf_counter()
+    i = 0
+    while True:
+        frame_start = time.perf_counter()
+        with metrics.span('frame'):
+            show(frames[i], files, declared, keep_backups=(shown == 0))
+        shown += 1
+        slowest = max(slowest, time.perf_counter() - frame_start)
+        if i == count - 1:
+            break
+
+        # frame k is due interval * k seconds in; when the next one is already
+        # late, skip to the latest one that is due
+        due = int((time.perf_counter() - began) / interval)
+        following = min(count - 1, max(i + 1, due))
+        dropped += following - i - 1
+        wait = began + following * interval - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        i = following
+    metrics.add('frames dropped', dropped)
+    elapsed = time.perf_counter() - began
+
+    return Transition([f.path for f in files], shown, dropped, slowest, elapsed, dep.deploy_theme(end))
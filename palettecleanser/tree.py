@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+
+from . import config
+from . import metrics
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+
+
+### GLOBAL VARS ###
+# directory listings from previous runs
+snapshot_path = os.path.join(config.cache_dir, 'tree.json')
+# directories modified this recently (in seconds) aren't cached, since a
+# coarse-grained mtime might not change again when they are modified again
+racy_window = 2
+
+
+### CLASSES ###
+@dataclass
+class IgnorePatterns:
+    '''
+    compiled gitignore-style patterns
+
+    patterns are matched against paths relative to the managed directory (with
+    any .j2 extension removed); a pattern containing a slash is anchored to
+    the managed directory, otherwise it matches at any depth. "*", "?", "[...]"
+    and "**" work like in gitignore, a trailing slash only matches
+    directories, a leading "!" re-includes a previously ignored path and the
+    last matching pattern wins
+
+    Attributes
+    ----------
+    patterns : list[tuple[re.Pattern, bool, bool]]
+        regular expression, whether it is negated and whether it only matches directories
+    '''
+    patterns: list[tuple[re.Pattern, bool, bool]]
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def matches(self, path: str, is_dir: bool) -> bool:
+        '''whether path is ignored
+
+        Parameters
+        ----------
+        path : str
+            path relative to the managed directory
+        is_dir : bool
+            whether path is a directory
+
+        Returns
+        -------
+        bool
+            True if path is ignored
+        '''
+        ignored = False
+        for regex, negated, dir_only in self.patterns:
+            if (is_dir or not dir_only) and regex.match(path):
+                ignored = not negated
+        return ignored
+
+
+@dataclass
+class Snapshot:
+    '''
+    directory listings that are revalidated by directory mtimes instead of being listed again
+
+    Attributes
+    ----------
+    path : str, optional
+        file the snapshot is persisted to (default is None, meaning it isn't persisted)
+    listings : dict[str, tuple[int, list[tuple[str, bool]]]]
+        mtime and (name, is directory) entries of each directory
+    modified : bool
+        whether listings changed since the snapshot was loaded
+    '''
+    path: Optional[str] = None
+    listings: dict[str, tuple[int, list[tuple[str, bool]]]] = field(default_factory=dict)
+    modified: bool = False
+
+    def listdir(self, directory: str) -> list[tuple[str, bool]]:
+        '''lists a directory, reusing the snapshot if the directory's mtime hasn't changed
+
+        Parameters
+        ----------
+        directory : str
+            directory path
+
+        Returns
+        -------
+        list[tuple[str, bool]]
+            sorted name and whether it is a directory, for each entry
+        '''
+        mtime = os.stat(directory).st_mtime_ns
+        cached = self.listings.get(directory)
+        if cached and cached[0] == mtime:
+            metrics.add('tree cache hits')
+            return cached[1]
+
+        with os.scandir(directory) as it:
+            entries = sorted((entry.name, entry.is_dir()) for entry in it)
+
+        if mtime < (time.time() - racy_window) * 1e9:
+            self.listings[directory] = (mtime, entries)
+            self.modified = True
+
+        return entries
+
+    def save(self):
+        '''persists the snapshot, if it has a path and changed'''
+        if not self.path or not self.modified:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.listings, f)
+        os.replace(self.path + '.tmp', self.path)
+        self.modified = False
+
+
+### FUNCTIONS ###
+def translate(pattern: str) -> str:
+    '''translates the body of a gitignore-style glob to a regular expression'''
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            regex += '[' + ('^' + body[1:] if body[0] == '!' else body).replace('\\', '\\\\') + ']'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    return regex
+
+@lru_cache(maxsize=None)
+def compile_patterns(patterns: tuple[str, ...]) -> IgnorePatterns:
+    '''compiles gitignore-style patterns
+
+    Parameters
+    ----------
+    patterns : tuple[str, ...]
+        gitignore-style patterns; blank lines and lines starting with "#" are skipped
+
+    Returns
+    -------
+    IgnorePatterns
+        compiled patterns
+    '''
+    compiled = []
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern or pattern[0] == '#':
+            continue
+
+        negated = pattern[0] == '!'
+        pattern = pattern.lstrip('!')
+        dir_only = pattern[-1] == '/'
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        regex = ('' if anchored else '(?:.*/)?') + translate(pattern) + '$'
+        compiled.append((re.compile(regex), negated, dir_only))
+
+    return IgnorePatterns(compiled)
+
+def load_snapshot(path: str = None) -> Snapshot:
+    '''loads a persisted snapshot
+
+    Parameters
+    ----------
+    path : str, optional
+        file the snapshot is persisted to (default is snapshot_path)
+
+    Returns
+    -------
+    Snapshot
+        persisted snapshot; empty if there is none or it is unreadable
+    '''
+    path = path if path else snapshot_path
+    try:
+        with open(path) as f:
+            listings = json.load(f)
+    except (FileNotFoundError, ValueError):
+        listings = {}
+
+    return Snapshot(path, {d: (mtime, [tuple(e) for e in entries]) for d, (mtime, entries) in listings.items()})
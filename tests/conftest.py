@@ -0,0 +1,38 @@
+from palettecleanser import backup
+from palettecleanser import catalog
+from palettecleanser import config
+from palettecleanser import template
+import jinja2 as j2
+import pytest
+
+@pytest.fixture(autouse=True)
+def tmp_backups(monkeypatch, tmp_path):
+    '''keeps files replaced by tests out of the user's backup store'''
+    monkeypatch.setattr(backup, 'store_dir', str(tmp_path / 'backups'))
+
+@pytest.fixture(autouse=True)
+def tmp_catalog(monkeypatch, tmp_path):
+    '''keeps palettes and themes saved by tests out of the user's catalog'''
+    monkeypatch.setattr(catalog, 'catalog_path', str(tmp_path / 'catalog.json'))
+
+@pytest.fixture
+def tmp_home(monkeypatch, tmp_path):
+    '''empty $HOME, templates, palettes and cache under tmp_path, with a jinja
+    environment that loads from those templates'''
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+    monkeypatch.setattr(config, 'templates_dir', str(tmp_path / 'templates'))
+    monkeypatch.setattr(config, 'palettes_dir', str(tmp_path / 'palettes'))
+    monkeypatch.setattr(config, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(template, 'env', j2.Environment(loader=template.TemplateLoader(config.templates_dir)))
+    monkeypatch.setattr(template.tree, 'snapshot_path', str(tmp_path / 'cache' / 'tree.json'))
+    (tmp_path / 'home').mkdir()
+    (tmp_path / 'templates').mkdir()
+    return tmp_path
+
+@pytest.fixture
+def managed_app(monkeypatch, tmp_home):
+    '''tmp_home with one managed file, app/conf, templated from settings.color'''
+    monkeypatch.setattr(config, 'get_config_settings', lambda: {'managed_files': ['app']})
+    (tmp_home / 'templates' / 'app').mkdir()
+    (tmp_home / 'templates' / 'app' / 'conf.j2').write_text('color = {{ settings.color }}')
+    return tmp_home
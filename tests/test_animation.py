@@ -0,0 +1,80 @@
+from palettecleanser import animation
+from palettecleanser import palette
+import numpy as np
+import pytest
+
+def write_gif(path, colors, size=(16, 16)):
+    '''writes an animation with one flat frame per color'''
+    Image = pytest.importorskip('PIL.Image')
+    frames = [Image.new('RGB', size, color) for color in colors]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=40)
+
+class TestReservoir:
+    def test_bounded(self):
+        reservoir = animation.Reservoir(100, seed=0)
+        for _ in range(50):
+            reservoir.add(np.zeros((30, 3), dtype=np.uint8))
+
+        assert reservoir.seen == 1500
+        assert len(reservoir.pixels) == 100
+
+    def test_fills_before_replacing(self):
+        reservoir = animation.Reservoir(100, seed=0)
+        reservoir.add(np.arange(60 * 3, dtype=np.uint8).reshape(60, 3))
+
+        assert reservoir.pixels.tolist() == np.arange(60 * 3).reshape(60, 3).tolist()
+
+    def test_uniform(self):
+        # 10 batches of a distinct value each; every batch should keep about a tenth of the sample
+        reservoir = animation.Reservoir(1000, seed=0)
+        for value in range(10):
+            reservoir.add(np.full((1000, 3), value, dtype=np.uint8))
+
+        counts = np.bincount(reservoir.pixels[:, 0], minlength=10)
+        assert (abs(counts - 100) < 40).all()
+
+
+class TestSample:
+    def test_stride(self, tmp_path):
+        write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 0, 255)] * 5)
+
+        assert len(list(animation.frames(str(tmp_path / 'a.gif')))) == 10
+        # every other frame is red
+        pixels = animation.sample(str(tmp_path / 'a.gif'), stride=2, seed=0)
+        assert np.unique(pixels, axis=0).tolist() == [[255, 0, 0]]
+
+    def test_bounded(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(animation, 'pixels_per_frame', 64)
+        write_gif(tmp_path / 'a.gif', [(v, v, v) for v in range(0, 250, 10)])
+
+        pixels = animation.sample(str(tmp_path / 'a.gif'), size=500, seed=0)
+        assert len(pixels) == 500
+        # pixels of the last frames compete for the sample as much as those of the first
+        assert pixels[:, 0].max() >= 200
+
+    def test_not_an_image(self, monkeypatch, tmp_path):
+        pytest.importorskip('PIL.Image')
+        monkeypatch.setattr(animation.shutil, 'which', lambda _: None)
+        (tmp_path / 'a.gif').write_text('not an image')
+
+        with pytest.raises(animation.FramesNotReadableError):
+            animation.sample(str(tmp_path / 'a.gif'))
+
+
+def test_from_animation(monkeypatch, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    write_gif(tmp_path / 'a.gif', [(255, 0, 0), (0, 255, 0), (0, 0, 255)])
+    sampled = {}
+
+    def from_image(image_path, *args, cache=True):
+        sampled['pixels'] = np.asarray(Image.open(image_path))
+        sampled['cache'] = cache
+        return palette.axarva_palette
+    monkeypatch.setattr(palette, 'from_image', from_image)
+
+    assert palette.from_animation(str(tmp_path / 'a.gif'), reservoir_size=100) is palette.axarva_palette
+    # quantized once, from a square image of the sample drawn from every frame
+    assert sampled['pixels'].shape == (10, 10, 3)
+    assert len(np.unique(sampled['pixels'].reshape(-1, 3), axis=0)) == 3
+    # the sample is thrown away, so its colors aren't cached
+    assert sampled['cache'] is False
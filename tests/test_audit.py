@@ -0,0 +1,49 @@
+from palettecleanser import audit
+from palettecleanser import colormath
+from palettecleanser import palette
+import numpy as np
+
+def from_hexes(name, *hexcodes):
+    return palette.from_hexes(list(hexcodes), name)
+
+class TestAudit:
+    def test_contrast(self):
+        failures = audit.audit([palette.ansi_normal_palette]).failures()
+
+        # red, blue and purple are too dark on black
+        assert [(f.first, f.second) for f in failures if f.check == 'contrast'] == [(0, 1), (0, 4), (0, 5)]
+        assert all(f.value < audit.default_min_contrast for f in failures if f.check == 'contrast')
+
+    def test_background(self):
+        p = from_hexes('light', '#000000', '#ffffff', '#eeeeee', '#333333')
+        failures = audit.audit([p]).failures(background=1, min_contrast=3)
+        assert [(f.first, f.second) for f in failures if f.check == 'contrast'] == [(1, 2)]
+
+    def test_deficiency(self):
+        # an orange and an olive that deuteranopes can't tell apart
+        p = from_hexes('autumn', '#000000', '#c86400', '#7c8a00')
+        assert [(f.check, f.first, f.second) for f in audit.audit([p]).failures(min_contrast=1)] == [('deuteranopia', 1, 2)]
+
+    def test_library(self):
+        # palettes of different lengths are audited together, each as it would be alone
+        palettes = [palette.ansi_normal_palette, from_hexes('short', '#000000', '#0000aa'), palette.axarva_palette]
+        together = audit.audit(palettes).failures()
+        alone = [f for p in palettes for f in audit.audit([p]).failures()]
+        assert together == alone
+
+    def test_adjusted(self):
+        palettes = [palette.ansi_normal_palette, from_hexes('gray', '#777777', '#808080', '#ffffff')]
+        adjusted = audit.audit(palettes).adjusted()
+
+        assert [p.name for p in adjusted] == ['ansi-normal', 'gray']
+        assert not [f for f in audit.audit(adjusted).failures() if f.check == 'contrast']
+        # colors that passed are left alone
+        assert adjusted[0].colors[2] == palette.ansi_normal_palette.colors[2]
+        # black contrasts more than white with mid gray, so even white is darkened
+        assert adjusted[1].colors[2].red < 0x77
+
+        before = colormath.to_oklab(np.array([170, 0, 0]))
+        after = colormath.to_oklab(np.array([vars(adjusted[0].colors[1])[c] for c in ['red', 'green', 'blue']]))
+        # lightened, keeping roughly the same hue
+        assert after[0] > before[0]
+        assert np.cos(colormath.hue_chroma(after)[0] - colormath.hue_chroma(before)[0]) > .9
@@ -0,0 +1,111 @@
+from palettecleanser import backup
+import fcntl
+import os
+import pytest
+
+class TestStore:
+    def test_store(self, tmp_path):
+        path = tmp_path / 'conf'
+        path.write_text('one\n')
+
+        b = backup.store(str(path))
+        assert b.id == 1
+        assert b.size == 4
+        with open(b.object_path) as f:
+            assert f.read() == 'one\n'
+        # new content is copied into the store, so editing the file doesn't change the backup
+        assert os.stat(b.object_path).st_ino != path.stat().st_ino
+        path.write_text('two\n')
+        with open(b.object_path) as f:
+            assert f.read() == 'one\n'
+
+    def test_dedupe(self, tmp_path):
+        for name in ['a', 'b']:
+            (tmp_path / name).write_text('same\n')
+
+        a = backup.store(str(tmp_path / 'a'))
+        b = backup.store(str(tmp_path / 'b'))
+        assert a.digest == b.digest
+        assert len(os.listdir(os.path.dirname(a.object_path))) == 1
+
+        # unchanged file isn't added to its history again
+        assert backup.store(str(tmp_path / 'a')) == a
+        assert [x.id for x in backup.load()] == [1, 2]
+
+    def test_clone_without_reflinks(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(fcntl, 'ioctl', lambda *args: (_ for _ in ()).throw(OSError()))
+        path = tmp_path / 'conf'
+        path.write_text('one\n')
+
+        b = backup.store(str(path))
+        with open(b.object_path) as f:
+            assert f.read() == 'one\n'
+
+    def test_pruned(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(backup, 'max_backups', 2)
+        (tmp_path / 'other').write_text('other\n')
+        other = backup.store(str(tmp_path / 'other'))
+
+        path = tmp_path / 'conf'
+        for i in range(3):
+            path.write_text(f'{i}\n')
+            backup.store(str(path))
+        assert len(backup.history(str(path))) == 3
+
+        # pruned down to max_backups once there are twice as many
+        path.write_text('3\n')
+        newest = backup.store(str(path))
+        assert [b.id for b in backup.history(str(path))] == [3, 2]
+        assert newest == backup.history(str(path))[0]
+        assert backup.history(str(tmp_path / 'other')) == [other]
+
+        objects = {d for _, _, files in os.walk(os.path.join(backup.store_dir, 'objects')) for d in files}
+        assert objects == {b.digest for b in backup.load()}
+        with open(newest.object_path) as f:
+            assert f.read() == '3\n'
+
+class TestRestore:
+    def test_restore(self, tmp_path):
+        path = tmp_path / 'conf'
+        path.write_text('one\n')
+        first = backup.store(str(path))
+        # deploys replace files rather than writing to them
+        os.remove(path)
+        path.write_text('two\n')
+        path.chmod(0o600)
+
+        assert backup.restore(str(path)) == first
+        assert path.read_text() == 'one\n'
+        assert os.stat(first.object_path).st_ino != path.stat().st_ino
+        assert path.stat().st_mode == first.mode
+
+        # the restore can be undone
+        [undo, _] = backup.history(str(path))
+        backup.restore(str(path), undo.id)
+        assert path.read_text() == 'two\n'
+
+    def test_restore_missing(self, tmp_path):
+        with pytest.raises(backup.BackupNotFoundError):
+            backup.restore(str(tmp_path / 'conf'))
+
+    def test_restore_symlink(self, tmp_path):
+        (tmp_path / 'dotfiles').mkdir()
+        target = tmp_path / 'dotfiles' / 'conf'
+        target.write_text('one\n')
+        link = tmp_path / 'conf'
+        link.symlink_to(target)
+        # deploys write through symlinks, and back up the file they link to
+        first = backup.store(str(target))
+        target.write_text('two\n')
+
+        # found through the link, which is kept
+        assert backup.history(str(link)) == [first]
+        assert backup.restore(str(link)) == first
+        assert link.is_symlink()
+        assert target.read_text() == 'one\n'
+
+        # backed up through the link, under the file it links to
+        [undo, _] = backup.history(str(target))
+        assert undo.path == str(target.resolve())
+        backup.restore(str(link), undo.id)
+        assert target.read_text() == 'two\n'
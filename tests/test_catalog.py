@@ -0,0 +1,138 @@
+from palettecleanser import catalog
+from palettecleanser import check
+from palettecleanser import config
+from palettecleanser import metrics
+from palettecleanser import palette
+from palettecleanser import theme
+import os
+import pytest
+
+colors = [palette.from_hex('#000000'), palette.from_hex('#ffffff')]
+
+@pytest.fixture
+def library(monkeypatch, tmp_path):
+    '''empty palettes, themes and templates directories, and an image'''
+    for name in ['palettes', 'themes', 'templates']:
+        (tmp_path / name).mkdir()
+        monkeypatch.setattr(config, f'{name}_dir', str(tmp_path / name))
+    monkeypatch.setattr(config, 'config_dir', str(tmp_path))
+    (tmp_path / 'image.png').write_bytes(b'not really a png')
+    return tmp_path
+
+def save_theme(name, palettes, image_path):
+    with open(os.path.join(config.themes_dir, f'{name}.yml'), 'w') as f:
+        f.write(f'''!!python/object:palettecleanser.theme.Theme
+name: {name}
+image_path: '{image_path}'
+palettes: [{', '.join(palettes)}]
+settings: {{font: mono}}
+''')
+
+class TestCatalog:
+    def test_kept_in_sync(self, library):
+        palette.save_all([palette.Palette(colors, 'a'), palette.Palette(colors, 'b')])
+        t = theme.Theme('t', ['a', 'b'], str(library / 'image.png'), {'font': 'mono'})
+        t.save()
+
+        saved = catalog.load()
+        assert set(saved.palettes) == {'a', 'b'}
+        entry = saved.themes['t']
+        assert entry.palettes == ['a', 'b']
+        assert entry.settings == ['font']
+        assert entry.image_hash == catalog.hash_file(str(library / 'image.png'))
+
+        catalog.forget_palette('a')
+        catalog.forget_theme('t')
+        assert set(catalog.load().palettes) == {'b'}
+        assert catalog.load().themes == {}
+
+    def test_refresh_only_reads_changed_themes(self, library):
+        save_theme('t', ['a'], '')
+        save_theme('u', ['a'], '')
+
+        with metrics.recording() as recorded:
+            catalog.refreshed()
+        assert recorded.counters['themes indexed'] == 2
+
+        # edited by hand, so it must be read again
+        save_theme('u', ['a', 'bb'], '')
+        with metrics.recording() as recorded:
+            refreshed = catalog.refreshed()
+        assert recorded.counters['themes indexed'] == 1
+        assert refreshed.themes['u'].palettes == ['a', 'bb']
+
+        os.remove(library / 'themes' / 't.yml')
+        assert set(catalog.refreshed().themes) == {'u'}
+
+    def test_unreadable(self, library):
+        (library / 'themes' / 'bad.yml').write_text('[')
+        assert catalog.refreshed().themes['bad'].error
+
+    def test_old_version(self, library):
+        (library / 'catalog.json').write_text('{"version": 0, "palettes": {"x": [0, 0]}, "themes": {}}')
+        assert catalog.load().palettes == {}
+
+class TestCheck:
+    def test_problems(self, library, monkeypatch):
+        palette.save_all([palette.Palette(colors, 'a'), palette.Palette(colors, 'unused')])
+        save_theme('t', ['a', 'gone'], str(library / 'image.png'))
+        save_theme('u', ['a'], str(library / 'nowhere.png'))
+        (library / 'templates' / 'managed.j2').write_text('')
+        (library / 'templates' / 'old').mkdir()
+        (library / 'templates' / 'old' / 'file.j2').write_text('')
+        (library / 'config.yml').write_text('managed_files: [managed, missing]')
+
+        problems = check.check()
+        found = {(p.kind, p.subject) for p in problems}
+        assert found == {
+            ('missing palette', 't'),
+            ('missing image', 'u'),
+            ('missing template', 'missing'),
+            ('orphaned palette', 'unused'),
+            ('unused template', 'old/file'),
+        }
+        # errors first
+        assert [p.is_error for p in problems] == sorted([p.is_error for p in problems], reverse=True)
+
+        # the image is replaced after the theme was indexed
+        (library / 'image.png').write_bytes(b'another image entirely')
+        assert ('changed image', 't') in {(p.kind, p.subject) for p in check.check()}
+
+    def test_unknown_emitter(self, library):
+        (library / 'templates' / 'managed.j2').write_text('')
+        (library / 'config.yml').write_text('managed_files: [{colors.css: {emitter: nope}}, managed, missing]')
+
+        found = {(p.kind, p.subject) for p in check.check_templates()}
+        # the other managed files are still checked
+        assert found == {('unknown emitter', 'config.yml'), ('missing template', 'missing')}
+
+    def test_clean(self, library):
+        palette.save_all([palette.Palette(colors, 'a')])
+        save_theme('t', ['a'], str(library / 'image.png'))
+        assert check.check() == []
+
+    @pytest.mark.parametrize('config_yml', [None, '', 'other_setting: 1'])
+    def test_nothing_managed(self, library, config_yml):
+        (library / 'templates' / 'file.j2').write_text('')
+        if config_yml is not None:
+            (library / 'config.yml').write_text(config_yml)
+
+        assert check.check_templates() == []
+
+    @pytest.mark.parametrize('config_yml', ['managed_files: [', '[managed]', 'managed_files: managed'])
+    def test_unreadable_config(self, library, config_yml):
+        (library / 'config.yml').write_text(config_yml)
+
+        assert [(p.kind, p.subject) for p in check.check_templates()] == [('unreadable config', 'config.yml')]
+
+    def test_malformed_managed_file(self, library):
+        (library / 'templates' / 'managed.j2').write_text('')
+        (library / 'config.yml').write_text('managed_files: [3, {other: 4}, managed, missing]')
+
+        found = [(p.kind, p.detail) for p in check.check_templates()]
+        # the other managed files are still checked
+        assert found == [
+            ('unreadable config', 'malformed managed file 3'),
+            ('unreadable config', "malformed managed file {'other': 4}"),
+            ('missing template', "'missing' is managed, but has no template"),
+        ]
@@ -0,0 +1,40 @@
+from palettecleanser import compare
+from palettecleanser import colormath
+from palettecleanser import palette
+import numpy as np
+import os
+import pytest
+
+def test_contrast():
+    assert colormath.contrast(np.array([0, 0, 0]), np.array([255, 255, 255])) == pytest.approx(21)
+    assert colormath.contrast(np.array([119, 119, 119]), np.array([255, 255, 255])) == pytest.approx(4.48, abs=.01)
+
+def test_oklab_round_trip():
+    rgb = np.random.default_rng(0).integers(0, 256, (100, 3))
+    assert np.allclose(colormath.from_oklab(colormath.to_oklab(rgb)), rgb, atol=1e-6)
+
+class TestScore:
+    def test_ansi(self):
+        # a palette that is its own ansi slots fits perfectly
+        scores = compare.score(palette.ansi_normal_palette)
+        assert scores.fit == pytest.approx(1)
+        assert 0 < scores.total <= 1
+
+    def test_gray(self):
+        gray = palette.Palette([palette.Color(v, v, v) for v in range(100, 116, 2)])
+        scores = compare.score(gray)
+        assert scores.fit < .1
+        assert scores.contrast < .3
+        assert scores.spread < .1
+        assert scores.total < compare.score(palette.axarva_palette).total
+
+
+def test_compare():
+    pytest.importorskip('PIL')
+    image_path = os.path.join(os.path.dirname(__file__), 'test_data/muruusa-mountain.jpg')
+    results = compare.compare(image_path, ['mediancut', 'octree', 'colorthief'], jobs=2)
+
+    assert [r.backend for r in results][-1] == 'colorthief'
+    assert results[-1].error and not results[-1].palette
+    assert results[0].scores.total >= results[1].scores.total
+    assert all(len(r.palette.colors) == 8 and r.seconds > 0 for r in results[:2])
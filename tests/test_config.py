@@ -2,3 +2,15 @@ from palettecleanser import config
 
 def test_get_config_settings():
     print(config.get_config_settings())
+
+def test_load_yaml(tmp_path):
+    path = tmp_path / 'test.yml'
+    path.write_text('a: [1, 2]\n')
+    assert config.load_yaml(str(path)) == {'a': [1, 2]}
+
+    # callers get their own copy
+    config.load_yaml(str(path))['a'].append(3)
+    assert config.load_yaml(str(path)) == {'a': [1, 2]}
+
+    path.write_text('a: [1, 2, 3, 4]\n')
+    assert config.load_yaml(str(path)) == {'a': [1, 2, 3, 4]}
@@ -0,0 +1,118 @@
+from palettecleanser import config
+from palettecleanser import deploy
+from palettecleanser import paths
+from palettecleanser import template
+from palettecleanser import theme
+from palettecleanser.cli import client
+from palettecleanser.cli import daemon
+import os
+import threading
+import time
+import pytest
+
+def start_server(monkeypatch, tmp_path) -> tuple[daemon.Server, threading.Thread]:
+    '''serves a daemon on a socket under tmp_path, in a thread'''
+    monkeypatch.setattr(paths, 'daemon_socket', str(tmp_path / 'pclean.sock'))
+    server = daemon.bind(paths.daemon_socket)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    return server, thread
+
+class TestClient:
+    def test_is_forwarded(self):
+        assert client.is_forwarded(['theme', 'deploy', 'dracula'])
+        assert client.is_forwarded(['palette', 'show', 'dracula'])
+        assert not client.is_forwarded(['theme', 'generate', '--name', 'dracula'])
+        assert not client.is_forwarded(['theme', 'deploy', '--help'])
+
+    def test_send_not_running(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(paths, 'daemon_socket', str(tmp_path / 'pclean.sock'))
+        assert client.send({'control': 'ping'}) is None
+
+class TestServer:
+    def test_run(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config, 'palettes_dir', str(tmp_path / 'palettes'))
+        server, thread = start_server(monkeypatch, tmp_path)
+
+        try:
+            assert client.send({'control': 'ping'})['pid'] == os.getpid()
+
+            reply = client.send({'argv': ['palette', 'show', 'garbage']})
+            assert reply['code'] == 1
+            assert "couldn't find 'garbage'" in reply['stderr']
+
+            with pytest.raises(FileExistsError):
+                daemon.bind(paths.daemon_socket)
+        finally:
+            client.send({'control': 'stop'})
+            thread.join()
+
+        assert not os.path.exists(paths.daemon_socket)
+
+    def test_deploys_coalesced(self, monkeypatch, tmp_path, managed_app):
+        monkeypatch.setattr(config, 'themes_dir', str(tmp_path / 'themes'))
+        monkeypatch.setattr(deploy, 'lock_path', str(tmp_path / 'deploy.lock'))
+        monkeypatch.setattr(deploy, 'queue_path', str(tmp_path / 'deploy.queue'))
+        theme.Theme('t', [], '', {'color': 'red'}).save()
+        started, release = threading.Event(), threading.Event()
+        # the first deploy renders until released
+        template.env.globals['wait'] = lambda: started.set() or release.wait() and ''
+        (tmp_path / 'templates' / 'app' / 'conf.j2').write_text('{{ wait() }}color = {{ settings.color }}')
+
+        server, thread = start_server(monkeypatch, tmp_path)
+        replies = {}
+
+        def send(name):
+            replies[name] = client.send({'argv': ['theme', 'deploy', 't']})
+
+        try:
+            first = threading.Thread(target=send, args=('first',))
+            first.start()
+            started.wait()
+
+            waiting = []
+            for i, name in enumerate(['older', 'newer'], start=2):
+                waiting.append(threading.Thread(target=send, args=(name,)))
+                waiting[-1].start()
+                while server.issued < i:
+                    time.sleep(.01)
+
+            release.set()
+            for t in [first] + waiting:
+                t.join()
+        finally:
+            client.send({'control': 'stop'})
+            thread.join()
+
+        assert replies['first']['code'] == 0
+        assert replies['older'] == {'code': 0, 'stdout': 'skipped: superseded by a newer deploy\n', 'stderr': ''}
+        assert replies['newer']['code'] == 0
+        assert replies['newer']['stdout'].startswith('coalesced 1 pending deploy into this one\n')
+
+    def test_caller_context(self, monkeypatch, tmp_path, managed_app):
+        monkeypatch.setattr(config, 'themes_dir', str(tmp_path / 'themes'))
+        monkeypatch.setattr(deploy, 'lock_path', str(tmp_path / 'deploy.lock'))
+        monkeypatch.setattr(deploy, 'queue_path', str(tmp_path / 'deploy.queue'))
+        theme.Theme('t', [], '', {'color': 'red', 'reload_hooks': {'app': f'echo "$GREETING" > {tmp_path / "greeting"}'}}).save()
+        (tmp_path / 'caller').mkdir()
+        (tmp_path / 'caller' / 'out').mkdir()
+        monkeypatch.chdir(tmp_path / 'templates')
+
+        server, thread = start_server(monkeypatch, tmp_path)
+        try:
+            # run from another directory, with another environment
+            message = client.request(['theme', 'deploy', 't', '--root', 'out', '--root', '../home', '--metrics-json', 'metrics.json'])
+            message['cwd'] = str(tmp_path / 'caller')
+            message['env']['GREETING'] = 'hello'
+            reply = client.send(message)
+        finally:
+            client.send({'control': 'stop'})
+            thread.join()
+
+        assert reply['code'] == 0, reply
+        assert (tmp_path / 'caller' / 'out' / 'app' / 'conf').read_text().endswith('color = red')
+        assert (tmp_path / 'caller' / 'metrics.json').exists()
+        assert (tmp_path / 'greeting').read_text() == 'hello\n'
+        # the daemon's own directory and environment are restored
+        assert os.getcwd() == str(tmp_path / 'templates')
+        assert 'GREETING' not in os.environ
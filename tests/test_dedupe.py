@@ -0,0 +1,45 @@
+from palettecleanser import dedupe
+import numpy as np
+import pytest
+
+def write_images(directory, count):
+    '''writes count distinct smooth images, each with a smaller recompressed copy'''
+    Image = pytest.importorskip('PIL.Image')
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        image = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)).resize((400, 300), Image.BICUBIC)
+        image.save(directory / f'{i}.png')
+        image.resize((200, 150)).save(directory / f'{i}-small.jpg', quality=60)
+
+class TestBKTree:
+    def test_search(self):
+        rng = np.random.default_rng(0)
+        hashes = [dedupe.ImageHash(str(i), int(h), 0) for i, h in enumerate(rng.integers(0, 1 << 16, 500))]
+        tree = dedupe.BKTree(hashes[0].hash)
+        for h in hashes:
+            tree.add(h)
+
+        for query in hashes[:20]:
+            expected = {h.path for h in hashes if dedupe.distance(h.hash, query.hash) <= 3}
+            assert {h.path for h in tree.search(query.hash, 3)} == expected
+
+
+class TestGroup:
+    def test_chains(self):
+        hashes = [dedupe.ImageHash('a', 0b0000, 1), dedupe.ImageHash('b', 0b0011, 3), dedupe.ImageHash('c', 0b1111, 2), dedupe.ImageHash('d', 0b11110000, 1)]
+
+        # a-b and b-c are 2 bits apart, linking a and c
+        assert [[h.path for h in g] for g in dedupe.group(hashes, 2)] == [['b', 'c', 'a'], ['d']]
+        assert len(dedupe.group(hashes, 1)) == 4
+
+    @pytest.mark.parametrize('method', dedupe.methods)
+    def test_dedupe(self, monkeypatch, tmp_path, method):
+        monkeypatch.setattr(dedupe, 'chunk_size', 3)
+        write_images(tmp_path, 4)
+        (tmp_path / 'notes.txt').write_text('not an image')
+        (tmp_path / 'broken.png').write_text('not an image')
+
+        groups = dedupe.dedupe(str(tmp_path), method, jobs=2)
+        assert sorted([h.path for h in g] for g in groups) == [
+            [str(tmp_path / f'{i}.png'), str(tmp_path / f'{i}-small.jpg')] for i in range(4)
+        ]
@@ -0,0 +1,182 @@
+from palettecleanser import deploy
+from palettecleanser import isolate
+from palettecleanser import template
+from palettecleanser import theme
+import os
+import subprocess
+import threading
+
+def use_tmp_queue(monkeypatch, tmp_path):
+    monkeypatch.setattr(deploy, 'lock_path', str(tmp_path / 'deploy.lock'))
+    monkeypatch.setattr(deploy, 'queue_path', str(tmp_path / 'deploy.queue'))
+
+class TestSchedule:
+    def test_schedule(self, monkeypatch, tmp_path):
+        use_tmp_queue(monkeypatch, tmp_path)
+        assert deploy.schedule(lambda: 'deployed') == deploy.DeployReport(True, 0, 'deployed')
+
+    def test_latest_wins(self, monkeypatch, tmp_path):
+        use_tmp_queue(monkeypatch, tmp_path)
+        ran = []
+
+        older = deploy.enqueue('')
+        newer = deploy.enqueue('')
+
+        assert deploy.run('', older, lambda: ran.append('older')) == deploy.DeployReport(False)
+        assert deploy.run('', newer, lambda: ran.append('newer')).coalesced == 1
+        assert ran == ['newer']
+
+        # the coalesced count is only reported once
+        assert deploy.schedule(lambda: None).coalesced == 0
+
+    def test_dead_latest_taken_over(self, monkeypatch, tmp_path):
+        use_tmp_queue(monkeypatch, tmp_path)
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+
+        older = deploy.enqueue('')
+        deploy.enqueue('')
+        # the newer deploy's process was killed while waiting for the lock
+        with deploy.queue() as state:
+            state['']['pid'] = dead.pid
+
+        assert deploy.run('', older, lambda: 'older') == deploy.DeployReport(True, 0, 'older')
+        with deploy.queue() as state:
+            assert state['']['ran'] == older
+
+    def test_out_of_order(self, monkeypatch, tmp_path):
+        use_tmp_queue(monkeypatch, tmp_path)
+        ran = []
+
+        older = deploy.enqueue('')
+        newer = deploy.enqueue('')
+
+        # the newer deploy gets the lock first
+        assert deploy.run('', newer, lambda: ran.append('newer')) == deploy.DeployReport(True, 0, None)
+        # so the older one mustn't overwrite it afterwards
+        assert deploy.run('', older, lambda: ran.append('older')) == deploy.DeployReport(False)
+        assert ran == ['newer']
+
+        # the dropped deploy is counted by the next one that runs
+        assert deploy.schedule(lambda: None).coalesced == 1
+
+    def test_scopes_not_coalesced(self, monkeypatch, tmp_path):
+        use_tmp_queue(monkeypatch, tmp_path)
+
+        alacritty = deploy.enqueue('.config/alacritty/alacritty.yml')
+        kitty = deploy.enqueue('.config/kitty/kitty.conf')
+
+        assert deploy.run('.config/alacritty/alacritty.yml', alacritty, lambda: None).ran
+        assert deploy.run('.config/kitty/kitty.conf', kitty, lambda: None).ran
+
+    def test_serialized(self, monkeypatch, tmp_path):
+        use_tmp_queue(monkeypatch, tmp_path)
+        started = threading.Event()
+        release = threading.Event()
+        events = []
+
+        def slow():
+            started.set()
+            release.wait()
+            events.append('slow')
+
+        first = threading.Thread(target=deploy.schedule, args=(slow,))
+        first.start()
+        started.wait()
+
+        second = threading.Thread(target=deploy.schedule, args=(lambda: events.append('fast'),))
+        second.start()
+        second.join(timeout=.2)
+        # second deploy is blocked on the lock held by the first
+        assert second.is_alive()
+
+        release.set()
+        first.join()
+        second.join()
+        assert events == ['slow', 'fast']
+
+class TestDeployTheme:
+    def test_deploy_theme(self, tmp_path, managed_app):
+        t = theme.Theme('theme name', [], '', {'color': 'red', 'reload_hooks': {'app': 'echo reloaded'}})
+
+        deployment = deploy.deploy_theme(t)
+        assert deployment.changed == ['app/conf']
+        assert [r.output for r in deployment.hook_results] == ['reloaded\n']
+
+        # nothing changed, so nothing is reloaded
+        deployment = deploy.deploy_theme(t)
+        assert deployment.changed == []
+        assert deployment.hook_results == []
+
+    def test_deploy_theme_roots(self, monkeypatch, tmp_path, managed_app):
+        roots = [str(tmp_path / 'home'), str(tmp_path / 'alice'), str(tmp_path / 'bob')]
+        for root in roots[1:]:
+            os.mkdir(root)
+        if os.geteuid() == 0:
+            os.chown(roots[2], 12345, 12345)
+
+        rendered = []
+        original_template = template.TemplateFile.template
+        monkeypatch.setattr(template.TemplateFile, 'template', lambda self, *args: rendered.append(self.path) or original_template(self, *args))
+
+        deployment = deploy.deploy_theme(theme.Theme('theme name', [], '', {'color': 'red'}), roots=roots)
+
+        # rendered once, written everywhere
+        assert rendered == ['app/conf']
+        assert [(r.root, r.changed, r.error) for r in deployment.roots] == [(root, ['app/conf'], None) for root in roots]
+        for root in roots:
+            assert open(os.path.join(root, 'app', 'conf')).read() == f'# {template.templated_signature}\ncolor = red'
+        if os.geteuid() == 0:
+            assert os.stat(os.path.join(roots[2], 'app', 'conf')).st_uid == 12345
+            assert os.stat(os.path.join(roots[2], 'app')).st_uid == 12345
+
+    def test_deploy_theme_roots_confined(self, monkeypatch, tmp_path, managed_app):
+        roots = [str(tmp_path / 'alice'), str(tmp_path / 'bob')]
+        for root in roots:
+            os.mkdir(root)
+        (tmp_path / 'shadow').write_text('secret\n')
+        os.symlink(tmp_path, os.path.join(roots[1], 'app'))
+        # treat every root as another user's
+        monkeypatch.setattr(deploy, 'owner', lambda root: (os.getuid(), os.getgid()))
+
+        deployment = deploy.deploy_theme(theme.Theme('theme name', [], '', {'color': 'red'}), roots=roots)
+
+        [alice, bob] = deployment.roots
+        assert (alice.changed, alice.error) == (['app/conf'], None)
+        assert bob.changed == [] and 'leads outside' in bob.error
+        assert open(os.path.join(roots[0], 'app', 'conf')).read() == f'# {template.templated_signature}\ncolor = red'
+        assert not (tmp_path / 'conf').exists()
+        assert (tmp_path / 'shadow').read_text() == 'secret\n'
+
+    def test_deploy_theme_isolated(self, tmp_path, managed_app):
+        (tmp_path / 'templates' / 'app' / 'loop.j2').write_text('{% for i in range(10**12) %}{% endfor %}')
+        (tmp_path / 'templates' / 'app' / 'bad.j2').write_text('{{ nope.x }}')
+
+        deployment = deploy.deploy_theme(theme.Theme('theme name', [], '', {'color': 'red'}), limits=isolate.Limits(cpu_time=1))
+
+        # the bad templates are skipped, the rest is still deployed
+        assert sorted((f.path, f.reason) for f in deployment.failures) == [
+            ('app/bad', "UndefinedError: 'nope' is undefined"),
+            ('app/loop', 'exceeded 1s of cpu time')
+        ]
+        assert deployment.changed == ['app/conf']
+        assert sorted(os.listdir(tmp_path / 'home' / 'app')) == ['conf']
+
+
+class TestPreviewTheme:
+    def test_preview_theme(self, tmp_path, managed_app):
+        t = theme.Theme('theme name', [], '', {'color': 'red'})
+
+        assert deploy.preview_theme(t) == [deploy.Change('app/conf', 'added')]
+        # nothing was written
+        assert os.listdir(tmp_path / 'home') == []
+
+        deploy.deploy_theme(t)
+        assert deploy.preview_theme(t) == []
+
+        os.chmod(tmp_path / 'home' / 'app' / 'conf', 0o600)
+        assert deploy.preview_theme(t) == [deploy.Change('app/conf', 'mode')]
+
+        [change] = deploy.preview_theme(theme.Theme('theme name', [], '', {'color': 'blue'}), diff=True)
+        assert change.status == 'modified'
+        assert change.diff[2:] == ['@@ -1,2 +1,2 @@\n', f' # {template.templated_signature}\n', '-color = red', '+color = blue']
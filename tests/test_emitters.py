@@ -0,0 +1,81 @@
+from palettecleanser import emitters
+from palettecleanser import palette
+from palettecleanser import theme
+import json
+import pytest
+import yaml
+
+normal = palette.from_hexes(['#000000', '#aa0000', '#00aa00', '#aaaa00', '#0000aa', '#aa00aa', '#00aaaa', '#aaaaaa'], 'normal')
+dim = normal.tone(30, False, 'dim')
+bright = normal.tone(30, True, 'bright')
+
+class FakeTheme(theme.Theme):
+    def get_palettes(self):
+        return self.loaded
+
+def make_theme(*palettes):
+    t = FakeTheme('fake', [p.name for p in palettes], '')
+    t.loaded = list(palettes)
+    return t
+
+class TestScheme:
+    def test_layout(self):
+        s = emitters.scheme(make_theme(normal, dim, bright))
+        assert s.background == '#000000'
+        assert s.foreground == '#aaaaaa'
+        assert s.dim == [str(c) for c in dim.colors]
+        assert s.ansi[8:] == [str(c) for c in bright.colors]
+
+    def test_sixteen_colors(self):
+        s = emitters.scheme(make_theme(palette.Palette(normal.colors + bright.colors, 'both')))
+        assert s.bright == [str(c) for c in bright.colors]
+        assert s.dim == s.normal
+
+    def test_one_palette(self):
+        s = emitters.scheme(make_theme(normal))
+        assert s.bright == s.normal == s.dim
+
+class TestEmitters:
+    scheme = emitters.scheme(make_theme(normal, dim, bright))
+
+    def test_xresources(self):
+        lines = emitters.xresources(self.scheme).splitlines()
+        assert '*background: #000000' in lines
+        assert f'*color15: {bright.colors[7]}' in lines
+        assert len(lines) == 19
+
+    def test_kitty(self):
+        settings = dict(line.split() for line in emitters.kitty(self.scheme).splitlines())
+        assert settings['background'] == '#000000'
+        assert settings['color9'] == str(bright.colors[1])
+
+    def test_alacritty(self):
+        colors = yaml.safe_load(emitters.alacritty(self.scheme))['colors']
+        assert colors['primary'] == {'background': '#000000', 'foreground': '#aaaaaa'}
+        assert colors['dim']['red'] == str(dim.colors[1])
+        assert colors['bright']['white'] == str(bright.colors[7])
+
+    def test_css(self):
+        output = emitters.css(self.scheme)
+        assert output.startswith(':root {')
+        assert '  --color1: #aa0000;' in output.splitlines()
+
+    def test_json(self):
+        output = emitters.json_colors(self.scheme)
+        # the signature is on the second line, where templated files have it
+        assert '@palette-cleanser' in output.splitlines()[1]
+        parsed = json.loads(output)
+        assert parsed['special']['background'] == '#000000'
+        assert len(parsed['colors']) == 16
+
+    def test_base16(self):
+        parsed = yaml.safe_load(emitters.base16(self.scheme))
+        assert parsed['scheme'] == 'fake'
+        assert [k for k in parsed if k.startswith('base')] == [f'base0{i:X}' for i in range(16)]
+        assert parsed['base00'] == '000000'
+        assert parsed['base05'] == 'aaaaaa'
+        assert parsed['base08'] == 'aa0000'
+
+def test_unknown():
+    with pytest.raises(emitters.UnknownEmitterError):
+        emitters.get('nope')
@@ -0,0 +1,51 @@
+from palettecleanser import harmony
+from palettecleanser import colormath
+from palettecleanser import palette
+import numpy as np
+import pytest
+
+seeds = [palette.from_hex('#e4572e'), palette.from_hex('#3a86ff'), palette.from_hex('#808080')]
+
+@pytest.mark.parametrize('scheme', harmony.schemes)
+def test_generate(scheme):
+    palettes = harmony.generate(seeds, scheme, 4)
+
+    assert len(palettes) == 12
+    assert len({p.name for p in palettes}) == 12
+    assert palettes[4].name == f'{scheme}-3a86ff-1'
+    for i, p in enumerate(palettes):
+        assert len(p.colors) == 8
+        # the seed is kept as it is
+        assert seeds[i // 4] in p.colors
+        # dark background first, light foreground last
+        assert p.colors[0].distance(palette.Color(0, 0, 0)) < 60
+        assert p.colors[7].distance(palette.Color(255, 255, 255)) < 60
+
+def test_hues():
+    lab = colormath.to_oklab(np.array([[c.red, c.green, c.blue] for c in harmony.generate(seeds[:1], 'complementary')[0].colors]))
+    hues, chromas = colormath.hue_chroma(lab[1:7])
+    seed_hue = colormath.hue_chroma(colormath.to_oklab(np.array([0xe4, 0x57, 0x2e])))[0]
+
+    # every accent is near the seed's hue or its complement
+    near = np.abs(np.cos(hues - seed_hue))
+    assert (near > np.cos(np.radians(harmony.drift * 2.5))).all()
+
+def test_light():
+    p = harmony.generate(seeds[:1], 'triadic', light=True)[0]
+    assert p.colors[0].distance(palette.Color(255, 255, 255)) < 60
+    assert p.colors[7].distance(palette.Color(0, 0, 0)) < 60
+
+def test_unknown_scheme():
+    with pytest.raises(ValueError):
+        harmony.generate(seeds, 'garbage')
+
+def test_from_oklch_gamut():
+    # a chroma no srgb color has, at every hue
+    hues = np.linspace(-np.pi, np.pi, 50)
+    rgb = colormath.from_oklch(np.full(50, .7), np.full(50, .4), hues)
+    lab = colormath.to_oklab(np.rint(rgb))
+
+    # chroma is given up, but lightness and hue are kept
+    assert (colormath.hue_chroma(lab)[1] < .4).all()
+    assert np.allclose(lab[:, 0], .7, atol=.01)
+    assert (np.cos(colormath.hue_chroma(lab)[0] - hues) > .99).all()
@@ -0,0 +1,52 @@
+from palettecleanser import hooks
+import time
+
+class TestHook:
+    def test_is_triggered_by(self):
+        hook = hooks.Hook('.config/bspwm', 'bspc wm -r')
+        assert hook.is_triggered_by(['.Xresources', '.config/bspwm/bspwmrc'])
+        assert not hook.is_triggered_by(['.config/bspwm-old/bspwmrc'])
+        assert hooks.Hook('.Xresources', 'xrdb -merge ~/.Xresources').is_triggered_by(['.Xresources'])
+
+    def test_from_settings(self):
+        config_settings = {
+            'reload_timeout': 2,
+            'reload_hooks': {
+                '.Xresources': 'xrdb -merge ~/.Xresources',
+                '.config/kitty': 'pkill -USR1 kitty'
+            }
+        }
+        theme_settings = {'reload_hooks': {'.config/kitty': {'command': 'kitty @ load-config', 'timeout': 1}}}
+
+        assert hooks.from_settings(config_settings, theme_settings) == [
+            hooks.Hook('.Xresources', 'xrdb -merge ~/.Xresources', 2),
+            hooks.Hook('.config/kitty', 'kitty @ load-config', 1)
+        ]
+
+    def test_from_settings_empty(self):
+        assert hooks.from_settings({}, {'test': 'hi'}) == []
+
+class TestRun:
+    def test_run_changed_only(self):
+        results = hooks.run([
+            hooks.Hook('a', 'echo a'),
+            hooks.Hook('b', 'echo b')
+        ], ['b'])
+
+        assert [(r.hook.path, r.returncode, r.output) for r in results] == [('b', 0, 'b\n')]
+
+    def test_run_concurrent(self):
+        start = time.perf_counter()
+        results = hooks.run([hooks.Hook(str(i), 'sleep .3') for i in range(4)], ['0', '1', '2', '3'])
+        assert time.perf_counter() - start < 1
+        assert [r.status for r in results] == ['ok'] * 4
+
+    def test_run_timeout(self):
+        results = hooks.run([
+            hooks.Hook('a', 'sleep 5', timeout=.2),
+            hooks.Hook('a', 'exit 3')
+        ], ['a'])
+
+        assert results[0].returncode is None
+        assert results[0].elapsed < 2
+        assert results[1].status == 'exit 3'
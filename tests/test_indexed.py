@@ -0,0 +1,44 @@
+from palettecleanser import config
+from palettecleanser import indexed
+from palettecleanser import palette
+from palettecleanser import template
+import numpy as np
+import os
+import pytest
+
+@pytest.fixture
+def tmp_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'cache_dir', str(tmp_path))
+    indexed.table.cache_clear()
+    yield tmp_path
+    indexed.table.cache_clear()
+
+class TestIndexedTable:
+    @pytest.mark.parametrize('colors', [256, 16])
+    def test_exact(self, tmp_cache, colors):
+        indices, rgbs = indexed.palettes[f'xterm{colors}']()
+        candidates = [palette.Color(*rgb) for rgb in rgbs]
+
+        for rgb in np.random.default_rng(0).integers(0, 256, (500, 3)):
+            color = palette.Color(*map(int, rgb))
+            assert color.indexed(colors) == indices[color.closest(candidates)]
+
+    def test_cached(self, tmp_cache):
+        built = indexed.table('xterm256')
+        assert sorted(os.listdir(tmp_cache)) == ['xterm256-v1-5bit-candidates.npy', 'xterm256-v1-5bit-offsets.npy']
+
+        indexed.table.cache_clear()
+        loaded = indexed.table('xterm256')
+        assert isinstance(loaded.offsets, np.memmap)
+        assert (loaded.candidates == built.candidates).all()
+
+    def test_unknown(self, tmp_cache):
+        with pytest.raises(indexed.UnknownTableError):
+            palette.Color(0, 0, 0).indexed(88)
+
+
+class TestFilter:
+    def test_xterm(self, tmp_cache):
+        rendered = template.env.from_string("{{ c | xterm }} {{ '#ffffff' | xterm(16) }}").render(c=palette.Color(255, 0, 0))
+        assert rendered == '196 15'
+        assert palette.Palette([palette.Color(0, 0, 0), palette.Color(255, 255, 255)]).indexed() == [16, 231]
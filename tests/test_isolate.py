@@ -0,0 +1,80 @@
+from palettecleanser import isolate
+from palettecleanser import template
+from palettecleanser import theme
+import os
+import pytest
+import signal
+import time
+
+class TestRender:
+    def setup_templates(self, tmp_path, templates):
+        for path, source in templates.items():
+            (tmp_path / 'templates' / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / 'templates' / path).write_text(source)
+        return [template.TemplateFile(path.removesuffix('.j2')) for path in templates]
+
+    def test_render(self, tmp_path, tmp_home):
+        files = self.setup_templates(tmp_path, {f'{i}.conf.j2': f'{i}{{{{ settings.x }}}}' for i in range(5)})
+
+        with template.Transaction(str(tmp_path / 'home')) as transaction:
+            assert isolate.render(files, theme.Theme('t', [], '', {'x': '!'}), transaction, jobs=2) == []
+            assert sorted(transaction.commit()) == [f'{i}.conf' for i in range(5)]
+
+        for i in range(5):
+            assert (tmp_path / 'home' / f'{i}.conf').read_text().endswith(f'{i}!')
+
+    def test_memory_limit(self, tmp_path, tmp_home):
+        files = self.setup_templates(tmp_path, {'big.j2': '{% set x = "a" * 10**10 %}', 'ok.j2': 'ok'})
+
+        with template.Transaction(str(tmp_path / 'home')) as transaction:
+            failures = isolate.render(files, theme.Theme('t', [], '', {}), transaction, isolate.Limits(memory=2**27))
+            assert transaction.commit() == ['ok']
+
+        assert failures == [isolate.RenderFailure('big', 'exceeded 128 MiB of memory')]
+
+    def test_timeout(self, monkeypatch, tmp_path, tmp_home):
+        files = self.setup_templates(tmp_path, {'slow.j2': '{{ sleep() }}'})
+        template.env.globals['sleep'] = lambda: time.sleep(60)
+        monkeypatch.setattr(isolate, 'wall_time_factor', 1)
+
+        with template.Transaction(str(tmp_path / 'home')) as transaction:
+            failures = isolate.render(files, theme.Theme('t', [], '', {}), transaction, isolate.Limits(cpu_time=0.5))
+
+        assert failures == [isolate.RenderFailure('slow', 'timed out after 0.5s')]
+
+    def test_jobs(self, monkeypatch, tmp_path, tmp_home):
+        files = self.setup_templates(tmp_path, {f'{i}.conf.j2': f'{i}' for i in range(6)})
+        running = []
+
+        def counted_wait(conns, timeout):
+            running.append(len(conns))
+            return isolate.multiprocessing.connection.wait(conns, timeout)
+        monkeypatch.setattr(isolate, 'wait', counted_wait)
+
+        with template.Transaction(str(tmp_path / 'home')) as transaction:
+            assert isolate.render(files, theme.Theme('t', [], '', {}), transaction, jobs=2) == []
+            assert len(transaction.commit()) == 6
+
+        assert max(running) == 2
+
+    @pytest.mark.parametrize('cross_device', [False, True])
+    def test_killed_worker_cleaned_up(self, monkeypatch, tmp_path, tmp_home, cross_device):
+        files = self.setup_templates(tmp_path, {'killed.j2': 'partial{{ kill() }}', 'ok.j2': 'ok'})
+        template.env.globals['kill'] = lambda: os.kill(os.getpid(), signal.SIGKILL)
+        if cross_device:
+            # stage next to the destination rather than in the staging dir
+            device = template.Transaction.device
+            monkeypatch.setattr(template.Transaction, 'device', lambda self, directory: -1 if directory == str(tmp_path / 'home') else device(self, directory))
+
+        with template.Transaction(str(tmp_path / 'home')) as transaction:
+            failures = isolate.render(files, theme.Theme('t', [], '', {}), transaction, jobs=1)
+            leftovers = [
+                os.path.join(directory, name)
+                for directory, _, names in os.walk(tmp_path / 'home')
+                for name in names
+                if os.path.join(directory, name) not in transaction.staged
+            ]
+            assert transaction.commit() == ['ok']
+
+        assert failures == [isolate.RenderFailure('killed', f'worker died with exit code {-signal.SIGKILL}')]
+        assert leftovers == []
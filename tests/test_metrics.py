@@ -0,0 +1,37 @@
+from palettecleanser import metrics
+import json
+import pstats
+
+class TestRecording:
+    def test_disabled(self):
+        with metrics.span('stage'):
+            metrics.add('counter')
+
+        assert 'stage' not in metrics.current.spans
+        assert 'counter' not in metrics.current.counters
+
+    def test_recording(self, tmp_path):
+        with metrics.recording(str(tmp_path / 'profile'), trace_memory=True) as recorded:
+            for _ in range(3):
+                with metrics.span('stage'):
+                    metrics.add('bytes written', 10)
+            data = [bytearray(2**20)]
+
+        assert recorded.spans['stage'].count == 3
+        assert 0 < recorded.spans['stage'].longest <= recorded.spans['stage'].total <= recorded.elapsed
+        assert recorded.counters == {'bytes written': 30}
+        assert recorded.allocations[0][1] >= 2**20
+        assert pstats.Stats(str(tmp_path / 'profile')).total_calls > 0
+        assert not metrics.enabled
+
+        json.dumps(recorded.export())
+
+    def test_merge(self):
+        with metrics.recording() as recorded:
+            with metrics.span('render'):
+                pass
+            metrics.merge(metrics.Metrics({'render': metrics.Span(2, 1.0, 0.75)}, metrics.Counter({'bytes written': 5})))
+
+        assert recorded.spans['render'].count == 3
+        assert recorded.spans['render'].longest == 0.75
+        assert recorded.counters['bytes written'] == 5
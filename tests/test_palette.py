@@ -1,5 +1,6 @@
 from palettecleanser import palette
 from palettecleanser import config
+from palettecleanser import backends
 import os
 import pytest
 
@@ -90,6 +91,14 @@ class TestPalette:
         p = palette.Palette([palette.Color(110, 10, 165), palette.Color(40, 140, 5)], 'test')
         p.save()
 
+    def test_save_all(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config, 'palettes_dir', str(tmp_path / 'palettes'))
+        palette.save_all([palette.axarva_palette, palette.ansi_normal_palette])
+        palette.save_all([palette.Palette(palette.axarva_palette.colors[:2], 'axarva')])
+
+        assert palette.names() == ['ansi-normal', 'axarva']
+        assert palette.from_config('axarva').colors == palette.axarva_palette.colors[:2]
+
     def test_from_config_exists(self, monkeypatch):
         monkeypatch.setattr(config, 'palettes_dir', os.path.join(os.path.dirname(__file__), 'test_data/fake_config/palettes'))
         p = palette.Palette([palette.Color(105, 10, 165), palette.Color(40, 140, 5)], 'test')
@@ -113,6 +122,16 @@ class TestPalette:
         print()
         print(p)
 
+    @pytest.mark.parametrize('backend', backends.builtin)
+    def test_from_image_builtin_backend(self, backend):
+        pytest.importorskip('PIL')
+        image_path = os.path.join(os.path.dirname(__file__), 'test_data/muruusa-mountain.jpg')
+        p = palette.from_image(image_path, backend=backend, saturate_percent=50)
+        assert len(p.colors) == 8
+
+        light = palette.from_image(image_path, backend=backend, light=True)
+        assert light.colors[0].distance(palette.Color(255, 255, 255)) < light.colors[7].distance(palette.Color(255, 255, 255))
+
     def test_from_image_missing_backend(self):
         with pytest.raises(SystemExit):
             image_path = os.path.join(os.path.dirname(__file__), 'test_data/muruusa-mountain.jpg')
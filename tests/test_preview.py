@@ -0,0 +1,61 @@
+from palettecleanser import preview
+from palettecleanser import palette
+from palettecleanser import config
+
+colors = [palette.from_hex(h) for h in ['#000000', '#ff0000', '#00ff00', '#ffff00']]
+
+def test_swatch():
+    assert palette.Color(1, 2, 3).swatch(3) == '\x1b[48;2;1;2;3m   \x1b[0m'
+    assert palette.Color(1, 2, 3).show() == '\x1b[48;2;1;2;3m#010203\x1b[0m'
+
+def test_fit():
+    assert preview.fit('abc', 5) == 'abc  '
+    assert preview.fit('abcdef', 5) == 'abcd…'
+
+class TestPaletteRows:
+    def test_width(self):
+        rows = list(preview.palette_rows([('a', colors), ('long name', colors * 3), ('b', None)], 4))
+        assert len(rows) == 3
+        # short palettes are padded as wide as cut short ones
+        assert rows[0].endswith(' ' * (4 * preview.swatch_width + 1))
+        assert rows[1].startswith('lon… ')
+        assert rows[1].endswith('…')
+        assert rows[1].count('\x1b[48') == preview.palette_colors
+        assert 'unreadable' in rows[2]
+
+    def test_per_row(self):
+        rows = list(preview.palette_rows([(str(i), colors) for i in range(5)], 1, 2))
+        assert len(rows) == 3
+        assert rows[0].count('\x1b[48') == 8
+
+def test_layout():
+    name_width, per_row = preview.layout(['a' * 6, 'b'], 80)
+    assert name_width == 6
+    assert per_row == (80 + preview.gutter) // (6 + 1 + preview.palette_colors * preview.swatch_width + 1 + preview.gutter)
+    assert preview.layout(['a' * 100], 10) == (preview.max_name_width, 1)
+
+def test_theme_rows():
+    rows = list(preview.theme_rows([('t', [colors] * 3), ('bad', None)], 3, 20))
+    # too many colors for 20 columns, so a cell per swatch
+    assert rows[0].count(' \x1b[0m') == 12
+    assert rows[0].count('  \x1b[0m') == 0
+    assert rows[1] == 'bad unreadable'
+
+def test_load(monkeypatch):
+    monkeypatch.setattr(preview, 'parallel_threshold', 0)
+    monkeypatch.setattr(preview, 'chunk_size', 3)
+    names = [str(i) for i in range(50)]
+    assert list(preview.load(names, str.upper, 2)) == names
+
+def test_palettes(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'palettes_dir', str(tmp_path))
+    palette.save_all([palette.Palette(colors, name) for name in ['x', 'y']])
+    (tmp_path / 'broken.yml').write_text(':')
+
+    rows = list(preview.palettes(palette.names(), 30))
+    assert [row.split()[0] for row in rows] == ['broken', 'x', 'y']
+    assert 'unreadable' in rows[0]
+
+def test_write(capsys):
+    preview.write(iter(['a', 'b']), height=1)
+    assert capsys.readouterr().out == 'a\nb\n'
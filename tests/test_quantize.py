@@ -0,0 +1,54 @@
+from palettecleanser import quantize
+from palettecleanser import palette
+import numpy as np
+import pytest
+
+colors = palette.axarva_palette.colors + palette.ansi_normal_palette.colors
+
+class TestMapper:
+    def test_exact_lut(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (1, 500, 3), dtype=np.uint8)
+        mapped = quantize.Mapper(colors, bits=8).map(pixels)
+
+        for pixel, result in zip(pixels[0], mapped[0]):
+            nearest = colors[palette.Color(*map(int, pixel)).closest(colors)]
+            assert str(palette.Color(*map(int, result))) == str(nearest)
+
+    def test_approximate_lut(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (1, 500, 3), dtype=np.uint8)
+        mapped = quantize.Mapper(colors).map(pixels)
+
+        for pixel, result in zip(pixels[0], mapped[0]):
+            color = palette.Color(*map(int, pixel))
+            # never more than a cell's diagonal further away than the nearest color
+            assert color.distance(palette.Color(*map(int, result))) <= color.distance(colors[color.closest(colors)]) + 4 * 3**.5
+
+    def test_dither(self):
+        # a flat color halfway between two palette colors
+        pixels = np.full((8, 8, 3), 128, dtype=np.uint8)
+        two = [palette.Color(0, 0, 0), palette.Color(255, 255, 255)]
+
+        assert len(np.unique(quantize.Mapper(two).map(pixels).reshape(-1, 3), axis=0)) == 1
+        dithered = quantize.Mapper(two, dither=True).map(pixels)
+        assert len(np.unique(dithered.reshape(-1, 3), axis=0)) == 2
+        assert abs(dithered.mean() - 128) < 10
+
+    def test_blend(self):
+        pixels = np.full((1, 1, 3), 100, dtype=np.uint8)
+        assert quantize.Mapper([palette.Color(0, 0, 0)], blend=.25).map(pixels).tolist() == [[[25, 25, 25]]]
+
+
+class TestRecolor:
+    def test_recolor(self, monkeypatch, tmp_path):
+        Image = pytest.importorskip('PIL.Image')
+        pixels = np.random.default_rng(0).integers(0, 256, (300, 200, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(tmp_path / 'in.png')
+        monkeypatch.setattr(quantize, 'tile_rows', 64)
+
+        quantize.recolor(str(tmp_path / 'in.png'), colors, str(tmp_path / 'serial.png'), jobs=1)
+        monkeypatch.setattr(quantize, 'parallel_threshold', 0)
+        quantize.recolor(str(tmp_path / 'in.png'), colors, str(tmp_path / 'parallel.png'), jobs=2)
+
+        serial = np.asarray(Image.open(tmp_path / 'serial.png'))
+        assert (serial == quantize.Mapper(colors).map(pixels)).all()
+        assert (serial == np.asarray(Image.open(tmp_path / 'parallel.png'))).all()
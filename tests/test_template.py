@@ -1,10 +1,15 @@
+from palettecleanser import backup
 from palettecleanser import template
 from palettecleanser import theme
 from palettecleanser import palette
 from palettecleanser import config
+from palettecleanser import emitters
+from palettecleanser import metrics
 import yaml
 import os
 import jinja2 as j2
+import pytest
+import tracemalloc
 
 class TestTemplateFile:
     def test_generate_signature_hs(self):
@@ -180,3 +185,216 @@ class TestTemplate:
             assert yaml.load(f, Loader=yaml.Loader) == 'hi'
 
         assert not os.path.exists(os.path.join(os.environ['HOME'], 'test_template_dir3/test_template_template6.yml'))
+
+
+class TestEmittedFile:
+    def test_from_paths(self):
+        assert template.from_paths('unused', [{'.config/kitty/colors.conf': {'emitter': 'kitty'}}]) == [
+            template.EmittedFile('.config/kitty/colors.conf', 'kitty')
+        ]
+        with pytest.raises(emitters.UnknownEmitterError):
+            template.from_paths('unused', [{'colors': {'emitter': 'nope'}}])
+
+    def test_template(self, tmp_path, tmp_home):
+        palette.save_all([palette.ansi_normal_palette])
+        t = theme.Theme('theme', [palette.ansi_normal_palette.name], '')
+
+        for path, emitter, signature in [('colors.css', 'css', '/* @palette-cleanser */'), ('colors.json', 'json', '{')]:
+            f = template.EmittedFile(path, emitter)
+            f.template(t)
+
+            with open(tmp_path / 'home' / path) as written:
+                assert written.readline().rstrip() == signature
+            assert f.is_templated()
+            assert os.stat(tmp_path / 'home' / path).st_mode & 0o777 == template.emitted_mode
+            assert f.render(t)[0] == open(tmp_path / 'home' / path).read()
+
+    def test_from_managed_path(self, monkeypatch):
+        monkeypatch.setattr(config, 'get_config_settings', lambda: {'managed_files': ['a', {'b': {'emitter': 'kitty'}}]})
+        assert template.from_managed_path('a') == template.TemplateFile('a')
+        assert template.from_managed_path('b') == template.EmittedFile('b', 'kitty')
+
+
+class TestTransaction:
+    def test_commit(self, tmp_path):
+        (tmp_path / 'user.conf').write_text('mine\n')
+
+        with template.Transaction(str(tmp_path)) as transaction:
+            for path in ['user.conf', 'new/dir/new.conf']:
+                with open(transaction.stage(path), 'w') as f:
+                    f.write(f'# {template.templated_signature}\nstaged\n')
+
+            # nothing is visible until commit
+            assert (tmp_path / 'user.conf').read_text() == 'mine\n'
+            assert not (tmp_path / 'new').exists()
+            transaction.commit()
+
+        [b] = backup.history(str(tmp_path / 'user.conf'))
+        with open(b.object_path) as f:
+            assert f.read() == 'mine\n'
+        assert not (tmp_path / 'user.conf.backup').exists()
+        assert (tmp_path / 'user.conf').read_text().endswith('staged\n')
+        assert (tmp_path / 'new/dir/new.conf').read_text().endswith('staged\n')
+        assert [p.name for p in tmp_path.iterdir() if p.name.startswith('.pclean')] == []
+
+    def test_symlink(self, tmp_path):
+        (tmp_path / 'dotfiles').mkdir()
+        (tmp_path / 'dotfiles' / 'conf').write_text(f'# {template.templated_signature}\nold\n')
+        (tmp_path / 'conf').symlink_to(tmp_path / 'dotfiles' / 'conf')
+
+        with template.Transaction(str(tmp_path)) as transaction:
+            with open(transaction.stage('conf'), 'w') as f:
+                f.write('new\n')
+            transaction.commit()
+
+        assert (tmp_path / 'conf').is_symlink()
+        assert (tmp_path / 'dotfiles' / 'conf').read_text() == 'new\n'
+
+    def test_confined(self, tmp_path):
+        (tmp_path / 'root' / 'dotfiles').mkdir(parents=True)
+        (tmp_path / 'root' / 'conf').symlink_to(tmp_path / 'root' / 'dotfiles' / 'conf')
+        (tmp_path / 'root' / 'old.conf').write_text('old\n')
+        me = (os.getuid(), os.getgid())
+
+        with template.Transaction(str(tmp_path / 'root'), owner=me) as transaction:
+            for path in ['conf', 'old.conf', 'new/dir/new.conf']:
+                with transaction.create(path, 0o644) as f:
+                    f.write('new\n')
+            assert sorted(transaction.commit()) == ['conf', 'new/dir/new.conf', 'old.conf']
+
+        # symlinks under root are still written through
+        assert (tmp_path / 'root' / 'conf').is_symlink()
+        for path in ['dotfiles/conf', 'old.conf', 'new/dir/new.conf']:
+            assert (tmp_path / 'root' / path).read_text() == 'new\n'
+        # other users' files aren't backed up
+        assert backup.history(str(tmp_path / 'root' / 'old.conf')) == []
+        assert sorted(p.name for p in (tmp_path / 'root').iterdir()) == ['conf', 'dotfiles', 'new', 'old.conf']
+
+    def test_confined_symlink_outside(self, tmp_path):
+        (tmp_path / 'root').mkdir()
+        (tmp_path / 'shadow').write_text('secret\n')
+        (tmp_path / 'root' / 'conf').symlink_to(tmp_path / 'shadow')
+        (tmp_path / 'root' / 'dir').symlink_to(tmp_path)
+
+        with template.Transaction(str(tmp_path / 'root'), owner=(os.getuid(), os.getgid())) as transaction:
+            for path in ['conf', 'dir/shadow']:
+                with pytest.raises(template.UnsafePathError):
+                    transaction.stage(path)
+
+        assert (tmp_path / 'shadow').read_text() == 'secret\n'
+
+    def test_confined_swapped_for_symlink(self, tmp_path):
+        (tmp_path / 'root').mkdir()
+        (tmp_path / 'shadow').write_text('secret\n')
+        (tmp_path / 'root' / 'conf').write_text('old\n')
+        (tmp_path / 'root' / 'dir').mkdir()
+
+        with template.Transaction(str(tmp_path / 'root'), owner=(os.getuid(), os.getgid())) as transaction:
+            with transaction.create('conf', 0o644) as f:
+                f.write('new\n')
+            # the owner of the root swaps the destination after it was staged
+            (tmp_path / 'root' / 'conf').unlink()
+            (tmp_path / 'root' / 'conf').symlink_to(tmp_path / 'shadow')
+
+            with pytest.raises(template.UnsafePathError):
+                transaction.commit()
+
+            (tmp_path / 'root' / 'dir').rmdir()
+            (tmp_path / 'root' / 'dir').symlink_to(tmp_path)
+            with pytest.raises(template.UnsafePathError):
+                transaction.stage('dir/shadow')
+
+        assert (tmp_path / 'shadow').read_text() == 'secret\n'
+        assert sorted(p.name for p in (tmp_path / 'root').iterdir()) == ['conf', 'dir']
+
+    def test_template_error(self, tmp_path, tmp_home):
+        (tmp_path / 'templates' / 'a.yml.j2').write_text('{{ settings.test }}')
+        (tmp_path / 'templates' / 'b.yml.j2').write_text('{{ settings.test | garbage }}')
+        (tmp_path / 'home' / 'a.yml').write_text(f'# {template.templated_signature}\nold')
+
+        t = theme.Theme('theme name', [], '', {'test': 'new'})
+        with pytest.raises(j2.exceptions.TemplateError):
+            template.TemplateDirectory('', [
+                template.TemplateFile('a.yml'),
+                template.TemplateFile('b.yml')
+            ]).template(t)
+
+        assert (tmp_path / 'home' / 'a.yml').read_text() == f'# {template.templated_signature}\nold'
+        assert sorted(p.name for p in (tmp_path / 'home').iterdir()) == ['a.yml']
+
+    def test_commit_unchanged(self, tmp_path):
+        (tmp_path / 'same.conf').write_text('same\n')
+
+        with template.Transaction(str(tmp_path)) as transaction:
+            for path in ['same.conf', 'other.conf']:
+                with open(transaction.stage(path), 'w') as f:
+                    f.write('same\n')
+
+            assert transaction.commit() == ['other.conf']
+
+    def test_template_streamed(self, tmp_path, tmp_home):
+        (tmp_path / 'templates' / 'big.css.j2').write_text('{% for i in range(settings.n) %}.icon-{{ i }} { color: red; }\n{% endfor %}')
+
+        t = theme.Theme('theme name', [], '', {'n': 200000})
+        # compile outside of the measurement
+        template.env.get_template('big.css.j2')
+        tracemalloc.start()
+        template.TemplateFile('big.css').template(t)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # output is several MB, but is never held in memory all at once
+        assert os.path.getsize(tmp_path / 'home' / 'big.css') > 5 * 2**20
+        assert peak < 2**20
+
+
+    def test_template_write_timed(self, tmp_path, tmp_home):
+        (tmp_path / 'templates' / 'a.conf.j2').write_text('{% for i in range(1000) %}{{ i }}\n{% endfor %}')
+
+        with metrics.recording() as recorded:
+            template.TemplateFile('a.conf').template(theme.Theme('theme name', [], '', {}))
+
+        assert recorded.spans['render'].count == 1
+        assert recorded.spans['write'].count == 2
+        assert 0 < recorded.spans['render'].total + recorded.spans['write'].total <= recorded.elapsed
+
+class TestTemplateLoader:
+    def test_single_read(self, monkeypatch, tmp_path, tmp_home):
+        monkeypatch.setattr(template, 'debug', True)
+        monkeypatch.setattr(template, 'syscalls', template.defaultdict(template.Counter))
+        (tmp_path / 'templates' / 'run.sh.j2').write_text('#!/bin/sh\necho {{ settings.test }}\n')
+        os.chmod(tmp_path / 'templates' / 'run.sh.j2', 0o755)
+
+        t = theme.Theme('theme name', [], '', {'test': 'hi'})
+        template.TemplateFile('run.sh').template(t)
+
+        assert template.env.loader.sources['run.sh.j2'] == ('#!/bin/sh\n', os.stat(tmp_path / 'templates' / 'run.sh.j2').st_mode)
+        assert (tmp_path / 'home' / 'run.sh').read_text() == '#!/bin/sh\n# @palette-cleanser\n#!/bin/sh\necho hi'
+        assert os.access(tmp_path / 'home' / 'run.sh', os.X_OK)
+        # the template and the staged file are each opened once
+        assert template.syscalls['run.sh']['open'] == 2
+        assert template.syscalls['run.sh']['write'] == 1
+
+        # a second deploy of the same content reuses the compiled template and leaves the file alone
+        template.syscalls.clear()
+        template.TemplateFile('run.sh').template(t)
+        assert template.syscalls['run.sh']['stat'] == 2
+        assert template.syscalls['run.sh']['replace'] == 0
+
+
+class TestCreateManaged:
+    def test_create_managed_incremental(self, monkeypatch, tmp_path, tmp_home):
+        monkeypatch.setattr(config, 'get_config_settings', lambda: {'managed_files': ['app']})
+        (tmp_path / 'home' / 'app').mkdir(parents=True)
+        (tmp_path / 'home' / 'app' / 'conf').write_text('color = red\n')
+        (tmp_path / 'home' / 'app' / 'icon.png').write_bytes(b'\x89PNG\r\n\x1a\n\0\0')
+
+        assert template.create_managed(jobs=2) == {'created': 1, 'binary': 1}
+        assert (tmp_path / 'templates' / 'app' / 'conf.j2').read_text() == 'color = red\n'
+        assert not (tmp_path / 'templates' / 'app' / 'icon.png.j2').exists()
+
+        assert template.create_managed(jobs=2) == {'unchanged': 1, 'binary': 1}
+
+        (tmp_path / 'home' / 'app' / 'conf').write_text('color = blue\n')
+        assert template.create_managed(jobs=2) == {'created': 1, 'binary': 1}
+        assert (tmp_path / 'templates' / 'app' / 'conf.j2').read_text() == 'color = blue\n'
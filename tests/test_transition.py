@@ -0,0 +1,83 @@
+from palettecleanser import config
+from palettecleanser import palette
+from palettecleanser import theme
+from palettecleanser import transition
+import pytest
+import time
+
+black = palette.from_hexes(['#000000', '#ff0000'], 'black')
+white = palette.from_hexes(['#ffffff', '#0000ff', '#00ff00'], 'white')
+
+def test_parse_duration():
+    assert transition.parse_duration('2s') == 2
+    assert transition.parse_duration('500ms') == .5
+    assert transition.parse_duration('1.5m') == 90
+    assert transition.parse_duration('3') == 3
+    for bad in ['', 'soon', '2 days', '-1s']:
+        with pytest.raises(ValueError):
+            transition.parse_duration(bad)
+
+class TestInterpolate:
+    def test_interpolate(self):
+        frames = transition.interpolate([black], [white], 4)
+
+        assert len(frames) == 4
+        assert frames[-1] == [white]
+        backgrounds = [f[0].colors[0] for f in frames]
+        # every step gets lighter, through grays
+        assert [c.red for c in backgrounds] == sorted(c.red for c in backgrounds)
+        assert all(c.red == c.green == c.blue for c in backgrounds)
+        # colors only the end has are there from the start
+        assert all(f[0].colors[2] == white.colors[2] for f in frames)
+        assert all(f[0].name == 'white' for f in frames)
+
+    def test_one_step(self):
+        assert transition.interpolate([black], [white], 1) == [[white]]
+
+def test_frame_export():
+    frame = transition.Frame(theme.Theme('t', ['white'], '', {'a': 1}), [white])
+    exported = frame.export()
+    assert exported['palettes'] == [white]
+    assert exported['settings'] == {'a': 1}
+    assert 'interpolated' not in exported
+
+class TestTransition:
+    def setup_themes(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config, 'get_config_settings', lambda: {'managed_files': ['app', 'other']})
+        palette.save_all([black, white])
+        (tmp_path / 'templates' / 'app' / 'conf.j2').write_text('bg = {{ palettes[0].colors[0] }}')
+        (tmp_path / 'templates' / 'other.j2').write_text('bg = {{ palettes[0].colors[0] }}')
+        hooks = {'reload_hooks': {'app': f'grep -o "#[0-9a-f]*$" app/conf >> {tmp_path / "log"}'}}
+        return theme.Theme('dark', ['black'], '', hooks), theme.Theme('light', ['white'], '', hooks)
+
+    def test_transition(self, monkeypatch, tmp_path, managed_app):
+        dark, light = self.setup_themes(monkeypatch, tmp_path)
+        monkeypatch.chdir(tmp_path / 'home')
+
+        result = transition.transition(dark, light, .1, 50)
+
+        # only the file with a reload hook is transitioned
+        assert result.files == ['app/conf']
+        assert result.shown + result.dropped == 5
+        seen = open(tmp_path / 'log').read().split()
+        assert seen[-1] == '#ffffff'
+        assert len(seen) == result.shown
+        # the final deploy writes everything, without reloading app again
+        assert result.deployment.changed == ['other']
+        assert open(tmp_path / 'home' / 'other').read().endswith('bg = #ffffff')
+
+    def test_drops_frames(self, monkeypatch, tmp_path, managed_app):
+        dark, light = self.setup_themes(monkeypatch, tmp_path)
+        original_show = transition.show
+        monkeypatch.setattr(transition, 'show', lambda *args, **kwargs: time.sleep(.05) or original_show(*args, **kwargs))
+
+        result = transition.transition(dark, light, .2, 100)
+
+        assert result.dropped > 0
+        assert result.shown + result.dropped == 20
+        # the last frame is never dropped
+        assert open(tmp_path / 'home' / 'app' / 'conf').read().endswith('bg = #ffffff')
+
+    def test_templates(self, monkeypatch, tmp_path, managed_app):
+        dark, light = self.setup_themes(monkeypatch, tmp_path)
+        assert transition.transition(dark, light, 0, 15, ['other']).files == ['other']
@@ -0,0 +1,67 @@
+from palettecleanser import tree
+from palettecleanser import template
+import os
+
+class TestIgnorePatterns:
+    def test_basename(self):
+        ignored = tree.compile_patterns(('*.png', 'cache/'))
+        assert ignored.matches('icon.png', False)
+        assert ignored.matches('a/b/icon.png', False)
+        assert ignored.matches('a/cache', True)
+        assert not ignored.matches('a/cache', False)
+        assert not ignored.matches('icon.svg', False)
+
+    def test_anchored(self):
+        ignored = tree.compile_patterns(('/init.lua', 'lua/plugins/*.lua'))
+        assert ignored.matches('init.lua', False)
+        assert not ignored.matches('lua/init.lua', False)
+        assert ignored.matches('lua/plugins/colors.lua', False)
+        assert not ignored.matches('lua/plugins/extra/colors.lua', False)
+
+    def test_double_star(self):
+        ignored = tree.compile_patterns(('icons/**/*.svg', 'build/**'))
+        assert ignored.matches('icons/a.svg', False)
+        assert ignored.matches('icons/48x48/apps/a.svg', False)
+        assert ignored.matches('build/x/y', False)
+
+    def test_negation(self):
+        ignored = tree.compile_patterns(('# comment', '', '*.conf', '!colors.conf', '[ab]?.txt'))
+        assert ignored.matches('kitty.conf', False)
+        assert not ignored.matches('colors.conf', False)
+        assert ignored.matches('b1.txt', False)
+        assert not ignored.matches('c1.txt', False)
+
+class TestSnapshot:
+    def test_listdir(self, tmp_path):
+        managed = tmp_path / 'managed'
+        (managed / 'dir').mkdir(parents=True)
+        (managed / 'file').write_text('')
+        os.utime(managed, ns=(0, 10**9))
+
+        snapshot = tree.Snapshot(str(tmp_path / 'cache' / 'tree.json'))
+        assert snapshot.listdir(str(managed)) == [('dir', True), ('file', False)]
+        snapshot.save()
+
+        # an unchanged mtime means the persisted listing is reused
+        (managed / 'file2').write_text('')
+        os.utime(managed, ns=(0, 10**9))
+        assert tree.load_snapshot(snapshot.path).listdir(str(managed)) == [('dir', True), ('file', False)]
+
+        os.utime(managed, ns=(0, 2 * 10**9))
+        assert tree.load_snapshot(snapshot.path).listdir(str(managed)) == [('dir', True), ('file', False), ('file2', False)]
+
+    def test_recent_not_cached(self, tmp_path):
+        snapshot = tree.Snapshot()
+        snapshot.listdir(str(tmp_path))
+        assert not snapshot.listings
+
+class TestFromPath:
+    def test_from_path_globs(self, tmp_path):
+        for path in ['nvim/init.lua.j2', 'nvim/lua/colors.lua.j2', 'nvim/lua/plugins.lua.j2', 'nvim/spell/en.add.j2']:
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text('')
+
+        assert template.from_path(str(tmp_path), 'nvim', ['spell/', 'lua/*', '!colors.lua']) == template.TemplateDirectory('nvim', [
+            template.TemplateFile('nvim/init.lua'),
+            template.TemplateDirectory('nvim/lua', [template.TemplateFile('nvim/lua/colors.lua')])
+        ])